@@ -1,10 +1,27 @@
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from .database import SessionLocal
 from .models import AuditLog
+from .audit_rollup import apply_rollups
 from datetime import datetime
-from typing import Optional, Any
+from typing import Callable, List, Optional, Any
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger('audit')
 
 SENSITIVE_KEYS = {"password", "new_password", "current_password"}
 
+# Se escribe un lote al juntar AUDIT_BATCH_SIZE eventos o cada AUDIT_FLUSH_INTERVAL_SECONDS
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+AUDIT_MAX_QUEUE = int(os.getenv("AUDIT_MAX_QUEUE", "10000"))
+
 
 def sanitize_metadata(metadata: Optional[dict]) -> Optional[dict]:
     if not metadata:
@@ -15,13 +32,181 @@ def sanitize_metadata(metadata: Optional[dict]) -> Optional[dict]:
             sanitized[k] = "[REDACTED]"
         else:
             try:
-                # try to keep JSON serializable types
-                sanitized[k] = v
+                # la columna es JSONB: datetime, date, Decimal, enums, etc. a tipos JSON
+                sanitized[k] = jsonable_encoder(v)
             except Exception:
                 sanitized[k] = str(v)
     return sanitized
 
 
+def _insert_rows(rows: List[dict]) -> None:
+    """Inserta el lote en una sola sentencia multi-fila y una sola transacción."""
+    db = SessionLocal()
+    try:
+        db.execute(insert(AuditLog), rows)
+        # los resúmenes del dashboard se actualizan en la misma transacción que el lote
+        apply_rollups(db.connection(), rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+class AuditWriter:
+    """Cola en memoria de eventos de auditoría que se escriben por lotes en un hilo aparte.
+
+    Los endpoints solo encolan (sin commit ni SELECT extra); el hilo agrupa los
+    eventos y los inserta al llegar a `batch_size` o tras `flush_interval`.
+    `flush()` vacía la cola de forma síncrona (apagado).
+    """
+
+    def __init__(self, batch_size: int = AUDIT_BATCH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL_SECONDS,
+                 max_queue: int = AUDIT_MAX_QUEUE, write_batch: Callable[[List[dict]], None] = _insert_rows):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._write_batch = write_batch
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_queue)
+        self._retry: List[dict] = []
+        # serializa las escrituras entre el hilo de fondo y los flush() explícitos
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        # los contadores se actualizan desde los hilos de request y el de fondo
+        self._stats_lock = threading.Lock()
+        self._stats = {"enqueued": 0, "written": 0, "batches": 0, "errors": 0, "dropped": 0}
+
+    # ------------------------------------------------------------- ciclo de vida
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Detiene el hilo y escribe todo lo que siga en cola."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    # ------------------------------------------------------------------ encolar
+    def enqueue(self, row: dict) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            # p. ej. TestClient sin lifespan o un script: el hilo arranca al primer evento
+            self.start()
+        try:
+            self._queue.put(row, timeout=1.0)
+        except queue.Full:
+            # backpressure: antes que perder el evento se escribe en este hilo
+            logger.warning("Cola de auditoría llena, escribiendo de forma síncrona")
+            self._write([row])
+            return
+        self._count("enqueued")
+
+    # --------------------------------------------------------------- escritura
+    def _drain(self, limit: int) -> List[dict]:
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _write(self, rows: List[dict]) -> None:
+        with self._write_lock:
+            batch = self._retry + rows
+            self._retry = []
+            if not batch:
+                return
+            try:
+                self._write_batch(batch)
+            except Exception:
+                self._count("errors")
+                logger.exception(f"No se pudo escribir un lote de {len(batch)} eventos de auditoría")
+                # se reintenta en el siguiente lote, sin crecer más que la cola
+                keep = batch[-self.max_queue:]
+                self._count("dropped", len(batch) - len(keep))
+                self._retry = keep
+                return
+            self._count("written", len(batch))
+            self._count("batches")
+
+    def flush(self) -> None:
+        while True:
+            rows = self._drain(self.batch_size)
+            self._write(rows)
+            if len(rows) < self.batch_size:
+                return
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            deadline = time.monotonic() + self.flush_interval
+            rows: List[dict] = []
+            # juntar hasta llenar el lote o hasta que venza el intervalo
+            while len(rows) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=min(remaining, 0.1)))
+                except queue.Empty:
+                    continue
+            if rows or self._retry:
+                self._write(rows)
+
+    def pending(self) -> int:
+        return self._queue.qsize() + len(self._retry)
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {**stats, "pending": self.pending()}
+
+
+audit_writer = AuditWriter()
+
+
+def record_audit(
+    db: Session,
+    actor_id: Optional[int],
+    action: str,
+    object_type: Optional[str] = None,
+    object_id: Optional[int] = None,
+    success: bool = True,
+    metadata: Optional[dict] = None,
+    ip: Optional[str] = None,
+) -> AuditLog:
+    """Agrega el evento a la unidad de trabajo de `db`, sin commit.
+
+    Se escribe en el mismo commit que el cambio de negocio: si la transacción
+    se revierte tampoco queda el registro, y si se confirma no puede faltar.
+    Para objetos nuevos, hacer `db.flush()` antes para tener su id.
+    """
+    log = AuditLog(
+        actor_id=actor_id,
+        action=action,
+        object_type=object_type,
+        object_id=object_id,
+        success=success,
+        ip_address=ip,
+        metadata_json=sanitize_metadata(metadata),
+        timestamp=datetime.utcnow(),
+    )
+    db.add(log)
+    return log
+
+
 def create_audit_log(
     db: Session,
     actor_id: Optional[int],
@@ -31,10 +216,14 @@ def create_audit_log(
     success: bool = True,
     metadata: Optional[dict] = None,
     ip: Optional[str] = None,
+    sync: bool = False,
 ):
-    """Crea un registro de auditoría en la BD.
+    """Registra un evento de auditoría.
 
     metadata se sanitiza para evitar almacenar contraseñas en texto plano.
+    Por defecto el evento se encola y se escribe por lotes (sin commit en la
+    sesión de quien llama). Con `sync=True` se escribe y confirma en `db` antes
+    de regresar; usarlo en acciones críticas de seguridad (contraseñas).
     """
     try:
         sanitized = sanitize_metadata(metadata)
@@ -47,18 +236,31 @@ def create_audit_log(
             success=success,
             ip_address=ip,
             metadata_json=sanitized,
+            # hora del evento, no la de escritura del lote
+            timestamp=datetime.utcnow(),
         )
-        db.add(log)
-        db.commit()
-        db.refresh(log)
+        if sync:
+            db.add(log)
+            db.commit()
+            db.refresh(log)
+            return log
+        audit_writer.enqueue({
+            "actor_id": actor_id,
+            "action": action,
+            "object_type": object_type,
+            "object_id": object_id,
+            "success": success,
+            "ip_address": ip,
+            "metadata_json": sanitized,
+            "timestamp": log.timestamp,
+        })
         return log
     except Exception as e:
         # Log the error so it can be debugged but don't interrupt the main flow
-        import logging
-        logger = logging.getLogger('audit')
         logger.exception(f"Failed to write audit log: {e}")
-        try:
-            db.rollback()
-        except Exception:
-            pass
+        if sync:
+            try:
+                db.rollback()
+            except Exception:
+                pass
         return None
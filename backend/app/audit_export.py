@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator
+
+# Columnas de la exportación, en el mismo orden que los items de /admin/audit_logs
+EXPORT_COLUMNS = ["id", "actor_id", "action", "object_type", "object_id",
+                  "timestamp", "success", "ip_address", "metadata"]
+# Filas que se traen de la BD por vuelta del cursor del servidor
+AUDIT_EXPORT_YIELD_PER = int(os.getenv("AUDIT_EXPORT_YIELD_PER", "1000"))
+# Tamaño aproximado de cada pedazo que se manda al cliente
+AUDIT_EXPORT_CHUNK_BYTES = int(os.getenv("AUDIT_EXPORT_CHUNK_BYTES", str(64 * 1024)))
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+
+def _ndjson_line(row: dict) -> str:
+    data = {k: row[k] for k in EXPORT_COLUMNS}
+    if isinstance(data["timestamp"], datetime):
+        data["timestamp"] = data["timestamp"].isoformat()
+    return json.dumps(data, ensure_ascii=False, default=str) + "\n"
+
+
+def _csv_lines(rows: Iterable[dict]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take() -> str:
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    writer.writerow(EXPORT_COLUMNS)
+    yield take()
+    for row in rows:
+        metadata = row["metadata"]
+        timestamp = row["timestamp"]
+        writer.writerow([
+            row["id"], row["actor_id"], row["action"], row["object_type"], row["object_id"],
+            timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+            row["success"], row["ip_address"],
+            json.dumps(metadata, ensure_ascii=False, default=str) if metadata is not None else "",
+        ])
+        yield take()
+
+
+def encode_rows(rows: Iterable[dict], fmt: str) -> Iterator[str]:
+    """Una línea de texto por fila (más el encabezado en CSV)."""
+    if fmt == "csv":
+        return _csv_lines(rows)
+    return (_ndjson_line(row) for row in rows)
+
+
+def stream_export(rows: Iterable[dict], fmt: str = "ndjson", compress: bool = False,
+                  chunk_bytes: int = AUDIT_EXPORT_CHUNK_BYTES) -> Iterator[bytes]:
+    """Codifica `rows` y los agrupa en pedazos de ~chunk_bytes, opcionalmente en gzip.
+
+    Solo se tiene en memoria el pedazo en curso: el costo no depende del
+    número de filas. El gzip se arma al vuelo con un compresor incremental.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    pending = []
+    size = 0
+    for line in encode_rows(rows, fmt):
+        data = line.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            chunk = b"".join(pending)
+            pending, size = [], 0
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    chunk = b"".join(pending)
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
@@ -0,0 +1,359 @@
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import deque
+from datetime import date, datetime
+from typing import Any, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .database import engine
+from .models import AuditLogArchive
+
+logger = logging.getLogger('audit')
+
+# Particiones mensuales de audit_logs (ver migrations/009_partition_audit_logs.sql)
+AUDIT_PARTITION_MONTHS_AHEAD = int(os.getenv("AUDIT_PARTITION_MONTHS_AHEAD", "3"))
+# Meses completos que se conservan en la BD; lo anterior se archiva en disco
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "12"))
+AUDIT_ARCHIVE_DIR = os.getenv(
+    "AUDIT_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "audit_archive")
+)
+AUDIT_PARTITION_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("AUDIT_PARTITION_MAINTENANCE_INTERVAL_SECONDS", "21600"))
+
+PARENT_TABLE = "audit_logs"
+PARTITION_NAME_RE = re.compile(r"^audit_logs_y(\d{4})m(\d{2})$")
+# Llave arbitraria para que solo un worker haga el mantenimiento a la vez
+MAINTENANCE_LOCK_KEY = 7_420_014
+
+# Orden de columnas del archivo exportado (igual que la tabla, para poder restaurarlo con COPY)
+ARCHIVE_COLUMNS = ["id", "actor_id", "action", "object_type", "object_id",
+                   "timestamp", "success", "ip_address", "metadata"]
+ARCHIVE_NULL = "\\N"
+
+
+# =============================================================================
+#  Calendario de particiones
+# =============================================================================
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME_RE.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def retention_cutoff(today: date, retention_months: int = AUDIT_RETENTION_MONTHS) -> date:
+    """Primer mes que se conserva: las particiones que terminan antes se archivan."""
+    return add_months(month_start(today), -retention_months)
+
+
+# =============================================================================
+#  Mantenimiento (creación y archivado)
+# =============================================================================
+def _is_partitioned(db: Session) -> bool:
+    return bool(db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :name"
+    ), {"name": PARENT_TABLE}).scalar())
+
+
+def _monthly_tables(db: Session) -> List[Tuple[str, bool]]:
+    """Tablas audit_logs_yYYYYmMM existentes y si siguen adjuntas al padre.
+
+    Incluye particiones ya separadas que un archivado interrumpido dejó sueltas.
+    """
+    rows = db.execute(text(
+        "SELECT c.relname, i.inhparent IS NOT NULL AS attached "
+        "FROM pg_class c "
+        "LEFT JOIN pg_inherits i ON i.inhrelid = c.oid "
+        "WHERE c.relkind = 'r' AND c.relname LIKE 'audit\\_logs\\_y%'"
+    )).all()
+    return [(name, attached) for name, attached in rows if PARTITION_NAME_RE.match(name)]
+
+
+def ensure_future_partitions(db: Session, today: Optional[date] = None,
+                             months_ahead: int = AUDIT_PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Crea (si faltan) las particiones del mes actual y los `months_ahead` siguientes."""
+    if not _is_partitioned(db):
+        logger.warning("audit_logs no está particionada; aplicar migrations/009_partition_audit_logs.sql")
+        return []
+    current = month_start(today or datetime.utcnow().date())
+    created = []
+    existing = {name for name, _ in _monthly_tables(db)}
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        name = partition_name(start)
+        if name in existing:
+            continue
+        db.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {PARENT_TABLE} '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+        ))
+        created.append(name)
+    db.commit()
+    if created:
+        logger.info(f"Particiones de auditoría creadas: {', '.join(created)}")
+    return created
+
+
+def _export_partition(name: str, path: str) -> Tuple[int, str]:
+    """Vuelca la tabla a CSV comprimido con COPY; devuelve (filas, sha256)."""
+    tmp_path = path + ".tmp"
+    columns = ", ".join(f'"{c}"' for c in ARCHIVE_COLUMNS)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        # la tabla ya está separada: nadie escribe en ella mientras se exporta
+        cursor.execute(f'SELECT count(*) FROM "{name}"')
+        rows = cursor.fetchone()[0]
+        with gzip.open(tmp_path, "wb") as out:
+            cursor.copy_expert(
+                f'COPY (SELECT {columns} FROM "{name}" ORDER BY timestamp, id) '
+                f"TO STDOUT WITH (FORMAT csv, HEADER true, NULL '{ARCHIVE_NULL}')",
+                out,
+            )
+        cursor.close()
+        raw.commit()
+    finally:
+        raw.close()
+    digest = hashlib.sha256()
+    with open(tmp_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    # rename atómico: un archivo con el nombre final siempre está completo
+    os.replace(tmp_path, path)
+    return rows, digest.hexdigest()
+
+
+def archive_expired_partitions(db: Session, today: Optional[date] = None,
+                               retention_months: int = AUDIT_RETENTION_MONTHS,
+                               archive_dir: str = AUDIT_ARCHIVE_DIR) -> List[str]:
+    """Separa, exporta y elimina las particiones más viejas que la retención.
+
+    Cada paso es reanudable: si el proceso muere a la mitad, la siguiente
+    corrida encuentra la tabla separada y repite la exportación. La tabla solo
+    se elimina en la misma transacción en que se registra el archivo.
+    """
+    cutoff = retention_cutoff(today or datetime.utcnow().date(), retention_months)
+    archived = []
+    for name, attached in sorted(_monthly_tables(db)):
+        month = partition_month(name)
+        if add_months(month, 1) > cutoff:
+            continue
+        if attached:
+            db.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+            db.commit()
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"{name}.csv.gz")
+        rows, checksum = _export_partition(name, path)
+        db.add(AuditLogArchive(
+            partition_name=name,
+            range_start=datetime.combine(month, datetime.min.time()),
+            range_end=datetime.combine(add_months(month, 1), datetime.min.time()),
+            file_path=path,
+            row_count=rows,
+            checksum_sha256=checksum,
+        ))
+        db.execute(text(f'DROP TABLE "{name}"'))
+        db.commit()
+        archived.append(name)
+        logger.info(f"Partición {name} archivada en {path} ({rows} filas)")
+    return archived
+
+
+def run_partition_maintenance() -> None:
+    """Tarea periódica: particiones futuras y retención, un solo worker a la vez."""
+    # el lock es de sesión de Postgres: se toma y se libera en la misma conexión,
+    # que la Session no devuelve al pool entre commits
+    with engine.connect() as conn:
+        locked = conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": MAINTENANCE_LOCK_KEY}).scalar()
+        conn.commit()
+        if not locked:
+            return
+        db = Session(bind=conn)
+        try:
+            ensure_future_partitions(db)
+            archive_expired_partitions(db)
+        finally:
+            db.close()
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": MAINTENANCE_LOCK_KEY})
+            conn.commit()
+
+
+# =============================================================================
+#  Lectura de rangos archivados
+# =============================================================================
+def _parse_archive_row(row: dict) -> dict:
+    def value(key):
+        raw = row[key]
+        return None if raw == ARCHIVE_NULL else raw
+
+    def integer(key):
+        raw = value(key)
+        return int(raw) if raw is not None else None
+
+    metadata = value("metadata")
+    success = value("success")
+    return {
+        "id": int(row["id"]),
+        "actor_id": integer("actor_id"),
+        "action": value("action"),
+        "object_type": value("object_type"),
+        "object_id": integer("object_id"),
+        "timestamp": datetime.fromisoformat(row["timestamp"]),
+        "success": None if success is None else success == "t",
+        "ip_address": value("ip_address"),
+        "metadata": json.loads(metadata) if metadata is not None else None,
+    }
+
+
+def read_archive_file(path: str) -> Iterator[dict]:
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            yield _parse_archive_row(row)
+
+
+def json_contains(document: Any, fragment: Any) -> bool:
+    """Misma semántica que `@>` de JSONB, para filtrar filas archivadas."""
+    if isinstance(fragment, dict):
+        return isinstance(document, dict) and all(
+            key in document and json_contains(document[key], value) for key, value in fragment.items()
+        )
+    if isinstance(fragment, list):
+        if not isinstance(document, list):
+            return False
+        return all(any(json_contains(item, wanted) for item in document) for wanted in fragment)
+    if isinstance(document, list):
+        # un escalar está contenido en un arreglo que lo incluye
+        return fragment in document
+    return document == fragment
+
+
+def _matches(row: dict, actor_id: Optional[int], object_type: Optional[str], action: Optional[str],
+             start: Optional[datetime], end: Optional[datetime],
+             metadata_contains: Optional[dict] = None, metadata_key: Optional[str] = None) -> bool:
+    if actor_id is not None and row["actor_id"] != actor_id:
+        return False
+    if object_type is not None and row["object_type"] != object_type:
+        return False
+    if action is not None and row["action"] != action:
+        return False
+    if start is not None and row["timestamp"] < start:
+        return False
+    if end is not None and row["timestamp"] > end:
+        return False
+    metadata = row["metadata"]
+    if metadata_contains is not None and not json_contains(metadata, metadata_contains):
+        return False
+    if metadata_key is not None and not (isinstance(metadata, dict) and metadata_key in metadata):
+        return False
+    return True
+
+
+def _archives_in_range(db: Session, start: Optional[datetime], end: Optional[datetime]):
+    query = db.query(AuditLogArchive)
+    if start is not None:
+        query = query.filter(AuditLogArchive.range_end > start)
+    if end is not None:
+        query = query.filter(AuditLogArchive.range_start <= end)
+    return query
+
+
+def iter_archived_audit_logs(
+    db: Session,
+    actor_id: Optional[int] = None,
+    object_type: Optional[str] = None,
+    action: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    metadata_contains: Optional[dict] = None,
+    metadata_key: Optional[str] = None,
+) -> Iterator[dict]:
+    """Eventos archivados en orden (timestamp, id) ascendente, fila por fila.
+
+    Los archivos ya vienen ordenados (COPY ... ORDER BY) y se leen en orden de
+    mes, así que la memoria no depende del tamaño del rango.
+    """
+    archives = _archives_in_range(db, start, end).order_by(AuditLogArchive.range_start.asc()).all()
+    for archive in archives:
+        if not os.path.exists(archive.file_path):
+            logger.warning(f"Archivo de auditoría faltante: {archive.file_path}")
+            continue
+        for row in read_archive_file(archive.file_path):
+            if _matches(row, actor_id, object_type, action, start, end, metadata_contains, metadata_key):
+                yield row
+
+
+def read_archived_audit_logs(
+    db: Session,
+    actor_id: Optional[int] = None,
+    object_type: Optional[str] = None,
+    action: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    metadata_contains: Optional[dict] = None,
+    metadata_key: Optional[str] = None,
+    before: Optional[Tuple[datetime, int]] = None,
+    limit: int = 100,
+) -> List[dict]:
+    """Eventos archivados que cumplen los filtros, de (timestamp, id) más reciente a más antiguo.
+
+    El manifiesto hace la poda: solo se abren los archivos cuyo rango se cruza
+    con [start, end] y con la posición del cursor (`before`), del más nuevo al
+    más viejo, y se deja de leer en cuanto hay `limit` filas.
+    """
+    query = _archives_in_range(db, start, end)
+    if before is not None:
+        query = query.filter(AuditLogArchive.range_start <= before[0])
+    found: List[dict] = []
+    for archive in query.order_by(AuditLogArchive.range_start.desc()).all():
+        if not os.path.exists(archive.file_path):
+            logger.warning(f"Archivo de auditoría faltante: {archive.file_path}")
+            continue
+        # el archivo viene en orden ascendente (COPY ... ORDER BY timestamp, id):
+        # basta con retener las últimas filas antes del cursor, sin cargar todo el mes
+        tail: deque = deque(maxlen=limit - len(found))
+        for row in read_archive_file(archive.file_path):
+            if before is not None and (row["timestamp"], row["id"]) >= before:
+                break
+            if _matches(row, actor_id, object_type, action, start, end, metadata_contains, metadata_key):
+                tail.append(row)
+        # los rangos no se traslapan: todo lo de este archivo es más nuevo que el siguiente
+        found.extend(reversed(tail))
+        if len(found) >= limit:
+            break
+    return found
+
+
+def archived_total(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   filtered: bool = False) -> Tuple[int, bool]:
+    """(filas archivadas en el rango, es_exacto) según el manifiesto, sin abrir archivos.
+
+    Es exacto solo si no hay filtros por campo y los archivos caen completos
+    dentro de [start, end]; si no, es una cota superior.
+    """
+    archives = _archives_in_range(db, start, end).all()
+    exact = not filtered and all(
+        (start is None or a.range_start >= start) and (end is None or a.range_end <= end)
+        for a in archives
+    )
+    return sum(a.row_count for a in archives), exact
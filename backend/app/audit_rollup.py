@@ -0,0 +1,159 @@
+import logging
+from collections import Counter
+from datetime import date, datetime
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import event, func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from .models import AuditActorDailyRollup, AuditDailyRollup, AuditLog
+
+logger = logging.getLogger('audit')
+
+
+# =============================================================================
+#  Conteos incrementales
+# =============================================================================
+def rollup_counts(rows: Iterable[dict]) -> Tuple[Counter, Counter]:
+    """Agrupa eventos en los conteos de ambas tablas de resumen.
+
+    Devuelve (por (día, acción, tipo, éxito), por (día, actor, éxito)).
+    """
+    daily: Counter = Counter()
+    by_actor: Counter = Counter()
+    for row in rows:
+        timestamp = row.get("timestamp") or datetime.utcnow()
+        day = timestamp.date()
+        success = True if row.get("success") is None else bool(row["success"])
+        daily[(day, row["action"], row.get("object_type") or "", success)] += 1
+        by_actor[(day, row.get("actor_id") or 0, success)] += 1
+    return daily, by_actor
+
+
+def apply_rollups(conn, rows: Iterable[dict]) -> None:
+    """Suma los eventos a las tablas de resumen en la transacción de `conn`.
+
+    Un solo INSERT ... ON CONFLICT por tabla. Las llaves van ordenadas para
+    que dos transacciones que tocan las mismas filas las bloqueen en el mismo
+    orden y no se interbloqueen.
+    """
+    daily, by_actor = rollup_counts(rows)
+    if daily:
+        stmt = insert(AuditDailyRollup).values([
+            {"day": d, "action": a, "object_type": t, "success": s, "count": n}
+            for (d, a, t, s), n in sorted(daily.items())
+        ])
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["day", "action", "object_type", "success"],
+            set_={"count": AuditDailyRollup.count + stmt.excluded.count},
+        ))
+    if by_actor:
+        stmt = insert(AuditActorDailyRollup).values([
+            {"day": d, "actor_id": actor, "success": s, "count": n}
+            for (d, actor, s), n in sorted(by_actor.items())
+        ])
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["day", "actor_id", "success"],
+            set_={"count": AuditActorDailyRollup.count + stmt.excluded.count},
+        ))
+
+
+@event.listens_for(Session, "after_flush")
+def _rollup_flushed_audit_logs(session: Session, flush_context) -> None:
+    # record_audit / create_audit_log(sync=True): los eventos entran en la
+    # misma transacción que el cambio, y su conteo también
+    logs = [obj for obj in session.new if isinstance(obj, AuditLog)]
+    if not logs:
+        return
+    apply_rollups(session.connection(), [
+        {"timestamp": log.timestamp, "action": log.action, "object_type": log.object_type,
+         "success": log.success, "actor_id": log.actor_id}
+        for log in logs
+    ])
+
+
+# =============================================================================
+#  Reconstrucción (backfill)
+# =============================================================================
+def rebuild_rollups(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """Recalcula los resúmenes de [start, end] (días, inclusive) desde audit_logs.
+
+    Borra y vuelve a insertar en una sola transacción. Los meses ya archivados
+    en disco no están en audit_logs: no incluir su rango o se quedarán en cero.
+    Devuelve el número de filas de resumen diario escritas.
+
+    Mientras dura, las escrituras de auditoría esperan en su upsert al resumen
+    (LOCK ... EXCLUSIVE): lo que confirmen después se suma sobre lo
+    reconstruido, sin contarse dos veces ni perderse.
+    """
+    where = []
+    params = {}
+    if start is not None:
+        where.append("timestamp >= :start")
+        params["start"] = datetime.combine(start, datetime.min.time())
+    if end is not None:
+        where.append("timestamp < CAST(:end AS date) + 1")
+        params["end"] = end
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+
+    day_filter = []
+    if start is not None:
+        day_filter.append("day >= :start_day")
+        params["start_day"] = start
+    if end is not None:
+        day_filter.append("day <= :end_day")
+        params["end_day"] = end
+    day_sql = ("WHERE " + " AND ".join(day_filter)) if day_filter else ""
+
+    # bloquea los upserts de after_flush y del escritor por lotes; las lecturas siguen
+    db.execute(text("LOCK TABLE audit_daily_rollup, audit_actor_daily_rollup IN EXCLUSIVE MODE"))
+    db.execute(text(f"DELETE FROM audit_daily_rollup {day_sql}"), params)
+    db.execute(text(f"DELETE FROM audit_actor_daily_rollup {day_sql}"), params)
+    written = db.execute(text(f"""
+        INSERT INTO audit_daily_rollup (day, action, object_type, success, count)
+        SELECT timestamp::date, action, COALESCE(object_type, ''), COALESCE(success, TRUE), count(*)
+        FROM audit_logs {where_sql}
+        GROUP BY 1, 2, 3, 4
+    """), params).rowcount
+    db.execute(text(f"""
+        INSERT INTO audit_actor_daily_rollup (day, actor_id, success, count)
+        SELECT timestamp::date, COALESCE(actor_id, 0), COALESCE(success, TRUE), count(*)
+        FROM audit_logs {where_sql}
+        GROUP BY 1, 2, 3
+    """), params)
+    db.commit()
+    logger.info(f"Resúmenes de auditoría reconstruidos ({written} filas diarias)")
+    return written
+
+
+# =============================================================================
+#  Consultas
+# =============================================================================
+def actions_per_day(db: Session, start: date, end: date, action: Optional[str] = None,
+                    object_type: Optional[str] = None, success: Optional[bool] = None) -> list:
+    query = db.query(
+        AuditDailyRollup.day, AuditDailyRollup.object_type, func.sum(AuditDailyRollup.count).label("count")
+    ).filter(AuditDailyRollup.day >= start, AuditDailyRollup.day <= end)
+    if action is not None:
+        query = query.filter(AuditDailyRollup.action == action)
+    if object_type is not None:
+        query = query.filter(AuditDailyRollup.object_type == object_type)
+    if success is not None:
+        query = query.filter(AuditDailyRollup.success == success)
+    rows = query.group_by(AuditDailyRollup.day, AuditDailyRollup.object_type) \
+        .order_by(AuditDailyRollup.day, AuditDailyRollup.object_type).all()
+    return [
+        {"day": r.day.isoformat(), "object_type": r.object_type or None, "count": int(r.count)}
+        for r in rows
+    ]
+
+
+def failed_actions_per_actor(db: Session, start: date, end: date, limit: int = 50) -> list:
+    total = func.sum(AuditActorDailyRollup.count).label("count")
+    rows = db.query(AuditActorDailyRollup.actor_id, total).filter(
+        AuditActorDailyRollup.day >= start,
+        AuditActorDailyRollup.day <= end,
+        AuditActorDailyRollup.success.is_(False),
+    ).group_by(AuditActorDailyRollup.actor_id).order_by(total.desc()).limit(limit).all()
+    return [{"actor_id": r.actor_id or None, "count": int(r.count)} for r in rows]
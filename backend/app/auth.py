@@ -1,33 +1,217 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+import hashlib
+import secrets
+import uuid
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session, joinedload
-from .database import get_db
-from .models import User, UserRoles
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.orm import Session, joinedload, object_session
+from .cache import TTLCache
+from .database import SessionLocal, get_db
+from .models import PasswordResetToken, RefreshToken, User, UserRoles
+from .revocation import revocation_list
+import logging
 import os
+import threading
+import time
 
 
+logger = logging.getLogger(__name__)
+
 # Configuración de seguridad
 SECRET_KEY = "tu_clave_secreta"  # Cambia esto por una clave segura en producción
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+PASSWORD_RESET_TOKEN_EXPIRE_MINUTES = int(os.getenv("PASSWORD_RESET_TOKEN_EXPIRE_MINUTES", "15"))
+PASSWORD_RESET_SWEEP_BATCH_SIZE = int(os.getenv("PASSWORD_RESET_SWEEP_BATCH_SIZE", "1000"))
+PASSWORD_RESET_SWEEP_INTERVAL_SECONDS = float(os.getenv("PASSWORD_RESET_SWEEP_INTERVAL_SECONDS", "600"))
+
+# Caché de usuarios autenticados (principal) por proceso, llave: (sub, iat) del token
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "2048"))
+
+# Executor dedicado a bcrypt. workers + cola debe ser menor al threadpool de Starlette (40)
+# para que una ráfaga de logins no deje sin hilos a /actas, /anexos, etc.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "8"))
+PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS", "0"))
+
+# Calibración del costo de bcrypt al arrancar (0 desactiva y deja el default de passlib)
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "150"))
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "15"))
+BCRYPT_CALIBRATION_PROBE_ROUNDS = 8
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+_principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_MAX_ENTRIES, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+class PasswordHasher:
+    """Ejecuta el trabajo de bcrypt en un pool acotado con control de admisión.
+
+    Si ya hay `workers + max_queue` operaciones en curso o esperando, la
+    siguiente se rechaza de inmediato con 503 en lugar de bloquear un hilo más
+    del threadpool compartido. Registra por separado el tiempo en cola y el
+    tiempo de hash.
+    """
+
+    def __init__(self, workers: int, max_queue: int, queue_timeout: float = 0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "queue_wait_total_ms": 0.0,
+            "queue_wait_max_ms": 0.0,
+            "hash_time_total_ms": 0.0,
+            "hash_time_max_ms": 0.0,
+        }
+
+    def _acquire(self) -> bool:
+        if self.queue_timeout > 0:
+            return self._slots.acquire(timeout=self.queue_timeout)
+        return self._slots.acquire(blocking=False)
+
+    def _record(self, wait_ms: float, hash_ms: float) -> None:
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["queue_wait_total_ms"] += wait_ms
+            self._stats["queue_wait_max_ms"] = max(self._stats["queue_wait_max_ms"], wait_ms)
+            self._stats["hash_time_total_ms"] += hash_ms
+            self._stats["hash_time_max_ms"] = max(self._stats["hash_time_max_ms"], hash_ms)
+
+    def run(self, fn, *args, **kwargs):
+        if not self._acquire():
+            with self._lock:
+                self._stats["rejected"] += 1
+            logger.warning("Cola de hashing de contraseñas llena, request rechazado con 503")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="El servicio de autenticación está saturado, intenta de nuevo en unos segundos",
+                headers={"Retry-After": "1"},
+            )
+
+        enqueued = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                finished = time.perf_counter()
+                self._record((started - enqueued) * 1000, (finished - started) * 1000)
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return self._executor.submit(task).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def submit_background(self, fn, *args, **kwargs) -> bool:
+        """Encola trabajo de baja prioridad sin esperar el resultado.
+
+        Nunca bloquea ni rechaza con 503: si no hay lugar en la cola el trabajo
+        simplemente se omite y devuelve False.
+        """
+        if not self._slots.acquire(blocking=False):
+            return False
+
+        def task():
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                logger.exception("Error en tarea de hashing en segundo plano")
+            finally:
+                self._slots.release()
+
+        self._executor.submit(task)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+            data["in_flight"] = self._in_flight
+        completed = data["completed"] or 1
+        data["queue_wait_avg_ms"] = round(data["queue_wait_total_ms"] / completed, 3)
+        data["hash_time_avg_ms"] = round(data["hash_time_total_ms"] / completed, 3)
+        data["workers"] = self.workers
+        data["max_queue"] = self.max_queue
+        return data
+
+
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+    queue_timeout=PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+)
+
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.run(pwd_context.verify, plain_password, hashed_password)
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
+    return password_hasher.run(pwd_context.hash, password)
+
+def calibrate_password_hashing(target_ms: float = BCRYPT_TARGET_MS) -> Optional[int]:
+    """Elige los rounds de bcrypt para que un hash tarde ~target_ms en este hardware.
+
+    Mide con un costo bajo y extrapola (cada round duplica el tiempo). Los hashes
+    existentes con menos rounds se actualizan en el siguiente login exitoso; los
+    que tienen más rounds se conservan (nunca se reduce el costo de un hash).
+    """
+    if target_ms <= 0:
+        return None
+    samples = []
+    for _ in range(3):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibracion", bcrypt.gensalt(rounds=BCRYPT_CALIBRATION_PROBE_ROUNDS))
+        samples.append((time.perf_counter() - started) * 1000)
+    probe_ms = max(min(samples), 0.001)
+
+    rounds = BCRYPT_MIN_ROUNDS
+    while rounds < BCRYPT_MAX_ROUNDS and probe_ms * 2 ** (rounds + 1 - BCRYPT_CALIBRATION_PROBE_ROUNDS) <= target_ms:
+        rounds += 1
+
+    pwd_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+    estimated_ms = probe_ms * 2 ** (rounds - BCRYPT_CALIBRATION_PROBE_ROUNDS)
+    logger.info(f"bcrypt calibrado a {rounds} rounds (~{estimated_ms:.0f} ms, objetivo {target_ms:.0f} ms)")
+    return rounds
+
+def _rehash_password(user_id: int, old_hash: str, plain_password: str) -> None:
+    new_hash = pwd_context.hash(plain_password)
+    db = SessionLocal()
+    try:
+        # Solo reemplaza si nadie cambió la contraseña mientras tanto
+        updated = db.query(User).filter(User.id == user_id, User.password == old_hash).update(
+            {User.password: new_hash}, synchronize_session=False
+        )
+        db.commit()
+        if updated:
+            logger.info(f"Hash de contraseña actualizado al costo vigente para usuario {user_id}")
+    finally:
+        db.close()
 
 def authenticate_user(db: Session, username: str, password: str):
     user = db.query(User).filter(User.username == username, User.is_deleted == False).first()
     if not user or not verify_password(password, user.password):
         return False
+    if pwd_context.needs_update(user.password):
+        password_hasher.submit_background(_rehash_password, user.id, user.password, password)
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -36,14 +220,165 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # iat forma parte de la llave de la caché de principals; jti permite revocar el token
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-):
+def build_access_token_claims(user: User) -> dict:
+    """Claims que se embeben en el access token (usados por /token y /token/refresh)."""
+    return {
+        "sub": user.username,
+        "user_id": user.id,
+        "email": user.email,
+        "username": user.username,
+        "role": user.role.value if isinstance(user.role, UserRoles) else user.role,
+    }
+
+def hash_token(raw_token: str) -> str:
+    return hashlib.sha256(raw_token.encode("utf-8")).hexdigest()
+
+def issue_refresh_token(db: Session, user_id: int, family_id: Optional[str] = None):
+    """Crea un refresh token (se agrega a la sesión, el commit lo hace quien llama).
+
+    Devuelve (token_en_claro, RefreshToken); en BD solo queda el hash.
+    """
+    raw_token = secrets.token_urlsafe(48)
+    db_token = RefreshToken(
+        user_id=user_id,
+        token_hash=hash_token(raw_token),
+        family_id=family_id or str(uuid.uuid4()),
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    db.add(db_token)
+    return raw_token, db_token
+
+def revoke_refresh_family(db: Session, family_id: str) -> int:
+    return db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at == None,
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+def rotate_refresh_token(db: Session, raw_token: str):
+    """Valida un refresh token y lo reemplaza por uno nuevo de la misma familia.
+
+    Una sola búsqueda por índice (token_hash) junto con el usuario. Si se presenta
+    un token ya rotado se asume robo: se revoca toda la familia.
+    Devuelve (user, nuevo_token_en_claro); el commit lo hace quien llama.
+    """
+    invalid_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token inválido o expirado",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    row = (
+        db.query(RefreshToken, User)
+        .join(User, User.id == RefreshToken.user_id)
+        .filter(RefreshToken.token_hash == hash_token(raw_token))
+        .with_for_update(of=RefreshToken)
+        .first()
+    )
+    if row is None:
+        raise invalid_exception
+    db_token, user = row
+
+    if db_token.revoked_at is not None:
+        revoked = revoke_refresh_family(db, db_token.family_id)
+        db.commit()
+        logger.warning(
+            f"Reutilización de refresh token detectada para usuario {user.id}; "
+            f"familia {db_token.family_id} revocada ({revoked} tokens activos)"
+        )
+        raise invalid_exception
+
+    if db_token.expires_at <= datetime.utcnow() or user.is_deleted or user.role is None:
+        raise invalid_exception
+
+    now = datetime.utcnow()
+    new_raw_token, new_token = issue_refresh_token(db, user.id, family_id=db_token.family_id)
+    db.flush()
+    db_token.revoked_at = now
+    db_token.replaced_by_id = new_token.id
+    return user, new_raw_token
+
+def revoke_user_credentials(db: Session, user_id: int) -> None:
+    """Revoca todos los access y refresh tokens emitidos a un usuario (commit a cargo de quien llama)."""
+    # la fila user:<id> solo cubre access tokens; los refresh se revocan en su propia tabla
+    revocation_list.revoke_user(db, user_id, max_token_lifetime=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.revoked_at == None,
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+def issue_password_reset_token(db: Session, user_id: int) -> str:
+    """Crea un token de recuperación de un solo uso y descarta los anteriores del usuario.
+
+    Devuelve el token en claro (va en el correo); en BD solo queda el hash.
+    """
+    db.query(PasswordResetToken).filter(
+        PasswordResetToken.user_id == user_id,
+        PasswordResetToken.used_at == None,
+    ).delete(synchronize_session=False)
+    raw_token = secrets.token_urlsafe(32)
+    db.add(PasswordResetToken(
+        user_id=user_id,
+        token_hash=hash_token(raw_token),
+        expires_at=datetime.utcnow() + timedelta(minutes=PASSWORD_RESET_TOKEN_EXPIRE_MINUTES),
+    ))
+    return raw_token
+
+def consume_password_reset_token(db: Session, raw_token: str) -> User:
+    """Marca el token como usado y devuelve su usuario; 400 si no existe, expiró o ya se usó.
+
+    Una sola búsqueda por el índice único de token_hash (con bloqueo de fila
+    para que dos requests concurrentes no usen el mismo token).
+    """
+    row = (
+        db.query(PasswordResetToken, User)
+        .join(User, User.id == PasswordResetToken.user_id)
+        .filter(
+            PasswordResetToken.token_hash == hash_token(raw_token),
+            PasswordResetToken.used_at == None,
+            PasswordResetToken.expires_at > datetime.utcnow(),
+            User.is_deleted == False,
+        )
+        .with_for_update(of=PasswordResetToken)
+        .first()
+    )
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El token de recuperación no es válido o ya expiró",
+        )
+    reset_token, user = row
+    reset_token.used_at = datetime.utcnow()
+    return user
+
+def sweep_expired_password_reset_tokens(batch_size: int = PASSWORD_RESET_SWEEP_BATCH_SIZE) -> int:
+    """Borra tokens expirados o usados en lotes (transacciones cortas). Devuelve cuántos borró."""
+    total = 0
+    while True:
+        db = SessionLocal()
+        try:
+            ids = select(PasswordResetToken.id).where(
+                or_(PasswordResetToken.expires_at < datetime.utcnow(), PasswordResetToken.used_at != None)
+            ).limit(batch_size).scalar_subquery()
+            deleted = db.query(PasswordResetToken).filter(
+                PasswordResetToken.id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        total += deleted
+        if deleted < batch_size:
+            break
+    if total:
+        logger.info(f"{total} tokens de recuperación expirados eliminados")
+    return total
+
+def decode_access_token(token: str, db: Session) -> dict:
+    """Valida firma, expiración y revocación del access token y devuelve sus claims."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
@@ -51,11 +386,27 @@ async def get_current_user(
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
+    if payload.get("sub") is None:
+        raise credentials_exception
+    # solo consulta la BD si el filtro de Bloom indica un posible acierto
+    if revocation_list.is_revoked(db, payload):
+        raise credentials_exception
+    return payload
+
+def _load_user_for_claims(payload: dict, db: Session) -> User:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="No se pudieron validar las credenciales",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    username: str = payload.get("sub")
+
+    cache_key = (username, payload.get("iat"))
+    user = _principal_cache.get(cache_key)
+    if user is not None:
+        return user
 
     # Carga la relación correcta con la unidad responsable
     user = db.query(User).options(
@@ -64,92 +415,126 @@ async def get_current_user(
     
     if user is None:
         raise credentials_exception
+
+    # Se desprende de la sesión del request para que un commit del endpoint no
+    # expire sus atributos; la instancia cacheada es de solo lectura.
+    db.expunge(user)
+    _principal_cache.set(cache_key, user)
     return user
 
-def get_admin_user(current_user: User = Depends(get_current_user)):
-    if current_user.role != UserRoles.ADMIN:
+# Dependencias síncronas a propósito: ante un posible acierto del filtro o un
+# fallo de la caché consultan la BD con una Session síncrona, y FastAPI solo las
+# corre en el threadpool si no son `async def` (si no, bloquearían el event loop)
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    payload = decode_access_token(token, db)
+    return _load_user_for_claims(payload, db)
+
+def invalidate_principal(username: Optional[str]) -> None:
+    """Descarta los principals cacheados de un usuario (todas sus sesiones/tokens)."""
+    if username:
+        _principal_cache.discard_where(lambda key: key[0] == username)
+
+@event.listens_for(User, "after_update")
+def _mark_principal_changes(mapper, connection, target):
+    # Cualquier cambio de rol, contraseña, baja lógica o username debe reflejarse
+    # en el siguiente request aunque el endpoint olvide invalidar explícitamente.
+    state = inspect(target)
+    changed = [attr for attr in ("role", "password", "is_deleted", "username") if state.attrs[attr].history.has_changes()]
+    session = object_session(target)
+    if not changed or session is None:
+        return
+    stale = session.info.setdefault("stale_principals", set())
+    stale.add(target.username)
+    stale.update(state.attrs.username.history.deleted)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_principals_after_commit(session: Session) -> None:
+    # después del commit: invalidar en el flush dejaría que otro request recargue
+    # la fila previa al commit y la guarde en la caché todo el TTL
+    for username in session.info.pop("stale_principals", ()):
+        invalidate_principal(username)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_principal_changes(session: Session) -> None:
+    session.info.pop("stale_principals", None)
+
+@dataclass(frozen=True)
+class Principal:
+    """Identidad autenticada construida solo con los claims verificados del JWT.
+
+    Expone `id`, `username` y `role` igual que `User` para que los endpoints
+    puedan usar cualquiera de los dos sin cambios.
+    """
+    id: int
+    username: str
+    email: Optional[str] = None
+    role: Optional[UserRoles] = None
+    jti: Optional[str] = None
+    iat: Optional[int] = None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == UserRoles.ADMIN
+
+def _principal_from_claims(payload: dict) -> Principal:
+    try:
+        # el claim es obligatorio; su valor puede ser null (usuarios sin rol en BD)
+        role = UserRoles(payload["role"]) if payload["role"] is not None else None
+        return Principal(
+            id=int(payload["user_id"]),
+            username=payload["sub"],
+            email=payload.get("email"),
+            role=role,
+            jti=payload.get("jti"),
+            iat=payload.get("iat"),
+        )
+    except (KeyError, TypeError, ValueError):
+        # token sin los claims esperados (p. ej. emitido por una versión anterior)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No se pudieron validar las credenciales",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """Autorización sin consultas: firma + expiración + lista de revocación."""
+    return _principal_from_claims(decode_access_token(token, db))
+
+def get_fresh_principal(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """Como get_current_principal, pero confirma contra la BD (vía la caché de principals)
+    que el usuario sigue activo y con el mismo rol que dice el token."""
+    payload = decode_access_token(token, db)
+    principal = _principal_from_claims(payload)
+    user = _load_user_for_claims(payload, db)
+    if user.is_deleted or user.id != principal.id or user.role != principal.role:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="La sesión ya no es válida, inicia sesión nuevamente",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
+
+def _require_admin(principal: Principal) -> Principal:
+    if not principal.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Solo los administradores pueden realizar esta acción"
         )
-    return current_user
+    return principal
 
-# services/email_service.py
-def enviar_email_recuperacion(destinatario: str, nombre_usuario: str, token: str):
-    # Configuración para entorno de producción con SendGrid
-    SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY', '')
-    
-    # Si no hay API key configurada, usar modo simulado
-    if not SENDGRID_API_KEY:
-        print(f"📧 [Simulado] Enviando correo a {destinatario}")
-        print(f"Hola {nombre_usuario}, usa este token: {token}")
-        print(f"Enlace: http://localhost:3000/reset-password?token={token}")
-        print("⚠️ SENDGRID_API_KEY no configurada. No se envió ningún correo real.")
-        return
-    
-    # Envío real con SendGrid
-    try:
-        from sendgrid import SendGridAPIClient
-        from sendgrid.helpers.mail import Mail, Email, To, Content
-        
-        # Crear el mensaje
-        from_email = Email("no-reply@umich.mx")  # Cambiar por tu email verificado en SendGrid
-        to_email = To(destinatario)
-        subject = "Recuperación de contraseña - Sistema UMICH"
-        
-        # Plantilla HTML del email
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #2c5aa0; color: white; padding: 20px; text-align: center; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 5px; }}
-                .token {{ background-color: #eee; padding: 15px; border-radius: 5px; font-family: monospace; font-size: 16px; }}
-                .button {{ background-color: #2c5aa0; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Recuperación de Contraseña</h1>
-                </div>
-                <div class="content">
-                    <h2>Hola {nombre_usuario},</h2>
-                    <p>Has solicitado restablecer tu contraseña en el Sistema de la Universidad Michoacana.</p>
-                    
-                    <p><strong>Token de recuperación:</strong></p>
-                    <div class="token">{token}</div>
-                    
-                    <p>O haz clic en el siguiente enlace:</p>
-                    <a href="http://localhost:3000/reset-password?token={token}" class="button">
-                        Restablecer Contraseña
-                    </a>
-                    
-                    <p style="margin-top: 30px; color: #666; font-size: 14px;">
-                        ⚠️ Este token expirará en 1 hora. Si no solicitaste este cambio, ignora este mensaje.
-                    </p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        content = Content("text/html", html_content)
-        mail = Mail(from_email, to_email, subject, content)
-        
-        # Enviar el email
-        sg = SendGridAPIClient(SENDGRID_API_KEY)
-        response = sg.send(mail)
-        
-        print(f"✅ Email enviado exitosamente a {destinatario}")
-        print(f"Status Code: {response.status_code}")
-        
-    except Exception as e:
-        print(f"❌ Error enviando email a {destinatario}: {e}")
-        # Fallback: mostrar info en consola
-        print(f"📧 [Fallback] Token para {nombre_usuario}: {token}")
-        print(f"📧 [Fallback] Enlace: http://localhost:3000/reset-password?token={token}")
+def get_admin_principal(principal: Principal = Depends(get_current_principal)) -> Principal:
+    """Admin según los claims del token (sin consultas); para endpoints de lectura."""
+    return _require_admin(principal)
+
+def get_admin_user(principal: Principal = Depends(get_fresh_principal)) -> Principal:
+    """Admin confirmado contra la BD; para endpoints que modifican datos."""
+    return _require_admin(principal)
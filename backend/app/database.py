@@ -1,4 +1,6 @@
+import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -32,6 +34,23 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor asíncrono (asyncpg) para los endpoints `async def`: no ocupan un hilo del
+# threadpool mientras esperan a la BD, la concurrencia la limita el pool.
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=int(os.getenv("ASYNC_DB_POOL_SIZE", "10")),
+    max_overflow=int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20")),
+    pool_timeout=30,
+    pool_recycle=3600,
+    pool_pre_ping=True,
+)
+
+# expire_on_commit=False: tras el commit no se recargan atributos de forma
+# implícita (en async eso fallaría fuera de un await)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 # Context manager para sesiones
@@ -40,4 +59,8 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
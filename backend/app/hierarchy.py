@@ -0,0 +1,457 @@
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from .models import UnidadClosure, UnidadResponsable, User
+from .table_versions import current_versions
+
+logger = logging.getLogger(__name__)
+
+# Tope de vida del índice. Los cambios hechos en otro proceso se detectan
+# antes, por table_versions; esto solo acota el daño si un cambio no la toca
+# (p. ej. SQL manual)
+HIERARCHY_CACHE_TTL_SECONDS = float(os.getenv("HIERARCHY_CACHE_TTL_SECONDS", "300"))
+
+# Tablas de table_versions de las que depende el índice
+TREE_TABLES = ("unidades_responsables", "users")
+
+# Columnas de unidades_responsables que cambian el árbol o lo que se muestra en él
+TREE_ATTRS = ("unidad_padre_id", "responsable", "nombre", "tipo_unidad")
+# Columnas de users que aparecen en el responsable embebido
+RESPONSABLE_ATTRS = ("username", "email")
+
+
+@dataclass(frozen=True)
+class UnitNode:
+    id_unidad: int
+    nombre: str
+    tipo_unidad: Optional[str]
+    unidad_padre_id: Optional[int]
+    responsable: Optional[dict]
+
+
+class HierarchyIndex:
+    """Árbol de unidades responsables en memoria, inmutable una vez construido.
+
+    Guarda padre, hijos y profundidad de cada unidad, y el recorrido de Euler
+    (preorden): `tin[u]` es la posición de u en `order` y `tout[u]` la posición
+    siguiente a su último descendiente. Así "¿a desciende de b?" son dos
+    comparaciones y el subárbol de u es el rebanado `order[tin[u]:tout[u]]`.
+
+    Igual que el CTE recursivo que reemplaza, solo entran las unidades
+    alcanzables desde una raíz (unidad_padre_id nulo); las que quedan en un
+    ciclo o con un padre inexistente se reportan en `unreachable`.
+    """
+
+    def __init__(self, nodes: Iterable[UnitNode], version: int = 0):
+        self.version = version
+        self.nodes: Dict[int, UnitNode] = {n.id_unidad: n for n in nodes}
+        self.children: Dict[int, List[int]] = {uid: [] for uid in self.nodes}
+        roots: List[int] = []
+        for node in self.nodes.values():
+            parent = node.unidad_padre_id
+            if parent is None:
+                roots.append(node.id_unidad)
+            elif parent in self.children:
+                self.children[parent].append(node.id_unidad)
+        sort_key = lambda uid: (self.nodes[uid].nombre or "", uid)
+        roots.sort(key=sort_key)
+        for kids in self.children.values():
+            kids.sort(key=sort_key)
+        self.roots = roots
+
+        self.depth: Dict[int, int] = {}
+        self.tin: Dict[int, int] = {}
+        self.tout: Dict[int, int] = {}
+        self.order: List[int] = []
+        # DFS iterativo: la profundidad del árbol no depende del límite de recursión
+        for root in roots:
+            stack = [(root, 0, False)]
+            while stack:
+                uid, depth, leaving = stack.pop()
+                if leaving:
+                    self.tout[uid] = len(self.order)
+                    continue
+                self.depth[uid] = depth
+                self.tin[uid] = len(self.order)
+                self.order.append(uid)
+                stack.append((uid, depth, True))
+                for child in reversed(self.children[uid]):
+                    stack.append((child, depth + 1, False))
+        self.unreachable = sorted(uid for uid in self.nodes if uid not in self.tin)
+
+    # ------------------------------------------------------------------ consultas
+    def __contains__(self, uid: int) -> bool:
+        return uid in self.tin
+
+    def is_descendant(self, uid: int, ancestor: int) -> bool:
+        """True si `uid` está en el subárbol de `ancestor` (incluida la propia unidad)."""
+        if uid not in self.tin or ancestor not in self.tin:
+            return False
+        return self.tin[ancestor] <= self.tin[uid] and self.tout[uid] <= self.tout[ancestor]
+
+    def ancestors(self, uid: int) -> List[int]:
+        """Ancestros de la raíz hacia abajo, sin incluir a `uid`."""
+        chain = []
+        parent = self.nodes[uid].unidad_padre_id if uid in self.tin else None
+        while parent is not None:
+            chain.append(parent)
+            parent = self.nodes[parent].unidad_padre_id
+        chain.reverse()
+        return chain
+
+    def subtree(self, uid: int) -> List[int]:
+        """`uid` y sus descendientes en preorden (padre antes que hijos)."""
+        if uid not in self.tin:
+            return []
+        return self.order[self.tin[uid]:self.tout[uid]]
+
+    def row(self, uid: int) -> dict:
+        node = self.nodes[uid]
+        return {
+            "id_unidad": node.id_unidad,
+            "nombre": node.nombre,
+            "tipo_unidad": node.tipo_unidad,
+            "nivel": self.depth[uid],
+            "responsable": node.responsable,
+        }
+
+    def rows(self, uids: Iterable[int]) -> List[dict]:
+        return [self.row(uid) for uid in uids]
+
+    def by_level(self, root_id: Optional[int] = None, max_depth: Optional[int] = None) -> List[dict]:
+        """Unidades ordenadas por nivel y nombre (formato de /unidades_jerarquicas).
+
+        Con `root_id` solo su subárbol; con `max_depth` solo hasta esa cantidad
+        de niveles debajo del inicio (0 = solo el inicio).
+        """
+        uids = self.order if root_id is None else self.subtree(root_id)
+        if max_depth is not None:
+            limit = (self.depth[root_id] if root_id is not None else 0) + max_depth
+            uids = [uid for uid in uids if self.depth[uid] <= limit]
+        ordered = sorted(uids, key=lambda uid: (self.depth[uid], self.nodes[uid].nombre or "", uid))
+        return self.rows(ordered)
+
+    def iter_tree_json(self, root_id: Optional[int] = None, max_depth: Optional[int] = None,
+                       chunk_chars: int = 64 * 1024) -> Iterator[bytes]:
+        """Árbol anidado como JSON (`[{..., "hijos": [...]}]`), en pedazos de ~chunk_chars.
+
+        Un solo recorrido en preorden con una pila explícita: cada unidad se
+        escribe una vez (O(n)) y nunca se arma la estructura completa en memoria.
+        """
+        starts = self.roots if root_id is None else [root_id]
+        limit = None
+        if max_depth is not None:
+            limit = (self.depth[root_id] if root_id is not None else 0) + max_depth
+        parts: List[str] = ["["]
+        size = 1
+        stack = [iter(starts)]
+        first = [True]
+        while stack:
+            uid = next(stack[-1], None)
+            if uid is None:
+                stack.pop()
+                first.pop()
+                # cierra el arreglo de hijos y, si no es el de nivel superior, el objeto padre
+                piece = "]}" if stack else "]"
+            else:
+                piece = "" if first[-1] else ","
+                first[-1] = False
+                piece += json.dumps(self.row(uid), ensure_ascii=False)[:-1] + ',"hijos":['
+                expand = limit is None or self.depth[uid] < limit
+                stack.append(iter(self.children[uid] if expand else ()))
+                first.append(True)
+            parts.append(piece)
+            size += len(piece)
+            if size >= chunk_chars:
+                yield "".join(parts).encode("utf-8")
+                parts, size = [], 0
+        if parts:
+            yield "".join(parts).encode("utf-8")
+
+
+def load_nodes(db: Session) -> List[UnitNode]:
+    """Una sola consulta plana (sin recursión) con el responsable embebido."""
+    result = db.execute(text("""
+        SELECT u.id_unidad, u.nombre, u.tipo_unidad, u.unidad_padre_id,
+               us.id AS responsable_id, us.username, us.email
+        FROM unidades_responsables u
+        LEFT JOIN users us ON us.id = u.responsable
+    """)).fetchall()
+    return [
+        UnitNode(
+            id_unidad=row.id_unidad,
+            nombre=row.nombre,
+            tipo_unidad=row.tipo_unidad,
+            unidad_padre_id=row.unidad_padre_id,
+            responsable={"id": row.responsable_id, "username": row.username, "email": row.email}
+            if row.responsable_id else None,
+        )
+        for row in result
+    ]
+
+
+class HierarchyCache:
+    """Índice jerárquico del proceso, versionado.
+
+    `invalidate()` sube la versión y descarta el índice; el siguiente `get()`
+    lo reconstruye. Si hubo una invalidación mientras se construía, el índice
+    recién armado se usa para ese request pero no se guarda.
+
+    Con `version_reader` el índice además se valida en cada `get()` contra los
+    contadores de table_versions, así que los cambios hechos por otros workers
+    se ven en el siguiente request y no al vencer el TTL.
+    """
+
+    def __init__(self, loader: Callable[[Session], List[UnitNode]] = load_nodes,
+                 ttl: float = HIERARCHY_CACHE_TTL_SECONDS, clock: Callable[[], float] = time.monotonic,
+                 version_reader: Optional[Callable[[Session], tuple]] = None):
+        self._loader = loader
+        self.ttl = ttl
+        self._clock = clock
+        self._version_reader = version_reader
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._index: Optional[HierarchyIndex] = None
+        self._built_at = 0.0
+        self._source_version: Optional[tuple] = None
+        self.version = 0
+
+    def _current(self, source_version: Optional[tuple]) -> Optional[HierarchyIndex]:
+        index = self._index
+        if index is None or self._clock() - self._built_at >= self.ttl:
+            return None
+        if source_version is not None and source_version != self._source_version:
+            return None
+        return index
+
+    def get(self, db: Session, source_version: Optional[tuple] = None) -> HierarchyIndex:
+        """Índice vigente. `source_version` evita releer los contadores si el llamador ya los tiene."""
+        if source_version is None and self._version_reader is not None:
+            # se lee antes de cargar: el índice nunca queda más viejo que su versión
+            source_version = self._version_reader(db)
+        index = self._current(source_version)
+        if index is not None:
+            return index
+        # un solo hilo reconstruye; los demás esperan y usan su resultado
+        with self._build_lock:
+            index = self._current(source_version)
+            if index is not None:
+                return index
+            with self._lock:
+                version = self.version
+            index = HierarchyIndex(self._loader(db), version=version)
+            with self._lock:
+                if self.version == version:
+                    self._index = index
+                    self._built_at = self._clock()
+                    self._source_version = source_version
+            return index
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.version += 1
+            self._index = None
+
+
+def read_tree_version(db: Session) -> tuple:
+    """Versiones de las tablas de las que sale el índice (unidades y responsables)."""
+    return current_versions(db, TREE_TABLES)
+
+
+hierarchy_cache = HierarchyCache(version_reader=read_tree_version)
+
+
+# -----------------------------------------------------------------------------
+#  Tabla de cierre (unidades_closure), en la misma transacción que el cambio
+# -----------------------------------------------------------------------------
+CLOSURE_INSERT_SQL = text("""
+    INSERT INTO unidades_closure (ancestor_id, descendant_id, depth)
+    SELECT :uid, :uid, 0
+    UNION ALL
+    SELECT ancestor_id, :uid, depth + 1 FROM unidades_closure WHERE descendant_id = :parent
+""")
+
+# Quita los caminos de los ancestros anteriores hacia todo el subárbol movido
+CLOSURE_DETACH_SQL = text("""
+    DELETE FROM unidades_closure
+    WHERE descendant_id IN (SELECT descendant_id FROM unidades_closure WHERE ancestor_id = :uid)
+      AND ancestor_id NOT IN (SELECT descendant_id FROM unidades_closure WHERE ancestor_id = :uid)
+""")
+
+# Conecta cada ancestro del nuevo padre con cada nodo del subárbol movido
+CLOSURE_ATTACH_SQL = text("""
+    INSERT INTO unidades_closure (ancestor_id, descendant_id, depth)
+    SELECT super.ancestor_id, sub.descendant_id, super.depth + sub.depth + 1
+    FROM unidades_closure super
+    CROSS JOIN unidades_closure sub
+    WHERE super.descendant_id = :parent AND sub.ancestor_id = :uid
+""")
+
+
+@event.listens_for(UnidadResponsable, "after_insert")
+def _closure_on_insert(mapper, connection, target):
+    connection.execute(CLOSURE_INSERT_SQL, {"uid": target.id_unidad, "parent": target.unidad_padre_id})
+
+
+@event.listens_for(UnidadResponsable, "after_update")
+def _closure_on_reparent(mapper, connection, target):
+    history = inspect(target).attrs.unidad_padre_id.history
+    if not history.has_changes():
+        return
+    move_subtree_in_closure(connection, target.id_unidad, target.unidad_padre_id)
+
+
+def move_subtree_in_closure(connection, uid: int, new_parent: Optional[int]) -> None:
+    """Re-cuelga el subárbol de `uid` bajo `new_parent` (None = raíz) en unidades_closure."""
+    connection.execute(CLOSURE_DETACH_SQL, {"uid": uid})
+    if new_parent is not None:
+        connection.execute(CLOSURE_ATTACH_SQL, {"uid": uid, "parent": new_parent})
+
+
+# Reconstrucción completa desde unidad_padre_id: caminos desde cada raíz, más
+# el par consigo misma de las unidades que no cuelgan de ninguna raíz
+CLOSURE_REBUILD_SQL = [
+    "LOCK TABLE unidades_responsables IN SHARE MODE",
+    "DELETE FROM unidades_closure",
+    """
+    WITH RECURSIVE tree AS (
+        SELECT id_unidad, ARRAY[id_unidad] AS path
+        FROM unidades_responsables WHERE unidad_padre_id IS NULL
+        UNION ALL
+        SELECT u.id_unidad, t.path || u.id_unidad
+        FROM unidades_responsables u JOIN tree t ON u.unidad_padre_id = t.id_unidad
+    )
+    INSERT INTO unidades_closure (ancestor_id, descendant_id, depth)
+    SELECT p.ancestor_id, t.id_unidad, array_length(t.path, 1) - p.pos
+    FROM tree t, unnest(t.path) WITH ORDINALITY AS p(ancestor_id, pos)
+    """,
+    """
+    INSERT INTO unidades_closure (ancestor_id, descendant_id, depth)
+    SELECT u.id_unidad, u.id_unidad, 0 FROM unidades_responsables u
+    WHERE NOT EXISTS (
+        SELECT 1 FROM unidades_closure c WHERE c.ancestor_id = u.id_unidad AND c.descendant_id = u.id_unidad
+    )
+    """,
+]
+
+
+def rebuild_closure(connection) -> None:
+    """Recalcula unidades_closure completa en la transacción de `connection` (bloquea altas y cambios)."""
+    for sql in CLOSURE_REBUILD_SQL:
+        connection.execute(text(sql))
+
+
+def subtree_unit_ids(unidad_id: int):
+    """Subconsulta con los ids del subárbol de `unidad_id` (incluida), por la PK de unidades_closure."""
+    return select(UnidadClosure.descendant_id).where(UnidadClosure.ancestor_id == unidad_id)
+
+
+def ancestor_unit_ids(unidad_id: int):
+    """Subconsulta con los ids de los ancestros de `unidad_id` (sin incluirla)."""
+    return select(UnidadClosure.ancestor_id).where(
+        UnidadClosure.descendant_id == unidad_id, UnidadClosure.depth > 0
+    )
+
+
+# -----------------------------------------------------------------------------
+#  Movimientos de unidades (cambio de padre) sin ciclos
+# -----------------------------------------------------------------------------
+# Dos movimientos concurrentes podrían pasar cada uno la validación y juntos
+# formar un ciclo (A bajo B y B bajo A): se serializan con este candado. Las
+# altas con padre también lo toman, porque copian los ancestros del padre
+HIERARCHY_MOVE_LOCK_KEY = 7_420_022
+
+
+def lock_hierarchy_moves(db: Session) -> None:
+    """Toma el candado de movimientos hasta el fin de la transacción (solo PostgreSQL)."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": HIERARCHY_MOVE_LOCK_KEY})
+
+
+def would_create_cycle(db: Session, unidad_id: int, new_parent_id: Optional[int]) -> bool:
+    """¿Colgar `unidad_id` de `new_parent_id` formaría un ciclo?
+
+    Pasa si el nuevo padre es la unidad misma o uno de sus descendientes. Los
+    ancestros ya están precalculados en unidades_closure: es una búsqueda por PK.
+    """
+    if new_parent_id is None:
+        return False
+    return db.execute(
+        select(UnidadClosure.depth).where(
+            UnidadClosure.ancestor_id == unidad_id, UnidadClosure.descendant_id == new_parent_id
+        )
+    ).first() is not None
+
+
+def move_units(db: Session, moves: Iterable[tuple]) -> List[UnidadResponsable]:
+    """Aplica los movimientos `(id_unidad, unidad_padre_id)` en orden, sin confirmar.
+
+    Cada movimiento se valida contra el árbol que dejan los anteriores (el
+    flush actualiza unidades_closure), así que un lote puede reorganizar ramas
+    enteras. Si alguno falla se lanza HTTPException y el llamador no confirma
+    nada: el lote es todo o nada.
+    """
+    lock_hierarchy_moves(db)
+    moved = []
+    for unidad_id, new_parent_id in moves:
+        unidad = db.get(UnidadResponsable, unidad_id)
+        if unidad is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No se encontró una unidad con ID {unidad_id}")
+        if new_parent_id is not None and db.get(UnidadResponsable, new_parent_id) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No se encontró una unidad padre con ID {new_parent_id}")
+        if would_create_cycle(db, unidad_id, new_parent_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"La unidad {new_parent_id} depende de la unidad {unidad_id}: moverla ahí formaría un ciclo"
+            )
+        if unidad.unidad_padre_id != new_parent_id:
+            unidad.unidad_padre_id = new_parent_id
+            db.flush()
+        moved.append(unidad)
+    return moved
+
+
+# -----------------------------------------------------------------------------
+#  Invalidación: al confirmar una transacción que tocó el árbol
+# -----------------------------------------------------------------------------
+def _touches_tree(obj) -> bool:
+    if isinstance(obj, UnidadResponsable):
+        attrs = TREE_ATTRS
+    elif isinstance(obj, User):
+        attrs = RESPONSABLE_ATTRS
+    else:
+        return False
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+@event.listens_for(Session, "before_flush")
+def _mark_hierarchy_changes(session: Session, flush_context, instances) -> None:
+    if session.info.get("hierarchy_dirty"):
+        return
+    if any(isinstance(obj, UnidadResponsable) for obj in session.new) \
+            or any(isinstance(obj, UnidadResponsable) for obj in session.deleted) \
+            or any(_touches_tree(obj) for obj in session.dirty):
+        session.info["hierarchy_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_hierarchy_after_commit(session: Session) -> None:
+    # después del commit: invalidar antes dejaría que otro request reconstruya
+    # con los datos previos y los guarde
+    if session.info.pop("hierarchy_dirty", False):
+        hierarchy_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_hierarchy_changes(session: Session) -> None:
+    session.info.pop("hierarchy_dirty", None)
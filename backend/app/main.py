@@ -1,4 +1,5 @@
 import io
+import json
 import secrets
 import string
 from fastapi import BackgroundTasks, FastAPI, HTTPException, Depends, status, Body, Query, Request 
@@ -11,27 +12,62 @@ from fastapi.middleware.cors import CORSMiddleware
 from .middleware import AuditMiddleware
 from sqlalchemy import create_engine, text, func
 from contextlib import asynccontextmanager
-from datetime import date, timedelta, datetime
+from datetime import date, timedelta, datetime, timezone
 from enum import Enum
 import logging
 from .auth import (
     authenticate_user,
+    build_access_token_claims,
+    calibrate_password_hashing,
+    consume_password_reset_token,
+    issue_password_reset_token,
+    sweep_expired_password_reset_tokens,
+    PASSWORD_RESET_TOKEN_EXPIRE_MINUTES,
+    PASSWORD_RESET_SWEEP_INTERVAL_SECONDS,
     create_access_token,
-    enviar_email_recuperacion,
+    decode_access_token,
     get_current_user,
     get_password_hash,
     verify_password,
     get_admin_user,
-    
+    get_admin_principal,
+    get_current_principal,
+    get_fresh_principal,
+    invalidate_principal,
+    Principal,
+    issue_refresh_token,
+    oauth2_scheme,
+    password_hasher,
+    revoke_refresh_family,
+    revoke_user_credentials,
+    rotate_refresh_token,
+    hash_token,
+)
+from .hierarchy import TREE_TABLES, hierarchy_cache, lock_hierarchy_moves, move_units, subtree_unit_ids
+from .table_versions import current_versions, etag_matches, make_etag, versions_from_rows, versions_query
+from .unidad_facets import facets_cache, facets_query, fold_facet_rows, unidad_filters
+from .pagination import apply_keyset, count_with_estimate, decode_cursor, encode_cursor, keyset_page, split_page
+from .periodic import PeriodicScheduler
+from .revocation import REVOCATION_REBUILD_SECONDS, REVOCATION_REFRESH_SECONDS, revocation_list
+from .services.email_outbox import EMAIL_OUTBOX_PURGE_INTERVAL_SECONDS, enqueue_password_recovery, purge_email_outbox
+from .rate_limit import enforce_forgot_password_rate_limit, enforce_login_rate_limit
+from .audit import audit_writer, create_audit_log, record_audit
+from .audit_rollup import actions_per_day, failed_actions_per_actor
+from .audit_export import AUDIT_EXPORT_YIELD_PER, EXPORT_FORMATS, stream_export
+from .audit_partitions import (
+    AUDIT_PARTITION_MAINTENANCE_INTERVAL_SECONDS, archived_total, iter_archived_audit_logs, read_archived_audit_logs,
+    run_partition_maintenance,
 )
-from .audit import create_audit_log
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-from .models import Anexos, User, UserRoles, UnidadResponsable, PasswordAuditLog, AuditLog, Cargo, UserCargoHistorial
-from .schemas import ActaResponse, ActaCreate, ActaUpdate, ForgotPasswordRequest, ChangePasswordRequest, UserResponse, AnexoUpdate, ResetPasswordRequest, PasswordChangeResponse
+from .models import Anexos, User, UserRoles, UnidadResponsable, PasswordAuditLog, AuditLog, Cargo, UserCargoHistorial, RefreshToken
+from .schemas import ActaResponse, ActaCreate, ActaUpdate, ForgotPasswordRequest, ChangePasswordRequest, UserResponse, AnexoUpdate, ResetPasswordRequest, PasswordChangeResponse, PasswordResetConfirm, RefreshTokenRequest
 from .models import ActaEntregaRecepcion, Resumen
 from .schemas import AnexoCreate, AnexoResponse, CargoCreate, CargoResponse, UserCargoHistorialCreate, UserCargoHistorialResponse, ResumenBase, ResumenCreate, ResumenResponse
-from .schemas import UnidadResponsableUpdate, UnidadResponsableResponse, UnidadResponsableCreate, UnidadJerarquicaResponse, UserCreate
-from .database import SessionLocal, engine, Base, get_db
+from .schemas import UnidadResponsableUpdate, UnidadResponsableResponse, UnidadResponsableCreate, UnidadJerarquicaResponse, UnidadesMoverRequest, UserCreate
+from .database import SessionLocal, engine, Base, get_db, get_async_db, async_engine
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy.sql import text
 from contextlib import contextmanager
@@ -42,6 +78,7 @@ from sqlalchemy.orm import joinedload
 from fastapi import UploadFile, File
 import os
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response, StreamingResponse
 
 
 
@@ -94,10 +131,33 @@ def session_scope():
     finally:
         session.close()
 
+# Tareas de mantenimiento que corren en segundo plano mientras vive la app
+scheduler = PeriodicScheduler()
+scheduler.add("password_reset_sweeper", PASSWORD_RESET_SWEEP_INTERVAL_SECONDS, sweep_expired_password_reset_tokens)
+scheduler.add("audit_partition_maintenance", AUDIT_PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+              run_partition_maintenance, run_on_start=True)
+# la lista de revocación se actualiza aquí y no en el request (camino caliente)
+scheduler.add("revocation_refresh", REVOCATION_REFRESH_SECONDS, revocation_list.refresh)
+scheduler.add("revocation_rebuild", REVOCATION_REBUILD_SECONDS, revocation_list.rebuild)
+scheduler.add("email_outbox_purge", EMAIL_OUTBOX_PURGE_INTERVAL_SECONDS, purge_email_outbox, run_on_start=True)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
+    # Ajusta el costo de bcrypt al hardware donde corre el contenedor
+    calibrate_password_hashing()
+    # filtro de revocación completo antes de aceptar requests; luego lo mantiene el scheduler
+    try:
+        revocation_list.rebuild()
+    except Exception:
+        logger.exception("No se pudo cargar la lista de revocación al arrancar")
+    scheduler.start()
+    audit_writer.start()
     yield
+    scheduler.stop()
+    # escribir los eventos de auditoría que sigan en cola antes de salir
+    audit_writer.stop()
+    await async_engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -114,6 +174,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # cursor de la siguiente página en listados paginados
 )
 
 # Middleware para capturar IP y user-agent (disponible en request.state.client_ip)
@@ -224,7 +285,9 @@ def register(user: UserCreate):
         }
 
 @app.post("/token", tags=["Usuario"])
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
+def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    # antes de tocar la BD o bcrypt: las ráfagas de credential stuffing se cortan aquí
+    enforce_login_rate_limit(request, form_data.username)
     with session_scope() as db:
         # Verificar si el usuario existe y la contraseña es correcta
         user = authenticate_user(db, form_data.username, form_data.password)
@@ -254,18 +317,15 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
         
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={
-                "sub": user.username,
-                "user_id": user.id,
-                "email": user.email,
-                "username": user.username,
-                "role": user.role.value if isinstance(user.role, Enum) else user.role
-            },
+            data=build_access_token_claims(user),
             expires_delta=access_token_expires
         )
+        # refresh token para renovar el access token sin volver a pasar por bcrypt
+        refresh_token, _ = issue_refresh_token(db, user.id)
         
         return {
             "access_token": access_token,
+            "refresh_token": refresh_token,
             "token_type": "bearer",
             "user_id": user.id,
             "username": user.username,
@@ -273,19 +333,75 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
             "role": user.role
         }
 
+@app.post("/token/refresh", tags=["Usuario"])
+def refresh_access_token(payload: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """
+    Renueva el access token usando un refresh token (rotación con detección de reuso).
+
+    - Cada refresh token sirve una sola vez; la respuesta incluye uno nuevo
+    - Presentar un refresh token ya usado revoca toda su familia (posible robo)
+    - No verifica contraseña: una búsqueda por índice + la firma del JWT
+    """
+    user, refresh_token = rotate_refresh_token(db, payload.refresh_token)
+    access_token = create_access_token(
+        data=build_access_token_claims(user),
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    # armar la respuesta antes del commit para no recargar el usuario
+    response = {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "user_id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "role": user.role
+    }
+    db.commit()
+    return response
+
+@app.post("/logout", tags=["Usuario"])
+def logout(
+    payload: RefreshTokenRequest | None = None,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    """
+    Revoca el access token actual (por su jti) y, si se envía, la familia del refresh token.
+    """
+    claims = decode_access_token(token, db)
+    if claims.get("jti"):
+        revocation_list.revoke(
+            db,
+            jti=claims["jti"],
+            user_id=claims.get("user_id"),
+            expires_at=datetime.utcfromtimestamp(claims["exp"]),
+        )
+    if payload and payload.refresh_token:
+        db_token = db.query(RefreshToken).filter(
+            RefreshToken.token_hash == hash_token(payload.refresh_token),
+            RefreshToken.user_id == claims.get("user_id"),
+        ).first()
+        if db_token:
+            revoke_refresh_family(db, db_token.family_id)
+    db.commit()
+    return {"message": "Sesión cerrada"}
+
 @app.get("/users", response_model=list[UserResponse], tags=["Usuario"])
-def get_users(skip: int = 0, 
+async def get_users(skip: int = 0, 
         limit: int = 1000,
-        db: Session = Depends(get_db), 
+        db: AsyncSession = Depends(get_async_db), 
         #current_user: User = Depends(get_current_user)
         ):
-    users = (
-        db.query(User)
+    # en async no hay carga perezosa: todo lo que serializa UserResponse se carga aquí
+    result = await db.execute(
+        select(User)
+        .options(selectinload(User.unidad))
         .filter(User.is_deleted == False)
         .offset(skip)
         .limit(limit)
-        .all()
     )
+    users = result.scalars().all()
     # forzar normalizacion hacia el schema UserResponse (evitar problemas de serialización con objetos SQLAlchemy)
     return [UserResponse.model_validate(u) for u in users]
 
@@ -315,7 +431,7 @@ def read_user(user_id: int, db: Session = Depends(get_db)):
 
 
 @app.delete("/users/{user_id}", tags=["Usuario"])
-def soft_delete_user(user_id: int, current_user: User = Depends(get_admin_user)):
+def soft_delete_user(user_id: int, current_user: Principal = Depends(get_admin_user)):
     with session_scope() as db:
         user = db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
         if not user:
@@ -324,7 +440,12 @@ def soft_delete_user(user_id: int, current_user: User = Depends(get_admin_user))
                 detail="Usuario no encontrado",
             )
         setattr(user, "is_deleted", True)
-        return {"message": "Usuario marcado como eliminado"}
+        # Los tokens ya emitidos dejan de servir de inmediato, no hasta que expiren
+        revoke_user_credentials(db, user.id)
+        username = user.username
+    # Invalidar después del commit para que ningún request vuelva a cachear el estado anterior
+    invalidate_principal(username)
+    return {"message": "Usuario marcado como eliminado"}
 
 @app.post("/users/{user_id}/change_password", response_model=PasswordChangeResponse, tags=["Usuario"])
 def change_password(
@@ -379,6 +500,8 @@ def change_password(
         # Hash de la nueva contraseña con bcrypt (cost 12 por defecto en passlib)
         user.password = get_password_hash(password_data.new_password)
         user.updated_at = datetime.utcnow()
+        # las sesiones abiertas (access y refresh tokens) no sobreviven al cambio
+        revoke_user_credentials(db, user.id)
         
         # Registrar auditoría si un admin cambió la contraseña de otro usuario
         if current_user.id != user_id:
@@ -390,22 +513,20 @@ def change_password(
             )
             db.add(audit_log)
 
-        # Registro genérico en audit_logs
-        try:
-            create_audit_log(
-                db=db,
-                actor_id=current_user.id,
-                action='change_password',
-                object_type='user',
-                object_id=user_id,
-                metadata={"admin_override": current_user.id != user_id},
-                ip=(request.state.client_ip if request else None)
-            )
-        except Exception:
-            pass
+        # Registro genérico en audit_logs (mismo commit que el cambio)
+        record_audit(
+            db,
+            actor_id=current_user.id,
+            action='change_password',
+            object_type='user',
+            object_id=user_id,
+            metadata={"admin_override": current_user.id != user_id},
+            ip=(request.state.client_ip if request else None)
+        )
         
         db.commit()
         
+        invalidate_principal(user.username)
         logger.info(f"Contraseña cambiada exitosamente para usuario {user_id} por usuario {current_user.id}")
         
         return PasswordChangeResponse(
@@ -417,7 +538,7 @@ def change_password(
 def reset_password(
     user_id: int,
     password_data: ResetPasswordRequest,
-    current_user: User = Depends(get_admin_user),
+    current_user: Principal = Depends(get_admin_user),
     request: Request = None,
 ):
     """
@@ -446,6 +567,8 @@ def reset_password(
         # Hash de la nueva contraseña con bcrypt
         user.password = get_password_hash(password_data.new_password)
         user.updated_at = datetime.utcnow()
+        # las sesiones abiertas (access y refresh tokens) no sobreviven al reseteo
+        revoke_user_credentials(db, user.id)
         
         # Registrar auditoría (OBLIGATORIO para seguridad)
         audit_log = PasswordAuditLog(
@@ -456,21 +579,19 @@ def reset_password(
         )
         db.add(audit_log)
 
-        # Registro genérico en audit_logs
-        try:
-            create_audit_log(
-                db=db,
-                actor_id=current_user.id,
-                action='reset_password',
-                object_type='user',
-                object_id=user_id,
-                metadata={"note": "admin_reset"},
-                ip=(request.state.client_ip if request else None)
-            )
-        except Exception:
-            pass
+        # Registro genérico en audit_logs (mismo commit que el cambio)
+        record_audit(
+            db,
+            actor_id=current_user.id,
+            action='reset_password',
+            object_type='user',
+            object_id=user_id,
+            metadata={"note": "admin_reset"},
+            ip=(request.state.client_ip if request else None)
+        )
         
         db.commit()
+        invalidate_principal(user.username)
         
         # Log en el sistema (NO incluir contraseña)
         logger.info(
@@ -485,11 +606,12 @@ def reset_password(
         )
 
 @app.post("/forgot-password", tags=["Usuario"])
-async def forgot_password(
+def forgot_password(
     request: ForgotPasswordRequest,
-    background_tasks: BackgroundTasks,
+    http_request: Request,
     db: Session = Depends(get_db)
 ):
+    enforce_forgot_password_rate_limit(http_request, request.email)
     # buscar usuario por email
      # Buscar usuario por email
     user = db.query(User).filter(User.email == request.email, User.is_deleted == False).first()
@@ -501,31 +623,65 @@ async def forgot_password(
             detail="Si el email está registrado, recibirás instrucciones para recuperar tu contraseña."
         )
 
-    # Generar token y expiración (15 minutos)
-    token = generar_token_seguro()
-    expires_at = datetime.utcnow() + timedelta(minutes=15)
-
-    # Guardar en la base de datos
-    user.reset_token = token
-    user.reset_expires = expires_at
+    # Token de un solo uso (15 minutos); en BD solo se guarda su hash. El correo
+    # se encola en la misma transacción: si el commit falla no sale, y si el
+    # proceso se reinicia el worker lo envía igual
+    token = issue_password_reset_token(db, user.id)
+    enqueue_password_recovery(db, destinatario=user.email, nombre_usuario=user.username, token=token,
+                              expires_at=datetime.utcnow() + timedelta(minutes=PASSWORD_RESET_TOKEN_EXPIRE_MINUTES))
     db.commit()
 
-    # Enviar correo en segundo plano (mañana lo activamos)
-    try:
-        background_tasks.add_task(
-            enviar_email_recuperacion,
-            destinatario=user.email,
-            nombre_usuario=user.username,
-            token=token
-        )
-    except Exception as e:
-        print(f"[WARN] No se pudo programar el envío de correo: {e}")
-        # No detenemos el flujo
-
     return {
         "message": "Si el email está registrado, recibirás instrucciones para recuperar tu contraseña."
     }
 
+@app.post("/reset-password", response_model=PasswordChangeResponse, tags=["Usuario"])
+def reset_password_with_token(
+    payload: PasswordResetConfirm,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Establece una nueva contraseña con el token recibido por correo (/forgot-password).
+
+    - El token es de un solo uso y expira a los 15 minutos
+    - Revoca las sesiones abiertas del usuario (access y refresh tokens)
+    """
+    user = consume_password_reset_token(db, payload.token)
+    user.password = get_password_hash(payload.new_password)
+    user.updated_at = datetime.utcnow()
+    revoke_user_credentials(db, user.id)
+
+    # Registro genérico en audit_logs (mismo commit que el cambio)
+    record_audit(
+        db,
+        actor_id=user.id,
+        action='reset_password',
+        object_type='user',
+        object_id=user.id,
+        metadata={"note": "email_token"},
+        ip=request.state.client_ip
+    )
+
+    db.commit()
+    invalidate_principal(user.username)
+    logger.info(f"Contraseña restablecida por token de recuperación para usuario {user.id}")
+
+    return PasswordChangeResponse(
+        message="Contraseña restablecida exitosamente",
+        success=True
+    )
+
+@app.get("/admin/metrics/password_hashing", tags=["Admin"])
+def password_hashing_metrics(current_admin: Principal = Depends(get_admin_principal)):
+    """Métricas del executor de bcrypt: tiempo en cola vs tiempo de hash y rechazos (503)."""
+    return password_hasher.stats()
+
+@app.get("/admin/metrics/audit_writer", tags=["Admin"])
+def audit_writer_metrics(current_admin: Principal = Depends(get_admin_principal)):
+    """Métricas del escritor de auditoría por lotes: encolados, escritos, lotes, errores y pendientes."""
+    return audit_writer.stats()
+
 # =================================================================================================
 #                                           DEBUG
 # =================================================================================================
@@ -565,64 +721,132 @@ def obtener_unidad_por_usuario(user_id:int, db: Session = Depends(get_db)):
         }
     }
 
+# -----------------------------------------------------------------------------
+# GET condicional (ETag / If-None-Match) para listados de referencia
+# -----------------------------------------------------------------------------
+# Tablas de las que sale cada listado (el responsable embebido viene de users)
+UNIDADES_TABLES = ("unidades_responsables", "users")
+FACETS_TABLES = ("unidades_responsables",)
+CARGOS_TABLES = ("cargos",)
+ETAG_HEADERS = {"Cache-Control": "private, no-cache"}
+
+
+def _not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    """304 vacío si el cliente ya tiene `etag`; si no, agrega el ETag a la respuesta y devuelve None."""
+    headers = {"ETag": etag, **ETAG_HEADERS}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 # endpoint para arbol jerarquico de unidades responsables
 @app.get(
     "/unidades_jerarquicas",
     response_model=List[UnidadJerarquicaResponse],
     tags=["Jerarquía de Unidades Responsables", "Unidades Responsables"]
 )
-def unidades_jerarquicas(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def unidades_jerarquicas(
+    request: Request,
+    response: Response,
+    format: str = Query("flat", pattern="^(flat|tree)$"),
+    root_id: int | None = None,
+    max_depth: int | None = Query(None, ge=0),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Jerarquía de unidades responsables.
 
-    # Asegúrate de comparar el valor real, no el objeto columna
-    user_role = current_user.role.value if isinstance(current_user.role, Enum) else str(current_user.role)
-    if user_role != UserRoles.ADMIN.value:
+    - `format=flat` (default): lista plana ordenada por nivel y nombre
+    - `format=tree`: árbol anidado (`hijos` en cada unidad), armado en un solo
+      recorrido y enviado en streaming
+    - `root_id`: solo el subárbol de esa unidad
+    - `max_depth`: niveles debajo del inicio que se incluyen (0 = solo el inicio)
+    """
+    # Autorización solo con los claims del token (sin consultar users)
+    if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="No tienes permiso para acceder a esta información"
         )
     
-    sql = text("""
-        WITH RECURSIVE jerarquia AS (
-            SELECT 
-                u.id_unidad, u.nombre, u.tipo_unidad, u.unidad_padre_id, 0 as nivel,
-                u.responsable as responsable_id
-            FROM unidades_responsables u
-            WHERE unidad_padre_id IS NULL
-            UNION ALL
-            SELECT 
-                u.id_unidad, u.nombre, u.tipo_unidad, u.unidad_padre_id, j.nivel + 1,
-                u.responsable as responsable_id
-            FROM unidades_responsables u
-            JOIN jerarquia j ON u.unidad_padre_id = j.id_unidad
+    # Revalidación: solo se leen los contadores de table_versions
+    versions = current_versions(db, TREE_TABLES)
+    etag = make_etag("unidades_jerarquicas", versions)
+    not_modified = _not_modified(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    # Índice en memoria del proceso: se reconstruye solo cuando cambia el árbol
+    index = hierarchy_cache.get(db, source_version=versions)
+    if root_id is not None and root_id not in index:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unidad no encontrada en la jerarquía")
+    if format == "tree":
+        return StreamingResponse(
+            index.iter_tree_json(root_id, max_depth), media_type="application/json",
+            headers={"ETag": etag, **ETAG_HEADERS}
         )
-        SELECT 
-            j.id_unidad, j.nombre, j.tipo_unidad, j.nivel, 
-            us.id as responsable_id, us.username, us.email
-        FROM jerarquia j
-        LEFT JOIN users us ON j.responsable_id = us.id
-        ORDER BY j.nivel, j.nombre;
-    """)
-    result = db.execute(sql).fetchall()
+    return index.by_level(root_id, max_depth)
 
-    unidades = []
-    for row in result:
-        responsable = None
-        if row.responsable_id:
-            responsable = {
-                "id": row.responsable_id,
-                "username": row.username,
-                "email": row.email
-            }
 
-        unidades.append({
-            "id_unidad": row.id_unidad,
-            "nombre": row.nombre,
-            "tipo_unidad": row.tipo_unidad,
-            "nivel": row.nivel,
-            "responsable": responsable
-        })
+@app.get(
+    "/unidades_responsables/{unidad_id}/subarbol",
+    response_model=List[UnidadJerarquicaResponse],
+    tags=["Jerarquía de Unidades Responsables", "Unidades Responsables"]
+)
+def subarbol_unidad(unidad_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """La unidad y todas sus dependientes (directas e indirectas), padre antes que hijos."""
+    index = _hierarchy_for(current_user, unidad_id, db)
+    return index.rows(index.subtree(unidad_id))
 
-    return unidades
+
+@app.get(
+    "/unidades_responsables/{unidad_id}/ancestros",
+    response_model=List[UnidadJerarquicaResponse],
+    tags=["Jerarquía de Unidades Responsables", "Unidades Responsables"]
+)
+def ancestros_unidad(unidad_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """Cadena de unidades superiores, de la raíz a la unidad padre."""
+    index = _hierarchy_for(current_user, unidad_id, db)
+    return index.rows(index.ancestors(unidad_id))
+
+
+def _hierarchy_for(current_user: Principal, unidad_id: int, db: Session):
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permiso para acceder a esta información"
+        )
+    index = hierarchy_cache.get(db)
+    if unidad_id not in index:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unidad no encontrada en la jerarquía")
+    return index
+
+@app.post(
+    "/unidades_responsables/mover",
+    tags=["Unidades Responsables"],
+    summary="Mover varias unidades en la jerarquía (transaccional)"
+)
+def mover_unidades(
+    payload: UnidadesMoverRequest,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_fresh_principal)
+):
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permiso para actualizar unidades responsables"
+        )
+
+    # En orden y en una sola transacción: si uno falla no se aplica ninguno
+    movimientos = [(m.id_unidad, m.unidad_padre_id) for m in payload.movimientos]
+    move_units(db, movimientos)
+    record_audit(
+        db, actor_id=current_user.id, action='move_unidades', object_type='unidad_responsable',
+        metadata={'movimientos': [{'id_unidad': u, 'unidad_padre_id': p} for u, p in movimientos]}
+    )
+    db.commit()
+    return {"message": "Unidades movidas correctamente", "movidas": len(movimientos)}
 
 # endpoint para crear unidades responsables
 @app.post(
@@ -633,12 +857,11 @@ def unidades_jerarquicas(db: Session = Depends(get_db), current_user: User = Dep
 )
 def create_unidades_responsables(
     unidad: UnidadResponsableCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_fresh_principal),
     db: Session = Depends(get_db)
 ):
     # Verificar que el usuario tiene permisos de administrador
-    user_role = current_user.role.value if isinstance(current_user.role, Enum) else str(current_user.role)
-    if user_role != UserRoles.ADMIN.value:
+    if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="No tienes permiso para crear unidades responsables"
@@ -681,6 +904,10 @@ def create_unidades_responsables(
             detail="La unidad no puede ser su propia unidad padre"
         )
 
+    # el alta copia los ancestros del padre a unidades_closure: se serializa con
+    # los movimientos para no copiar un camino que otro request está cambiando
+    lock_hierarchy_moves(db)
+
     # Verificar que la unidad padre exista
     parent_unidad = db.query(UnidadResponsable).filter(UnidadResponsable.id_unidad == unidad.unidad_padre_id).first()
     if not parent_unidad:
@@ -749,11 +976,10 @@ def actualizar_unidad(
     id_unidad: int,
     unidad_actualizacion: UnidadResponsableUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_fresh_principal)
 ):
     # Solo el admin puede actualizar unidades responsables
-    user_role = current_user.role.value if isinstance(current_user.role, Enum) else str(current_user.role)
-    if user_role != UserRoles.ADMIN.value:
+    if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="No tienes permiso para actualizar unidades responsables"
@@ -788,9 +1014,8 @@ def actualizar_unidad(
         unidad_padre_id = data["unidad_padre_id"]
         if unidad_padre_id == id_unidad:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La unidad no puede ser su propia unidad padre")
-        unidad_padre = db.query(UnidadResponsable).get(unidad_padre_id)
-        if not unidad_padre:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No se encontró una unidad padre con ID {unidad_padre_id}")
+        # valida que el padre exista y no sea un descendiente (ciclo), y lo aplica
+        move_units(db, [(id_unidad, data.pop("unidad_padre_id"))])
 
     if "rfc" in data and data["rfc"] is not None and len(str(data["rfc"])) != 13:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El RFC debe tener 13 caracteres")
@@ -881,92 +1106,138 @@ def actualizar_unidad(
 
 
 
-""" @app.get(
-    "/unidades_responsables",
-    response_model=List[UnidadResponsableResponse],
-    tags=["Unidades Responsables"]
+# Columnas que devuelve el catálogo; el responsable sale del mismo SELECT (outer join)
+UNIDAD_LIST_COLUMNS = (
+    UnidadResponsable.id_unidad, UnidadResponsable.nombre, UnidadResponsable.telefono,
+    UnidadResponsable.domicilio, UnidadResponsable.municipio, UnidadResponsable.localidad,
+    UnidadResponsable.codigo_postal, UnidadResponsable.rfc, UnidadResponsable.correo_electronico,
+    UnidadResponsable.tipo_unidad, UnidadResponsable.fecha_creacion, UnidadResponsable.fecha_cambio,
 )
-def read_unidades(
-    skip: int = 0,
-    limit: int = 1000,
-    id_unidad: Optional[int] = None,
-    nombre: Optional[str] = None,
-    # current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    try:
-        # Asegurarnos de que la relación se llama correctamente
-        query = db.query(UnidadResponsable).options(
-            joinedload(UnidadResponsable.usuario_responsable)  # Carga la relación
-        )
-
-        # Aplicación de filtros
-        if id_unidad:
-            query = query.filter(UnidadResponsable.id_unidad == id_unidad)
-        if nombre:
-            query = query.filter(UnidadResponsable.nombre.ilike(f"%{nombre}%"))
-        
-        # Ejecución de la consulta
-        unidades_db = query.offset(skip).limit(limit).all()
-        
-        # Manejo de resultados vacíos
-        if not unidades_db:
-            if id_unidad or nombre:  # Solo si hay filtros aplicados
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No se encontraron unidades con los criterios especificados"
-                )
-            return []  # Si no hay filtros, devolver lista vacía
-        
-        return jsonable_encoder(unidades_db)
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al obtener unidades responsables: {str(e)}"
-        ) """
-
+DEPENDIENTE_COLUMNS = (
+    UnidadResponsable.id_unidad, UnidadResponsable.nombre, UnidadResponsable.telefono,
+    UnidadResponsable.domicilio, UnidadResponsable.municipio, UnidadResponsable.localidad,
+    UnidadResponsable.codigo_postal, UnidadResponsable.rfc, UnidadResponsable.correo_electronico,
+    UnidadResponsable.tipo_unidad, UnidadResponsable.unidad_padre_id,
+)
+# llave del cursor: orden alfabético, id_unidad desempata (índice ix_unidades_responsables_nombre_id)
+UNIDAD_KEYSET = (UnidadResponsable.nombre, UnidadResponsable.id_unidad)
 
 
 @app.get("/unidades_responsables", 
          response_model=List[UnidadResponsableResponse],
          tags=["Unidades Responsables"])
-def read_unidades(db: Session = Depends(get_db)):
-    try:
-        # Carga la unidad + usuario_responsable + anexos
-        query = db.query(UnidadResponsable).options(
-            joinedload(UnidadResponsable.usuario_responsable)
+async def read_unidades(
+    request: Request,
+    response: Response,
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: str | None = None,
+    skip: int = Query(0, ge=0),
+    tipo_unidad: str | None = None,
+    municipio: str | None = None,
+    localidad: str | None = None,
+    unidad_padre_id: int | None = None,
+    nombre: str | None = Query(None, min_length=1, max_length=255),
+    incluir_dependientes: bool = True,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Catálogo de unidades por nombre, paginado por cursor.
+
+    Si hay más páginas el header `X-Next-Cursor` trae el cursor de la siguiente.
+    Solo se leen las columnas de la respuesta: unidades y responsable en un
+    SELECT, y los dependientes de la página en otro.
+    """
+    versions = versions_from_rows(UNIDADES_TABLES, (await db.execute(versions_query(UNIDADES_TABLES))).all())
+    not_modified = _not_modified(request, response, make_etag("unidades_responsables", versions))
+    if not_modified is not None:
+        return not_modified
+
+    stmt = (
+        select(
+            *UNIDAD_LIST_COLUMNS,
+            UnidadResponsable.responsable.label("responsable_id"),
+            User.username, User.email, User.role,
         )
-        
-        unidades = query.all()
-        
-        # Transformamos los resultados
-        for unidad in unidades:
-            if unidad.usuario_responsable:
-                unidad.responsable = UserResponse(
-                    id=unidad.usuario_responsable.id,
-                    username=unidad.usuario_responsable.username,
-                    email=unidad.usuario_responsable.email,
-                    role=unidad.usuario_responsable.role,
-                    is_deleted=unidad.usuario_responsable.is_deleted
-                )
-            else:
-                unidad.responsable = None
-        
-        return unidades
-        
+        .outerjoin(User, User.id == UnidadResponsable.responsable)
+    )
+    stmt = stmt.where(*unidad_filters(tipo_unidad, municipio, localidad, unidad_padre_id, nombre).values())
+    stmt = apply_keyset(stmt, UNIDAD_KEYSET, cursor, limit, descending=False)
+    if skip and not cursor:
+        stmt = stmt.offset(skip)
+
+    try:
+        rows, next_cursor = split_page((await db.execute(stmt)).all(), UNIDAD_KEYSET, limit)
+
+        dependientes = {}
+        if incluir_dependientes and rows:
+            result = await db.execute(
+                select(*DEPENDIENTE_COLUMNS)
+                .where(UnidadResponsable.unidad_padre_id.in_([r.id_unidad for r in rows]))
+                .order_by(UnidadResponsable.nombre, UnidadResponsable.id_unidad)
+            )
+            for child in result.mappings():
+                dependientes.setdefault(child["unidad_padre_id"], []).append(dict(child))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error al obtener unidades: {str(e)}"
         )
 
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    unidades = []
+    for r in rows:
+        unidad = {c.key: getattr(r, c.key) for c in UNIDAD_LIST_COLUMNS}
+        unidad["responsable_id"] = r.responsable_id
+        unidad["responsable"] = {
+            "id": r.responsable_id, "username": r.username, "email": r.email, "role": r.role,
+        } if r.responsable_id and r.username is not None else None
+        unidad["dependientes"] = dependientes.get(r.id_unidad, [])
+        unidades.append(unidad)
+    return unidades
+
+
+@app.get("/unidades_responsables/facets", tags=["Unidades Responsables"])
+async def unidades_facets(
+    request: Request,
+    response: Response,
+    tipo_unidad: str | None = None,
+    municipio: str | None = None,
+    localidad: str | None = None,
+    unidad_padre_id: int | None = None,
+    nombre: str | None = Query(None, min_length=1, max_length=255),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Conteo de unidades por municipio, localidad y tipo_unidad con los mismos filtros del catálogo.
+
+    Cada faceta se cuenta con los filtros activos menos el suyo. Se calcula con
+    una consulta agrupada y se guarda en caché hasta la siguiente escritura de unidades.
+    """
+    (version,) = versions_from_rows(FACETS_TABLES, (await db.execute(versions_query(FACETS_TABLES))).all())
+    filters = (tipo_unidad, municipio, localidad, unidad_padre_id, nombre)
+    not_modified = _not_modified(request, response, make_etag("unidades_facets", (version,), *filters))
+    if not_modified is not None:
+        return not_modified
+
+    key = (version, filters)
+    facets = facets_cache.get(key)
+    if facets is None:
+        try:
+            result = await db.execute(facets_query(unidad_filters(*filters)))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al contar unidades: {str(e)}")
+        facets = fold_facet_rows(result.all())
+        facets_cache.set(key, facets)
+    return facets
+
 
 # =================================================================================================
 #                                           CARGOS
 # =================================================================================================
 @app.get("/cargos", response_model=List[CargoResponse], tags=["Cargos"])
-def read_cargos(skip: int = 0, limit: int = 1000, db: Session = Depends(get_db)):
+def read_cargos(request: Request, response: Response, skip: int = 0, limit: int = 1000, db: Session = Depends(get_db)):
+    not_modified = _not_modified(request, response, make_etag("cargos", current_versions(db, CARGOS_TABLES)))
+    if not_modified is not None:
+        return not_modified
     cargos = db.query(Cargo).filter(Cargo.is_deleted == False).offset(skip).limit(limit).all()
     return cargos
 
@@ -980,50 +1251,42 @@ def get_cargo(cargo_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/cargos", response_model=CargoResponse, tags=["Cargos"])
-def create_cargo(cargo: CargoCreate, db: Session = Depends(get_db), current_admin: User = Depends(get_admin_user)):
+def create_cargo(cargo: CargoCreate, db: Session = Depends(get_db), current_admin: Principal = Depends(get_admin_user)):
     # Verificar unicidad global para evitar conflicto con el índice único de BD.
     existing = db.query(Cargo).filter(func.lower(Cargo.nombre) == cargo.nombre.lower()).first()
     if existing:
         raise HTTPException(status_code=400, detail="Ya existe un cargo con ese nombre")
     db_obj = Cargo(**cargo.model_dump(exclude_unset=True))
     db.add(db_obj)
+    db.flush()
+    record_audit(db, actor_id=current_admin.id, action='create_cargo', object_type='cargo', object_id=db_obj.id, metadata={'nombre': db_obj.nombre})
     db.commit()
     db.refresh(db_obj)
-    try:
-        create_audit_log(db=db, actor_id=current_admin.id, action='create_cargo', object_type='cargo', object_id=db_obj.id, metadata={'nombre': db_obj.nombre})
-    except Exception:
-        pass
     return db_obj
 
 
 @app.put("/cargos/{cargo_id}", response_model=CargoResponse, tags=["Cargos"])
-def update_cargo(cargo_id: int, cargo: CargoCreate, db: Session = Depends(get_db), current_admin: User = Depends(get_admin_user)):
+def update_cargo(cargo_id: int, cargo: CargoCreate, db: Session = Depends(get_db), current_admin: Principal = Depends(get_admin_user)):
     db_obj = db.query(Cargo).filter(Cargo.id == cargo_id, Cargo.is_deleted == False).first()
     if not db_obj:
         raise HTTPException(status_code=404, detail="Cargo no encontrado")
     changes = cargo.model_dump(exclude_unset=True)
     for k, v in changes.items():
         setattr(db_obj, k, v)
+    record_audit(db, actor_id=current_admin.id, action='update_cargo', object_type='cargo', object_id=db_obj.id, metadata={'changes': changes})
     db.commit()
     db.refresh(db_obj)
-    try:
-        create_audit_log(db=db, actor_id=current_admin.id, action='update_cargo', object_type='cargo', object_id=db_obj.id, metadata={'changes': changes})
-    except Exception:
-        pass
     return db_obj
 
 
 @app.delete("/cargos/{cargo_id}", tags=["Cargos"])
-def delete_cargo(cargo_id: int, db: Session = Depends(get_db), current_admin: User = Depends(get_admin_user)):
+def delete_cargo(cargo_id: int, db: Session = Depends(get_db), current_admin: Principal = Depends(get_admin_user)):
     db_obj = db.query(Cargo).filter(Cargo.id == cargo_id, Cargo.is_deleted == False).first()
     if not db_obj:
         raise HTTPException(status_code=404, detail="Cargo no encontrado")
     db_obj.is_deleted = True
+    record_audit(db, actor_id=current_admin.id, action='delete_cargo', object_type='cargo', object_id=cargo_id)
     db.commit()
-    try:
-        create_audit_log(db=db, actor_id=current_admin.id, action='delete_cargo', object_type='cargo', object_id=cargo_id)
-    except Exception:
-        pass
     return {"message": "Cargo eliminado (soft-delete)"}
 
 
@@ -1038,7 +1301,7 @@ def read_user_cargo_historial(
     skip: int = 0,
     limit: int = 1000,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     # Permisos: admin puede ver todo; usuario normal solo su propio historial
     if current_user.role != UserRoles.ADMIN and user_id and user_id != current_user.id:
@@ -1057,7 +1320,7 @@ def read_user_cargo_historial(
 
 
 @app.get("/user_cargo_historial/{hist_id}", response_model=UserCargoHistorialResponse, tags=["Cargos"])
-def get_user_cargo_historial(hist_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_user_cargo_historial(hist_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     entry = db.query(UserCargoHistorial).filter(UserCargoHistorial.id == hist_id, UserCargoHistorial.is_deleted == False).first()
     if not entry:
         raise HTTPException(status_code=404, detail="Registro no encontrado")
@@ -1067,7 +1330,7 @@ def get_user_cargo_historial(hist_id: int, db: Session = Depends(get_db), curren
 
 
 @app.post("/user_cargo_historial", response_model=UserCargoHistorialResponse, tags=["Cargos"])
-def create_user_cargo_historial(payload: UserCargoHistorialCreate, db: Session = Depends(get_db), current_admin: User = Depends(get_admin_user)):
+def create_user_cargo_historial(payload: UserCargoHistorialCreate, db: Session = Depends(get_db), current_admin: Principal = Depends(get_admin_user)):
     # Validaciones FK (pre-checks)
     cargo = db.query(Cargo).filter(Cargo.id == payload.cargo_id, Cargo.is_deleted == False).first()
     if not cargo:
@@ -1102,6 +1365,8 @@ def create_user_cargo_historial(payload: UserCargoHistorialCreate, db: Session =
 
         db_obj = UserCargoHistorial(**payload.model_dump(exclude_unset=True))
         db.add(db_obj)
+        db.flush()
+        record_audit(db, actor_id=current_admin.id, action='create_user_cargo_historial', object_type='user_cargo_historial', object_id=db_obj.id, metadata={'cargo_id': db_obj.cargo_id, 'user_id': db_obj.user_id})
         db.commit()
         db.refresh(db_obj)
 
@@ -1114,43 +1379,31 @@ def create_user_cargo_historial(payload: UserCargoHistorialCreate, db: Session =
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error creando asignación: {e}")
 
-    # Audit
-    try:
-        create_audit_log(db=db, actor_id=current_admin.id, action='create_user_cargo_historial', object_type='user_cargo_historial', object_id=db_obj.id, metadata={'cargo_id': db_obj.cargo_id, 'user_id': db_obj.user_id})
-    except Exception:
-        pass
-
     return db_obj
 
 
 @app.put("/user_cargo_historial/{hist_id}", response_model=UserCargoHistorialResponse, tags=["Cargos"])
-def update_user_cargo_historial(hist_id: int, payload: UserCargoHistorialCreate, db: Session = Depends(get_db), current_admin: User = Depends(get_admin_user)):
+def update_user_cargo_historial(hist_id: int, payload: UserCargoHistorialCreate, db: Session = Depends(get_db), current_admin: Principal = Depends(get_admin_user)):
     entry = db.query(UserCargoHistorial).filter(UserCargoHistorial.id == hist_id, UserCargoHistorial.is_deleted == False).first()
     if not entry:
         raise HTTPException(status_code=404, detail="Registro no encontrado")
     changes = payload.model_dump(exclude_unset=True)
     for k, v in changes.items():
         setattr(entry, k, v)
+    record_audit(db, actor_id=current_admin.id, action='update_user_cargo_historial', object_type='user_cargo_historial', object_id=entry.id, metadata={'changes': changes})
     db.commit()
     db.refresh(entry)
-    try:
-        create_audit_log(db=db, actor_id=current_admin.id, action='update_user_cargo_historial', object_type='user_cargo_historial', object_id=entry.id, metadata={'changes': changes})
-    except Exception:
-        pass
     return entry
 
 
 @app.delete("/user_cargo_historial/{hist_id}", tags=["Cargos"])
-def delete_user_cargo_historial(hist_id: int, db: Session = Depends(get_db), current_admin: User = Depends(get_admin_user)):
+def delete_user_cargo_historial(hist_id: int, db: Session = Depends(get_db), current_admin: Principal = Depends(get_admin_user)):
     entry = db.query(UserCargoHistorial).filter(UserCargoHistorial.id == hist_id, UserCargoHistorial.is_deleted == False).first()
     if not entry:
         raise HTTPException(status_code=404, detail="Registro no encontrado")
     entry.is_deleted = True
+    record_audit(db, actor_id=current_admin.id, action='delete_user_cargo_historial', object_type='user_cargo_historial', object_id=hist_id)
     db.commit()
-    try:
-        create_audit_log(db=db, actor_id=current_admin.id, action='delete_user_cargo_historial', object_type='user_cargo_historial', object_id=hist_id)
-    except Exception:
-        pass
     return {"message": "Historial marcado como eliminado"}
 
 
@@ -1172,7 +1425,7 @@ class CargoUnassignPayload(PydanticBaseModel):
 
 
 @app.post("/cargos/asignar", response_model=UserCargoHistorialResponse, tags=["Cargos"], summary="Asignar cargo a usuario (transaccional)")
-def asignar_cargo_api(payload: CargoAssignPayload, db: Session = Depends(get_db), current_admin: User = Depends(get_admin_user)):
+def asignar_cargo_api(payload: CargoAssignPayload, db: Session = Depends(get_db), current_admin: Principal = Depends(get_admin_user)):
     # Reuse transactional logic from create_user_cargo_historial
     body = UserCargoHistorialCreate(
         cargo_id=payload.cargo_id,
@@ -1184,7 +1437,7 @@ def asignar_cargo_api(payload: CargoAssignPayload, db: Session = Depends(get_db)
 
 
 @app.post("/cargos/desasignar", tags=["Cargos"], summary="Finalizar asignación activa (set fecha_fin)")
-def desasignar_cargo_api(payload: CargoUnassignPayload, db: Session = Depends(get_db), current_admin: User = Depends(get_admin_user)):
+def desasignar_cargo_api(payload: CargoUnassignPayload, db: Session = Depends(get_db), current_admin: Principal = Depends(get_admin_user)):
     from sqlalchemy import select
     # determinar el registro a cerrar
     if payload.hist_id:
@@ -1205,11 +1458,8 @@ def desasignar_cargo_api(payload: CargoUnassignPayload, db: Session = Depends(ge
 
     # cerrar asignación
     entry.fecha_fin = datetime.utcnow()
+    record_audit(db, actor_id=current_admin.id, action='cargo_unassign', object_type='user_cargo_historial', object_id=entry.id, metadata={'cargo_id': entry.cargo_id, 'user_id': entry.user_id, 'unidad_responsable_id': entry.unidad_responsable_id})
     db.commit()
-    try:
-        create_audit_log(db=db, actor_id=current_admin.id, action='cargo_unassign', object_type='user_cargo_historial', object_id=entry.id, metadata={'cargo_id': entry.cargo_id, 'user_id': entry.user_id, 'unidad_responsable_id': entry.unidad_responsable_id})
-    except Exception:
-        pass
     return {"message": "Asignación finalizada", "hist_id": entry.id}
 
 
@@ -1289,29 +1539,26 @@ def asignar_responsable(
 #                                   ACTAS DE ENTREGA RECEPCIÓN
 # =================================================================================================
 @app.get("/actas", response_model=List[ActaResponse], tags=["Actas de Entrega Recepción"])
-def read_actas(skip: int = 0, limit: int = 1000, db: Session = Depends(get_db)):
+async def read_actas(
+    skip: int = 0,
+    limit: int = 1000,
+    unidad_subtree: int | None = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     try:
-        actas = (
-            db.query(ActaEntregaRecepcion)
-            .options(
-                selectinload(ActaEntregaRecepcion.unidad),
-                selectinload(ActaEntregaRecepcion.anexos)
-            )
-            .offset(skip)
-            .limit(limit)
-            .all()
+        stmt = select(ActaEntregaRecepcion).options(
+            selectinload(ActaEntregaRecepcion.unidad),
+            selectinload(ActaEntregaRecepcion.anexos)
         )
+        if unidad_subtree is not None:
+            # la unidad y todas sus dependientes en una sola consulta (semi-join con unidades_closure)
+            stmt = stmt.where(ActaEntregaRecepcion.unidad_responsable.in_(subtree_unit_ids(unidad_subtree)))
+        result = await db.execute(stmt.offset(skip).limit(limit))
+        actas = result.scalars().all()
         if not actas:
             return []
-            # 👇 Agrega esto para depurar
-        for i, acta in enumerate(actas):
-            print(f"\n--- Acta {i} ---")
-            for j, anexo in enumerate(acta.anexos):
-                print(f"Anexo {j} tipo: {type(anexo.datos)}")
-                print(f"Anexo {j} contenido: {anexo.datos}")
-        
-        return actas  # FastAPI intentará serializar esto
-        # return actas
+        # serializar dentro del handler, con las relaciones ya cargadas
+        return [ActaResponse.model_validate(acta) for acta in actas]
     except Exception as e:
         print(f"Error detallado en /actas: {type(e).__name__}: {e}")  # Log clave
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
@@ -1362,65 +1609,40 @@ def crear_acta(acta: ActaCreate,
                 detail=f"Ya existe un acta con el folio {acta.folio}"
             )
         
-        # Crear nueva acta
+        # Crear nueva acta; todo (acta, anexos asociados y auditoría) va en un solo commit
         db_acta = ActaEntregaRecepcion(**acta.model_dump(exclude_unset=True))
+        now = datetime.utcnow()
+        if db_acta.creado_en is None:
+            db_acta.creado_en = now
+        if db_acta.actualizado_en is None:
+            db_acta.actualizado_en = now
         db.add(db_acta)
-        db.commit()
-        db.refresh(db_acta)
-        anexos_a_asociar = db.query(Anexos).filter(
+        db.flush()  # asigna el id sin confirmar
+
+        # asociar los anexos sueltos del creador en esa unidad
+        db.query(Anexos).filter(
             Anexos.unidad_responsable_id == acta.unidad_responsable,
             Anexos.creador_id == current_user.id,
             ((Anexos.acta_id == None) | (Anexos.acta_id == 0))
-        ).all()
-        for an in anexos_a_asociar:
-            an.acta_id = db_acta.id
-        db.commit()
-        db.refresh(db_acta)
-        if db_acta.creado_en is None:
-            db_acta.creado_en = datetime.utcnow()
-        if db_acta.actualizado_en is None:
-            db_acta.actualizado_en = datetime.utcnow()
-            
+        ).update({Anexos.acta_id: db_acta.id}, synchronize_session=False)
+
+        record_audit(
+            db,
+            actor_id=current_user.id if current_user else None,
+            action='create_acta',
+            object_type='acta',
+            object_id=db_acta.id,
+            metadata={'folio': db_acta.folio, 'unidad_responsable': db_acta.unidad_responsable},
+            ip=(request.state.client_ip if request else None)
+        )
         db.commit()
-        db.refresh(db_acta)
+
         db_acta = (
             db.query(ActaEntregaRecepcion)
             .options(selectinload(ActaEntregaRecepcion.anexos))
             .filter(ActaEntregaRecepcion.id == db_acta.id)
             .first()
         )
-
-        # Auditoría
-        try:
-            logger.info(f"[AUDIT] Attempting to create audit log for acta {db_acta.id} by actor {current_user.id if current_user else None}")
-            audit_res = create_audit_log(
-                db=db,
-                actor_id=current_user.id if current_user else None,
-                action='create_acta',
-                object_type='acta',
-                object_id=db_acta.id,
-                metadata={'folio': db_acta.folio, 'unidad_responsable': db_acta.unidad_responsable},
-                ip=(request.state.client_ip if request else None)
-            )
-            logger.info(f"[AUDIT] create_audit_log returned: {audit_res}")
-            # Si por alguna razón el helper falló silenciosamente, crear el registro manualmente
-            if audit_res is None:
-                from .models import AuditLog
-                fallback = AuditLog(
-                    actor_id=current_user.id if current_user else None,
-                    action='create_acta',
-                    object_type='acta',
-                    object_id=db_acta.id,
-                    ip_address=(request.state.client_ip if request else None),
-                    metadata_json={'folio': db_acta.folio}
-                )
-                db.add(fallback)
-                db.commit()
-                logger.info(f"[AUDIT] Fallback audit log created for acta {db_acta.id}")
-        except Exception as e:
-            logger.exception(f"Error creating audit log for acta {db_acta.id}: {e}")
-            pass
-
         return db_acta
         
     except HTTPException:
@@ -1448,23 +1670,20 @@ def update_acta(
     changes = acta.model_dump(exclude_unset=True)
     for key, value in changes.items():
         setattr(db_acta, key, value)
+
+    # Auditoría (mismo commit que el cambio)
+    record_audit(
+        db,
+        actor_id=current_user.id if current_user else None,
+        action='update_acta',
+        object_type='acta',
+        object_id=db_acta.id,
+        metadata={'changes': changes},
+        ip=(request.state.client_ip if request else None)
+    )
     db.commit()
     db.refresh(db_acta)
 
-    # Auditoría
-    try:
-        create_audit_log(
-            db=db,
-            actor_id=current_user.id if current_user else None,
-            action='update_acta',
-            object_type='acta',
-            object_id=db_acta.id,
-            metadata={'changes': changes},
-            ip=(request.state.client_ip if request else None)
-        )
-    except Exception:
-        pass
-
     return db_acta
 
 
@@ -1482,21 +1701,18 @@ def delete_acta(acta_id: int, db: Session = Depends(get_db), current_user: User
     
     # Opción 1: Eliminación real
     db.delete(db_acta)
-    db.commit()
 
-    # Auditoría
-    try:
-        create_audit_log(
-            db=db,
-            actor_id=current_user.id if current_user else None,
-            action='delete_acta',
-            object_type='acta',
-            object_id=acta_id,
-            metadata={'folio': db_acta.folio},
-            ip=(request.state.client_ip if request else None)
-        )
-    except Exception:
-        pass
+    # Auditoría (mismo commit que el borrado)
+    record_audit(
+        db,
+        actor_id=current_user.id if current_user else None,
+        action='delete_acta',
+        object_type='acta',
+        object_id=acta_id,
+        metadata={'folio': db_acta.folio},
+        ip=(request.state.client_ip if request else None)
+    )
+    db.commit()
 
     return {"message": "Acta eliminada correctamente"}
 
@@ -1510,75 +1726,274 @@ def get_audit_logs(
     action: str | None = None,
     start_ts: str | None = None,
     end_ts: str | None = None,
+    metadata_contains: str | None = None,
+    metadata_key: str | None = None,
+    metadata_value: str | None = None,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+    exact_total: bool = False,
+    include_archived: bool = False,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(get_admin_user)
+    current_admin: Principal = Depends(get_admin_principal)
 ):
     """Devuelve logs de auditoría en formato JSON plano con metadatos.
 
     Filtros soportados: actor_id, object_type, action, start_ts, end_ts, skip, limit
+
+    Filtros por metadata (índice GIN sobre JSONB):
+    - `metadata_contains`: objeto JSON que la metadata debe contener, p. ej. `{"folio": "X"}`
+    - `metadata_key`: la metadata tiene esa llave
+    - `metadata_key` + `metadata_value`: la llave tiene ese valor (el valor se lee
+      como JSON si se puede: `true`, `12`; si no, como texto)
+
+    Paginación por cursor sobre (timestamp, id), del más reciente al más antiguo:
+    pasar el `next_cursor` de la respuesta como `cursor` para la siguiente página
+    (`null` en la última). `total` es la estimación del planner salvo en conjuntos
+    chicos o con `exact_total=true`; `total_is_exact` lo indica. `skip` se
+    mantiene por compatibilidad y solo aplica sin cursor.
+
+    Con `include_archived=true` también se leen los meses ya archivados en disco
+    (más lento; solo se abren los archivos del rango pedido).
     """
+    filters = _audit_filters(actor_id, object_type, action, start_ts, end_ts,
+                             metadata_contains, metadata_key, metadata_value)
+    start, end = filters["start"], filters["end"]
     # Permite al admin consultar logs con filtros y devuelve metadata correctamente
-    query = db.query(AuditLog)
+    query = _audit_logs_query(db.query(AuditLog), **filters)
+
+    total, total_is_exact = count_with_estimate(db, query, exact=exact_total)
+    # skip (offset) solo por compatibilidad: su costo crece con la profundidad
+    results, next_cursor = keyset_page(query, [AuditLog.timestamp, AuditLog.id], cursor, limit, offset=skip)
+    rows = [_audit_log_row(r) for r in results]
+
+    if include_archived:
+        filtered = any(v is not None for k, v in filters.items() if k not in ("start", "end"))
+        extra, extra_exact = archived_total(db, start, end, filtered=filtered)
+        total += extra
+        total_is_exact = total_is_exact and extra_exact
+        # con la página en vivo llena, solo aportan archivos más nuevos que su última fila
+        lower = start
+        if len(rows) == limit:
+            lower = max(start, rows[-1]['timestamp']) if start else rows[-1]['timestamp']
+        before = tuple(decode_cursor(cursor, 2)) if cursor else None
+        archived = read_archived_audit_logs(db, **{**filters, "start": lower}, before=before, limit=limit + 1)
+        if archived:
+            merged = sorted(rows + archived, key=lambda r: (r['timestamp'], r['id']), reverse=True)
+            has_more = next_cursor is not None or len(merged) > limit
+            rows = merged[:limit]
+            next_cursor = encode_cursor([rows[-1]['timestamp'], rows[-1]['id']]) if has_more else None
+
+    items = [{**r, 'timestamp': r['timestamp'].isoformat() if r['timestamp'] else None} for r in rows]
+    return {"total": total, "total_is_exact": total_is_exact, "items": items, "next_cursor": next_cursor}
+
+
+@app.get('/admin/audit_stats', tags=['Admin', 'Audit'])
+def get_audit_stats(
+    start_date: date | None = None,
+    end_date: date | None = None,
+    action: str | None = None,
+    object_type: str | None = None,
+    success: bool | None = None,
+    actors_limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_admin: Principal = Depends(get_admin_principal)
+):
+    """Actividad de auditoría desde las tablas de resumen, sin recorrer audit_logs.
+
+    - `actions_per_day`: eventos por día y object_type (filtrables por action,
+      object_type y success)
+    - `failed_by_actor`: actores con más acciones fallidas en el rango
+
+    Por defecto cubre los últimos 30 días.
+    """
+    end_date = end_date or datetime.utcnow().date()
+    start_date = start_date or end_date - timedelta(days=29)
+    if start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="start_date no puede ser posterior a end_date")
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "actions_per_day": actions_per_day(db, start_date, end_date, action=action,
+                                           object_type=object_type, success=success),
+        "failed_by_actor": failed_actions_per_actor(db, start_date, end_date, limit=actors_limit),
+    }
+
+
+@app.get('/admin/audit_logs/export', tags=['Admin', 'Audit'])
+def export_audit_logs(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    actor_id: int | None = None,
+    object_type: str | None = None,
+    action: str | None = None,
+    start_ts: str | None = None,
+    end_ts: str | None = None,
+    metadata_contains: str | None = None,
+    metadata_key: str | None = None,
+    metadata_value: str | None = None,
+    include_archived: bool = False,
+    current_admin: Principal = Depends(get_admin_principal)
+):
+    """Exporta los logs de auditoría que cumplan los filtros como NDJSON o CSV.
+
+    Mismos filtros que /admin/audit_logs. Las filas salen en orden cronológico
+    y se mandan conforme se leen de un cursor del servidor (`yield_per`), así
+    que la memoria no depende del tamaño del rango. Con `gzip=true` el archivo
+    se comprime al vuelo.
+    """
+    filters = _audit_filters(actor_id, object_type, action, start_ts, end_ts,
+                             metadata_contains, metadata_key, metadata_value)
+
+    create_audit_log(
+        None,
+        actor_id=current_admin.id,
+        action='export_audit_logs',
+        object_type='audit_log',
+        metadata={"actor_id": actor_id, "object_type": object_type, "action": action,
+                  "start_ts": start_ts, "end_ts": end_ts, "metadata_contains": filters["metadata_contains"],
+                  "metadata_key": metadata_key, "format": format,
+                  "include_archived": include_archived},
+        ip=request.state.client_ip
+    )
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"audit_logs_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{extension}"
+    if gzip:
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        stream_export(_iter_audit_export_rows(filters, include_archived), format, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _iter_audit_export_rows(filters: dict, include_archived: bool):
+    # Sesión propia: la del Depends se cierra antes de que termine el streaming
+    db = SessionLocal()
+    try:
+        if include_archived:
+            # los meses archivados son anteriores a los que siguen en la BD
+            yield from iter_archived_audit_logs(db, **filters)
+        query = _audit_logs_query(
+            db.query(AuditLog).with_entities(
+                AuditLog.id, AuditLog.actor_id, AuditLog.action, AuditLog.object_type, AuditLog.object_id,
+                AuditLog.timestamp, AuditLog.success, AuditLog.ip_address, AuditLog.metadata_json,
+            ),
+            **filters,
+        ).order_by(AuditLog.timestamp.asc(), AuditLog.id.asc())
+        for r in query.execution_options(yield_per=AUDIT_EXPORT_YIELD_PER):
+            yield _audit_log_row(r)
+    finally:
+        db.close()
+
+
+def _audit_filters(actor_id, object_type, action, start_ts, end_ts,
+                   metadata_contains=None, metadata_key=None, metadata_value=None) -> dict:
+    """Valida los query params de auditoría y los deja listos para _audit_logs_query."""
+    contains = None
+    if metadata_contains:
+        try:
+            contains = json.loads(metadata_contains)
+        except ValueError:
+            contains = None
+        if not isinstance(contains, dict):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="metadata_contains debe ser un objeto JSON")
+    if metadata_value is not None:
+        if not metadata_key:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="metadata_value requiere metadata_key")
+        try:
+            value = json.loads(metadata_value)
+        except ValueError:
+            value = metadata_value
+        # llave = valor se resuelve como contención para que use el mismo índice GIN
+        contains = {**(contains or {}), metadata_key: value}
+        metadata_key = None
+    return {
+        "actor_id": actor_id,
+        "object_type": object_type,
+        "action": action,
+        "start": _parse_audit_ts(start_ts, "start_ts"),
+        "end": _parse_audit_ts(end_ts, "end_ts"),
+        "metadata_contains": contains,
+        "metadata_key": metadata_key or None,
+    }
+
+
+def _audit_logs_query(query, actor_id: int | None = None, object_type: str | None = None,
+                      action: str | None = None, start: datetime | None = None, end: datetime | None = None,
+                      metadata_contains: dict | None = None, metadata_key: str | None = None):
     if actor_id is not None:
         query = query.filter(AuditLog.actor_id == actor_id)
     if object_type is not None:
         query = query.filter(AuditLog.object_type == object_type)
     if action is not None:
         query = query.filter(AuditLog.action == action)
+    # timestamp es la llave de partición: con un rango solo se leen los meses que lo cubren
+    if start is not None:
+        query = query.filter(AuditLog.timestamp >= start)
+    if end is not None:
+        query = query.filter(AuditLog.timestamp <= end)
+    # @> y ? sobre JSONB: ambos operadores los resuelve el índice GIN idx_audit_metadata_gin
+    if metadata_contains is not None:
+        query = query.filter(AuditLog.metadata_json.contains(metadata_contains))
+    if metadata_key is not None:
+        query = query.filter(AuditLog.metadata_json.has_key(metadata_key))
+    return query
+
+
+def _parse_audit_ts(value: str | None, name: str) -> datetime | None:
     # start_ts / end_ts aceptan ISO timestamps o fechas
-    if start_ts:
-        try:
-            query = query.filter(AuditLog.timestamp >= start_ts)
-        except Exception:
-            pass
-    if end_ts:
-        try:
-            query = query.filter(AuditLog.timestamp <= end_ts)
-        except Exception:
-            pass
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"{name} debe ser una fecha u hora ISO 8601")
+    # timestamp se guarda en UTC sin zona
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
 
-    total = query.count()
-    results = query.order_by(AuditLog.timestamp.desc()).offset(skip).limit(limit).all()
 
-    # Convertir resultados a estructuras JSON serializables
-    from fastapi.encoders import jsonable_encoder
-    items = []
-    for r in results:
+def _audit_log_row(r) -> dict:
+    return {
+        'id': r.id,
+        'actor_id': r.actor_id,
+        'action': r.action,
+        'object_type': r.object_type,
+        'object_id': r.object_id,
+        'timestamp': r.timestamp,
+        'success': r.success,
+        'ip_address': r.ip_address,
         # metadata_json puede ser JSON o None
-        metadata = None
-        if hasattr(r, 'metadata_json') and r.metadata_json is not None:
-            metadata = r.metadata_json
-        item = {
-            'id': r.id,
-            'actor_id': r.actor_id,
-            'action': r.action,
-            'object_type': r.object_type,
-            'object_id': r.object_id,
-            'timestamp': r.timestamp.isoformat() if r.timestamp else None,
-            'success': r.success,
-            'ip_address': r.ip_address,
-            'metadata': metadata
-        }
-        items.append(item)
-
-    return {"total": total, "items": items}
+        'metadata': r.metadata_json,
+    }
 
 # =================================================================================================
 #                                   ANEXOS DE ENTREGA RECEPCIÓN
 # =================================================================================================
 @app.get("/anexos", response_model=List[AnexoResponse], tags=["Anexos de Entrega Recepción"])
-def read_anexos(
+async def read_anexos(
     skip: int = 0,
     limit: int = 1000,
-    db: Session = Depends(get_db)
+    unidad_subtree: int | None = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        anexos = db.query(Anexos).filter(Anexos.is_deleted == False).offset(skip).limit(limit).all()
+        stmt = select(Anexos).filter(Anexos.is_deleted == False)
+        if unidad_subtree is not None:
+            stmt = stmt.where(Anexos.unidad_responsable_id.in_(subtree_unit_ids(unidad_subtree)))
+        result = await db.execute(stmt.offset(skip).limit(limit))
+        anexos = result.scalars().all()
         if not anexos:
             return []
-        return anexos
+        return [AnexoResponse.model_validate(anexo) for anexo in anexos]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al consultar la base de datos: {str(e)}")
     
@@ -1597,23 +2012,21 @@ def create_anexo(anexo: AnexoCreate, db: Session = Depends(get_db), current_user
         is_deleted=False)
     
     db.add(db_anexo)
+    db.flush()
+
+    # Auditoría (mismo commit que el alta)
+    record_audit(
+        db,
+        actor_id=current_user.id if current_user else None,
+        action='create_anexo',
+        object_type='anexo',
+        object_id=db_anexo.id,
+        metadata={'clave': db_anexo.clave, 'unidad_responsable_id': db_anexo.unidad_responsable_id},
+        ip=(request.state.client_ip if request else None)
+    )
     db.commit()
     db.refresh(db_anexo)
 
-    # Auditoría
-    try:
-        create_audit_log(
-            db=db,
-            actor_id=current_user.id if current_user else None,
-            action='create_anexo',
-            object_type='anexo',
-            object_id=db_anexo.id,
-            metadata={'clave': db_anexo.clave, 'unidad_responsable_id': db_anexo.unidad_responsable_id},
-            ip=(request.state.client_ip if request else None)
-        )
-    except Exception:
-        pass
-
     return db_anexo
     
 # get by id
@@ -1638,23 +2051,20 @@ def update_anexo(anexo_id: int, anexo: AnexoUpdate, db: Session = Depends(get_db
         setattr(db_anexo, key, value)
 
     db_anexo.actualizado_en = date.today()
+
+    # Auditoría (mismo commit que el cambio)
+    record_audit(
+        db,
+        actor_id=current_user.id if current_user else None,
+        action='update_anexo',
+        object_type='anexo',
+        object_id=db_anexo.id,
+        metadata={'changes': changes},
+        ip=(request.state.client_ip if request else None)
+    )
     db.commit()
     db.refresh(db_anexo)
 
-    # Auditoría
-    try:
-        create_audit_log(
-            db=db,
-            actor_id=current_user.id if current_user else None,
-            action='update_anexo',
-            object_type='anexo',
-            object_id=db_anexo.id,
-            metadata={'changes': changes},
-            ip=(request.state.client_ip if request else None)
-        )
-    except Exception:
-        pass
-
     return db_anexo
 
 
@@ -1667,21 +2077,18 @@ def delete_anexo(anexo_id: int, db: Session = Depends(get_db), current_user: Use
 
     db_anexo.is_deleted = True
     db_anexo.actualizado_en = date.today()
-    db.commit()
 
-    # Auditoría
-    try:
-        create_audit_log(
-            db=db,
-            actor_id=current_user.id if current_user else None,
-            action='delete_anexo',
-            object_type='anexo',
-            object_id=anexo_id,
-            metadata={'clave': db_anexo.clave},
-            ip=(request.state.client_ip if request else None)
-        )
-    except Exception:
-        pass
+    # Auditoría (mismo commit que el borrado)
+    record_audit(
+        db,
+        actor_id=current_user.id if current_user else None,
+        action='delete_anexo',
+        object_type='anexo',
+        object_id=anexo_id,
+        metadata={'clave': db_anexo.clave},
+        ip=(request.state.client_ip if request else None)
+    )
+    db.commit()
 
     return {"message": "Anexo eliminado correctamente"}
 
@@ -1726,27 +2133,31 @@ def read_anexos_by_estado(estado: str, db: Session = Depends(get_db)):
 async def upload_resumen(
     acta_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # Validar el tipo de archivo
     if not file.content_type.startswith("application/pdf"):
         raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
     
     # Validar que el acta existe
-    acta = db.query(ActaEntregaRecepcion).filter(ActaEntregaRecepcion.id == acta_id).first()
+    acta = (await db.execute(
+        select(ActaEntregaRecepcion.id).filter(ActaEntregaRecepcion.id == acta_id)
+    )).first()
     if not acta:    
         raise HTTPException(status_code=404, detail="Acta no encontrada")
     
     # validar que no exista un resumen para esa acta
-    existing = db.query(Resumen).filter(Resumen.acta_id == acta_id).first()
+    existing = (await db.execute(
+        select(Resumen.id).filter(Resumen.acta_id == acta_id).limit(1)
+    )).first()
 
     if existing:
         raise HTTPException(status_code=400, detail="Ya existe un resumen para esta acta")
     
     contents = await file.read()
 
-    # subir a drive
-    result = upload_pdf_to_drive(contents, acta_id)
+    # subir a drive (cliente bloqueante de Google: fuera del event loop)
+    result = await run_in_threadpool(upload_pdf_to_drive, contents, acta_id)
 
     # guardar en db
     nuevo_resumen = Resumen(
@@ -1757,7 +2168,7 @@ async def upload_resumen(
     )
 
     db.add(nuevo_resumen)
-    db.commit()
-    db.refresh(nuevo_resumen)
+    await db.commit()
+    await db.refresh(nuevo_resumen)
 
     return nuevo_resumen 
\ No newline at end of file
@@ -10,6 +10,9 @@ from enum import Enum as PyEnum
 from pydantic import BaseModel
 from sqlalchemy import Column, Integer, String, Date, Time, DateTime, Text
 from sqlalchemy import Enum, JSON, Boolean, TIMESTAMP
+from sqlalchemy import Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import BigInteger
 
 
 """ from sqlalchemy.ext.declarative import declarative_base
@@ -110,6 +113,70 @@ class PasswordAuditLog(Base):
     success = Column(Boolean, default=True)
 
 
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Solo se guarda el SHA-256 del token; el valor en claro lo tiene únicamente el cliente
+    token_hash = Column(String(64), nullable=False, unique=True, index=True)
+    # Todos los tokens obtenidos por rotación desde un mismo login comparten familia
+    family_id = Column(String(36), nullable=False, index=True)
+    created_at = Column(DateTime, server_default=func.now())
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+    replaced_by_id = Column(Integer, ForeignKey("refresh_tokens.id"), nullable=True)
+
+
+class PasswordResetToken(Base):
+    __tablename__ = "password_reset_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    # SHA-256 del token enviado por correo; verificar un reset es una búsqueda por este índice
+    token_hash = Column(String(64), nullable=False, unique=True, index=True)
+    created_at = Column(DateTime, server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
+    used_at = Column(DateTime, nullable=True)
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    # jti del access token revocado, o "user:<id>" para revocar todo lo emitido a un usuario
+    jti = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    revoked_at = Column(DateTime, nullable=False, index=True)
+    # a partir de aquí ningún token afectado sigue vigente y la fila se puede purgar
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)  # p. ej. "password_recovery"
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    html_body = Column(Text, nullable=False)
+    # pending -> sent | failed (agotó reintentos)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+    # cuándo lo reclamó un worker (el envío ocurre fuera de esa transacción)
+    claimed_at = Column(DateTime, nullable=True)
+    # vigencia del contenido (p. ej. el token de recuperación): no se reintenta después
+    expires_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # el worker solo recorre los pendientes ya vencidos
+        Index("ix_email_outbox_pending", "next_attempt_at", postgresql_where=text("status = 'pending'")),
+    )
+
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
 
@@ -118,17 +185,59 @@ class AuditLog(Base):
     action = Column(String(100), nullable=False)
     object_type = Column(String(50), nullable=True)  # e.g., 'user', 'anexo', 'acta'
     object_id = Column(Integer, nullable=True)
-    timestamp = Column(DateTime, server_default=func.now())
+    # NOT NULL: es parte de la llave de paginación (timestamp, id)
+    timestamp = Column(DateTime, server_default=func.now(), nullable=False)
     success = Column(Boolean, default=True)
     ip_address = Column(String(50), nullable=True)
     # Not using attribute name `metadata` because it's reserved by SQLAlchemy's Declarative API
     # Use attribute `metadata_json` that maps to DB column `metadata`
-    metadata_json = Column('metadata', JSON, nullable=True)
+    # JSONB con índice GIN (migración 010): filtros por contención (@>) y por llave (?)
+    metadata_json = Column('metadata', JSONB, nullable=True)
 
     # índices recomendados (se pueden crear desde migración manual si se prefiere)
     # SQLAlchemy puede crear índices si se usan Index(), pero aquí lo dejamos para migración SQL
 
 
+class AuditDailyRollup(Base):
+    """Conteo de eventos de auditoría por día, acción, tipo de objeto y resultado.
+
+    Se mantiene al escribir cada evento (app/audit_rollup.py); object_type
+    vacío ('') representa eventos sin tipo de objeto para que pueda ser PK.
+    """
+    __tablename__ = "audit_daily_rollup"
+
+    day = Column(Date, primary_key=True)
+    action = Column(String(100), primary_key=True)
+    object_type = Column(String(50), primary_key=True, default="")
+    success = Column(Boolean, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class AuditActorDailyRollup(Base):
+    """Conteo de eventos por día, actor y resultado (actor_id 0 = sin actor)."""
+    __tablename__ = "audit_actor_daily_rollup"
+
+    day = Column(Date, primary_key=True)
+    actor_id = Column(Integer, primary_key=True)
+    success = Column(Boolean, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class AuditLogArchive(Base):
+    """Manifiesto de particiones mensuales de audit_logs exportadas a disco."""
+    __tablename__ = "audit_log_archives"
+
+    id = Column(Integer, primary_key=True, index=True)
+    partition_name = Column(String(63), nullable=False, unique=True)
+    # rango [range_start, range_end) de la partición; sirve para podar archivos al leer
+    range_start = Column(DateTime, nullable=False, index=True)
+    range_end = Column(DateTime, nullable=False)
+    file_path = Column(String(500), nullable=False)
+    row_count = Column(Integer, nullable=False)
+    checksum_sha256 = Column(String(64), nullable=False)
+    archived_at = Column(DateTime, server_default=func.now())
+
+
 
 # This is the model for Unidad Responsable
 # It represents a responsible unit in the system, such as a department or office.
@@ -139,18 +248,18 @@ class UnidadResponsable(Base):
     nombre = Column(String(255), nullable=False)
     telefono = Column(String(20))
     domicilio = Column(String(255))
-    municipio = Column(String(100))
+    municipio = Column(String(100), index=True)
     localidad = Column(String(100))
     codigo_postal = Column(String(10))
     rfc = Column(String(13))
     correo_electronico = Column(String(100))
 
     responsable = Column(Integer, ForeignKey("users.id"))
-    tipo_unidad = Column(String(50))
+    tipo_unidad = Column(String(50), index=True)
     fecha_creacion = Column(DateTime, server_default=func.now())
     fecha_cambio = Column(DateTime, server_default=func.now(), onupdate=func.now())
     # columna de jerarquía para relacionar unidades responsables
-    unidad_padre_id = Column(Integer, ForeignKey("unidades_responsables.id_unidad"), nullable=True)
+    unidad_padre_id = Column(Integer, ForeignKey("unidades_responsables.id_unidad"), nullable=True, index=True)
     # Relacion
     dependientes = relationship("UnidadResponsable", back_populates="padre")
     # Relación con UnidadResponsable
@@ -165,13 +274,49 @@ class UnidadResponsable(Base):
     # 👉 RELACIÓN CON ANEXOS (esto es lo nuevo)
     anexos = relationship("Anexos", back_populates="unidad_responsable")
 
+    __table_args__ = (
+        # orden y cursor del catálogo (GET /unidades_responsables); el índice
+        # trigram de nombre para la búsqueda está en migrations/014 (pg_trgm)
+        Index("ix_unidades_responsables_nombre_id", "nombre", "id_unidad"),
+    )
+
+
+class UnidadClosure(Base):
+    """Tabla de cierre de la jerarquía: un renglón por cada par (ancestro, descendiente).
+
+    Incluye el par de cada unidad consigo misma (depth 0). Se mantiene en la
+    misma transacción que el alta o el cambio de padre (app/hierarchy.py), así
+    que "todo lo que cuelga de X" es un join por índice, sin recursión.
+    """
+    __tablename__ = "unidades_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("unidades_responsables.id_unidad", ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("unidades_responsables.id_unidad", ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # ancestros de una unidad; (ancestor_id, descendant_id) ya lo cubre la PK
+        Index("ix_unidades_closure_descendant_depth", "descendant_id", "depth"),
+    )
+
+
+class TableVersion(Base):
+    """Contador de cambios por tabla, para ETags y cachés entre procesos.
+
+    Se incrementa en la misma transacción que el cambio (app/table_versions.py).
+    """
+    __tablename__ = "table_versions"
+
+    table_name = Column(String(63), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
 
 # esquema para el acta entrega-recepción
 class ActaEntregaRecepcion(Base):
     __tablename__ = "acta_entrega_recepcion"
 
     id = Column(Integer, primary_key=True, index=True)
-    unidad_responsable = Column(Integer, ForeignKey("unidades_responsables.id_unidad"), nullable=False)
+    unidad_responsable = Column(Integer, ForeignKey("unidades_responsables.id_unidad"), nullable=False, index=True)
     folio = Column(String)
     fecha = Column(String)
     hora = Column(String)
@@ -220,7 +365,7 @@ class Anexos(Base):
     fecha_creacion = Column(DateTime, default=utcnow)
     datos = Column(JSON, nullable=False)
     estado = Column(String, nullable=False)
-    unidad_responsable_id = Column(Integer, ForeignKey("unidades_responsables.id_unidad"), nullable=False)
+    unidad_responsable_id = Column(Integer, ForeignKey("unidades_responsables.id_unidad"), nullable=False, index=True)
     creado_en = Column(Date, default=date.today)
     actualizado_en = Column(Date, default=date.today, onupdate=date.today)
     is_deleted = Column(Boolean, default=False)  # Soft delete
@@ -0,0 +1,144 @@
+import base64
+import json
+import logging
+import os
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.orm import Query, Session
+
+logger = logging.getLogger(__name__)
+
+# Por debajo de esta estimación se hace el COUNT exacto: en tablas o filtros
+# chicos es barato y el total sale preciso
+EXACT_COUNT_THRESHOLD = int(os.getenv("EXACT_COUNT_THRESHOLD", "10000"))
+
+
+# =============================================================================
+#  Cursores opacos (keyset)
+# =============================================================================
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "$dt" in value:
+            return datetime.fromisoformat(value["$dt"])
+        if "$d" in value:
+            return date.fromisoformat(value["$d"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Convierte los valores de la llave de orden de la última fila en un token opaco."""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> List[Any]:
+    """Inverso de encode_cursor; 400 si el token no es válido."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("tamaño inesperado")
+        return [_decode_value(v) for v in values]
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación inválido")
+
+
+def keyset_page(query: Query, columns: Sequence, cursor: Optional[str], limit: int,
+                descending: bool = True, offset: int = 0) -> Tuple[list, Optional[str]]:
+    """Aplica orden, condición de cursor y límite sobre `columns` (la última debe ser única).
+
+    La comparación por fila `(a, b) < (x, y)` la resuelve Postgres con un índice
+    compuesto en el mismo orden, así que cualquier página cuesta lo mismo.
+    Devuelve (filas, next_cursor); next_cursor es None en la última página.
+    `offset` solo existe por compatibilidad con clientes que paginan con skip.
+    """
+    query = apply_keyset(query, columns, cursor, limit, descending)
+    if offset and not cursor:
+        query = query.offset(offset)
+    return split_page(query.all(), columns, limit)
+
+
+def apply_keyset(query, columns: Sequence, cursor: Optional[str], limit: int, descending: bool = True):
+    """Condición de cursor, orden y `limit + 1` sobre un Query o un select() (para AsyncSession)."""
+    if cursor:
+        values = decode_cursor(cursor, len(columns))
+        key = tuple_(*columns)
+        query = query.filter(key < tuple_(*values) if descending else key > tuple_(*values))
+    order = [c.desc() if descending else c.asc() for c in columns]
+    return query.order_by(*order).limit(limit + 1)
+
+
+def split_page(rows: list, columns: Sequence, limit: int) -> Tuple[list, Optional[str]]:
+    """Corta la fila extra que pidió apply_keyset y arma el cursor de la siguiente página."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([_column_value(rows[-1], c) for c in columns])
+    return rows, next_cursor
+
+
+def _column_value(row: Any, column) -> Any:
+    # fila ORM (atributo) o Row de columnas proyectadas (llave por nombre)
+    key = column.key
+    if hasattr(row, "_mapping"):
+        return row._mapping[key] if key in row._mapping else getattr(row, key)
+    return getattr(row, key)
+
+
+# =============================================================================
+#  Totales aproximados
+# =============================================================================
+class Explain(Executable, ClauseElement):
+    """`EXPLAIN (FORMAT JSON) <statement>` como construcción ejecutable.
+
+    Compilarlo con el mismo compilador que la consulta conserva los bind
+    processors de cada tipo (p. ej. dict -> JSONB en filtros de metadata).
+    """
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def estimated_count(db: Session, query: Query) -> Optional[int]:
+    """Filas estimadas por el planner para `query` (EXPLAIN, sin ejecutarla)."""
+    try:
+        # savepoint: si el EXPLAIN falla no deja abortada la transacción del request
+        with db.begin_nested():
+            result = db.execute(Explain(query.order_by(None).statement)).scalar()
+        plan = result if isinstance(result, list) else json.loads(result)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception:
+        logger.exception("No se pudo estimar el conteo con EXPLAIN")
+        return None
+
+
+def count_with_estimate(db: Session, query: Query, exact: bool = False) -> Tuple[int, bool]:
+    """Devuelve (total, es_exacto).
+
+    Usa la estimación del planner salvo que se pida el exacto, que la estimación
+    no esté disponible o que sea lo bastante chica para contar sin costo.
+    """
+    if not exact:
+        estimate = estimated_count(db, query)
+        if estimate is not None and estimate >= EXACT_COUNT_THRESHOLD:
+            return estimate, False
+    return query.order_by(None).count(), True
@@ -0,0 +1,68 @@
+import logging
+import threading
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Ejecuta `fn` cada `interval` segundos en un hilo daemon.
+
+    Pensado para mantenimiento ligero dentro del proceso web (barridos,
+    purgas). Las tareas deben ser idempotentes: con varios workers de uvicorn
+    cada uno corre su propia copia.
+    """
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], object], run_on_start: bool = False):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.run_on_start = run_on_start
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> None:
+        try:
+            self.fn()
+        except Exception:
+            # un fallo puntual (p. ej. BD caída) no debe matar el hilo
+            logger.exception(f"Error en la tarea periódica '{self.name}'")
+
+    def _loop(self) -> None:
+        if self.run_on_start:
+            self.run_once()
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=f"periodic-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+class PeriodicScheduler:
+    """Agrupa las tareas periódicas para arrancarlas y detenerlas desde el lifespan."""
+
+    def __init__(self):
+        self.tasks: List[PeriodicTask] = []
+
+    def add(self, name: str, interval: float, fn: Callable[[], object], run_on_start: bool = False) -> PeriodicTask:
+        task = PeriodicTask(name, interval, fn, run_on_start=run_on_start)
+        self.tasks.append(task)
+        return task
+
+    def start(self) -> None:
+        for task in self.tasks:
+            task.start()
+
+    def stop(self) -> None:
+        for task in self.tasks:
+            task.stop()
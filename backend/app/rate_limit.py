@@ -0,0 +1,161 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+logger = logging.getLogger(__name__)
+
+# memory: buckets en el proceso (un solo worker). redis: buckets compartidos entre
+# workers en un Redis (o compatible: KeyDB, Valkey, Dragonfly) local.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Token bucket: `capacity` intentos en ráfaga, recarga `capacity` cada `period` segundos."""
+    name: str
+    capacity: int
+    period: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def from_env(cls, name: str, env_var: str, default: str) -> "RateLimit":
+        # formato "<intentos>/<segundos>", p. ej. "20/60"
+        raw = os.getenv(env_var, default)
+        capacity, period = raw.split("/")
+        return cls(name=name, capacity=int(capacity), period=float(period))
+
+
+LOGIN_PER_IP = RateLimit.from_env("login_ip", "RATE_LIMIT_LOGIN_PER_IP", "20/60")
+LOGIN_PER_ACCOUNT = RateLimit.from_env("login_account", "RATE_LIMIT_LOGIN_PER_ACCOUNT", "10/60")
+FORGOT_PASSWORD_PER_IP = RateLimit.from_env("forgot_ip", "RATE_LIMIT_FORGOT_PER_IP", "5/900")
+FORGOT_PASSWORD_PER_EMAIL = RateLimit.from_env("forgot_email", "RATE_LIMIT_FORGOT_PER_EMAIL", "3/3600")
+
+
+class InMemoryTokenBucketBackend:
+    """Buckets en memoria del proceso, con desalojo LRU para acotar la memoria."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, limit: RateLimit, cost: float = 1) -> Tuple[bool, float]:
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(limit.capacity), now))
+            tokens = min(float(limit.capacity), tokens + (now - updated) * limit.refill_per_second)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (cost - tokens) / limit.refill_per_second
+        return allowed, retry_after
+
+
+class RedisTokenBucketBackend:
+    """Buckets compartidos entre workers; el cálculo es atómico dentro de Redis (Lua)."""
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local ttl = tonumber(ARGV[4])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or capacity
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    local allowed = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], ttl)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requiere el paquete 'redis' (pip install redis)") from e
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def consume(self, key: str, limit: RateLimit, cost: float = 1) -> Tuple[bool, float]:
+        allowed, tokens = self._script(
+            keys=[f"ratelimit:{key}"],
+            args=[limit.capacity, limit.refill_per_second, cost, int(math.ceil(limit.period)) + 1],
+        )
+        if allowed:
+            return True, 0.0
+        return False, (cost - float(tokens)) / limit.refill_per_second
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def hit(self, limit: RateLimit, identifier: Optional[str]) -> None:
+        """Consume un intento del bucket `limit` para `identifier` o responde 429."""
+        if not identifier:
+            return
+        key = f"{limit.name}:{identifier}"
+        try:
+            allowed, retry_after = self.backend.consume(key, limit)
+        except Exception:
+            # si el backend compartido no responde se deja pasar: no tumbar el login por Redis
+            logger.exception("Error consultando el rate limiter, se permite el request")
+            return
+        if not allowed:
+            logger.warning(f"Rate limit '{limit.name}' excedido para {identifier}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Demasiados intentos, espera un momento antes de volver a intentar",
+                headers={"Retry-After": str(max(1, int(math.ceil(retry_after))))},
+            )
+
+
+def _build_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisTokenBucketBackend(RATE_LIMIT_REDIS_URL)
+    return InMemoryTokenBucketBackend()
+
+
+rate_limiter = RateLimiter(_build_backend())
+
+
+def client_ip(request: Request) -> Optional[str]:
+    # AuditMiddleware ya resolvió X-Forwarded-For en request.state.client_ip
+    ip = getattr(request.state, "client_ip", None)
+    if ip:
+        return ip
+    return request.client.host if request.client else None
+
+
+def enforce_login_rate_limit(request: Request, username: Optional[str]) -> None:
+    rate_limiter.hit(LOGIN_PER_IP, client_ip(request))
+    rate_limiter.hit(LOGIN_PER_ACCOUNT, (username or "").strip().lower())
+
+
+def enforce_forgot_password_rate_limit(request: Request, email: Optional[str]) -> None:
+    rate_limiter.hit(FORGOT_PASSWORD_PER_IP, client_ip(request))
+    rate_limiter.hit(FORGOT_PASSWORD_PER_EMAIL, (email or "").strip().lower())
@@ -0,0 +1,167 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se traen las revocaciones nuevas de la BD (incremental, tarea periódica)
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+# Cada cuánto se reconstruye el filtro completo (purga expirados y redimensiona, tarea periódica)
+REVOCATION_REBUILD_SECONDS = float(os.getenv("REVOCATION_REBUILD_SECONDS", "3600"))
+# Margen al leer incrementalmente, para no perder revocaciones que otro proceso
+# confirmó tarde (transacciones largas o relojes ligeramente desfasados)
+REVOCATION_WATERMARK_OVERLAP = timedelta(seconds=60)
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+
+
+class BloomFilter:
+    """Filtro de Bloom simple: sin falsos negativos, falsos positivos ~error_rate."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+def user_revocation_key(user_id: int) -> str:
+    """Llave sintética en revoked_tokens que invalida todos los tokens emitidos antes de revoked_at."""
+    return f"user:{user_id}"
+
+
+class RevocationList:
+    """Lista de revocación de JWT respaldada por la tabla revoked_tokens.
+
+    Cada proceso mantiene un filtro de Bloom con los jti revocados. Lo
+    actualizan tareas periódicas (`refresh` incremental y `rebuild` completo,
+    registradas en el scheduler de la app), nunca el request: en el camino
+    caliente solo se consulta el filtro, y la BD cuando indica un posible acierto.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self._session_factory = session_factory
+        self._filter = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+        self._watermark: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ filtro
+    def _load(self, db: Session, since: Optional[datetime]):
+        query = db.query(RevokedToken.jti, RevokedToken.revoked_at)
+        if since is not None:
+            # repetir un add en el filtro es inocuo, así que se relee con margen
+            query = query.filter(RevokedToken.revoked_at >= since - REVOCATION_WATERMARK_OVERLAP)
+        return query.all()
+
+    def refresh(self) -> None:
+        """Agrega al filtro las revocaciones nuevas (cada REVOCATION_REFRESH_SECONDS)."""
+        with self._lock:
+            db = self._session_factory()
+            try:
+                rows = self._load(db, self._watermark)
+            finally:
+                db.close()
+            for row in rows:
+                self._filter.add(row.jti)
+                if self._watermark is None or row.revoked_at > self._watermark:
+                    self._watermark = row.revoked_at
+
+    def rebuild(self) -> None:
+        """Purga las revocaciones expiradas y arma el filtro de nuevo (cada REVOCATION_REBUILD_SECONDS).
+
+        El filtro nuevo se construye aparte y se reemplaza al final: los
+        requests siguen usando el anterior mientras tanto.
+        """
+        with self._lock:
+            db = self._session_factory()
+            try:
+                purged = db.query(RevokedToken).filter(
+                    RevokedToken.expires_at < datetime.utcnow()
+                ).delete(synchronize_session=False)
+                db.commit()
+                rows = self._load(db, None)
+            finally:
+                db.close()
+            new_filter = BloomFilter(max(REVOCATION_BLOOM_CAPACITY, len(rows) * 2), REVOCATION_BLOOM_ERROR_RATE)
+            for row in rows:
+                new_filter.add(row.jti)
+            self._filter = new_filter
+            self._watermark = max((row.revoked_at for row in rows), default=None)
+        if purged:
+            logger.info(f"{purged} revocaciones expiradas eliminadas")
+
+    # ------------------------------------------------------------- consultas
+    def is_revoked(self, db: Session, payload: dict) -> bool:
+        jti = payload.get("jti")
+        user_id = payload.get("user_id")
+        candidates = []
+        if jti and jti in self._filter:
+            candidates.append(jti)
+        if user_id is not None and user_revocation_key(user_id) in self._filter:
+            candidates.append(user_revocation_key(user_id))
+        if not candidates:
+            return False
+
+        rows = db.query(RevokedToken.jti, RevokedToken.revoked_at).filter(
+            RevokedToken.jti.in_(candidates)
+        ).all()
+        issued_at = payload.get("iat")
+        for row in rows:
+            if row.jti == jti:
+                return True
+            # revocación por usuario: aplica a tokens emitidos antes. iat viene en
+            # segundos enteros: un token del mismo segundo se da por posterior (p. ej.
+            # el login inmediato tras cambiar la contraseña)
+            revoked_ts = math.floor((row.revoked_at - datetime(1970, 1, 1)).total_seconds())
+            if issued_at is None or issued_at < revoked_ts:
+                return True
+        return False
+
+    # ------------------------------------------------------------ escrituras
+    def _upsert(self, db: Session, jti: str, user_id: Optional[int], expires_at: datetime) -> None:
+        stmt = pg_insert(RevokedToken).values(
+            jti=jti, user_id=user_id, revoked_at=datetime.utcnow(), expires_at=expires_at
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RevokedToken.jti],
+            set_={"revoked_at": stmt.excluded.revoked_at, "expires_at": stmt.excluded.expires_at},
+        )
+        db.execute(stmt)
+        # visible de inmediato en este proceso; el commit lo hace quien llama
+        self._filter.add(jti)
+
+    def revoke(self, db: Session, jti: str, user_id: Optional[int], expires_at: datetime) -> None:
+        self._upsert(db, jti, user_id, expires_at)
+
+    def revoke_user(self, db: Session, user_id: int, max_token_lifetime: timedelta) -> None:
+        """Revoca todos los tokens del usuario emitidos hasta ahora."""
+        self._upsert(db, user_revocation_key(user_id), user_id, datetime.utcnow() + max_token_lifetime)
+
+
+revocation_list = RevocationList()
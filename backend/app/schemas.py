@@ -70,6 +70,19 @@ class ResetPasswordRequest(BaseModel):
             raise ValueError('La contraseña debe tener al menos 8 caracteres')
         return v
 
+class PasswordResetConfirm(BaseModel):
+    token: str
+    new_password: str
+
+    @validator('new_password')
+    def validate_password_strength(cls, v):
+        if len(v) < 8:
+            raise ValueError('La contraseña debe tener al menos 8 caracteres')
+        return v
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 class PasswordChangeResponse(BaseModel):
     message: str
     success: bool
@@ -225,6 +238,14 @@ class UnidadJerarquicaResponse(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class UnidadMovimiento(BaseModel):
+    id_unidad: int
+    unidad_padre_id: Optional[int] = None  # None = la unidad queda como raíz
+
+
+class UnidadesMoverRequest(BaseModel):
+    movimientos: List[UnidadMovimiento] = Field(..., min_length=1, max_length=5000)
+
 # =================================================================================================
 #                                           ANEXOS
 # =================================================================================================
@@ -0,0 +1,430 @@
+"""
+Outbox de correos: los endpoints encolan filas en email_outbox dentro de su
+propia transacción y un worker aparte (scripts/email_worker.py) las envía.
+
+Si el proceso web se reinicia el correo no se pierde, y una llamada lenta a
+SendGrid no ocupa un hilo del threadpool de FastAPI.
+"""
+import logging
+import os
+import smtplib
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal, settings
+from ..models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# sendgrid | smtp | file | console (default: sendgrid si hay API key, si no console)
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "sendgrid" if settings.SENDGRID_API_KEY else "console")
+EMAIL_FROM = os.getenv("EMAIL_FROM", "no-reply@umich.mx")
+EMAIL_SMTP_HOST = os.getenv("EMAIL_SMTP_HOST", "localhost")
+EMAIL_SMTP_PORT = int(os.getenv("EMAIL_SMTP_PORT", "1025"))
+EMAIL_SMTP_USER = os.getenv("EMAIL_SMTP_USER", "")
+EMAIL_SMTP_PASSWORD = os.getenv("EMAIL_SMTP_PASSWORD", "")
+EMAIL_SMTP_STARTTLS = os.getenv("EMAIL_SMTP_STARTTLS", "false").lower() == "true"
+EMAIL_FILE_SINK_DIR = os.getenv("EMAIL_FILE_SINK_DIR", "outbox_mail")
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+# plazo de un reclamo: si el worker muere a la mitad del envío, la fila vuelve a estar disponible
+EMAIL_CLAIM_TIMEOUT_SECONDS = float(os.getenv("EMAIL_CLAIM_TIMEOUT_SECONDS", "300"))
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
+# filas enviadas/descartadas que se conservan (sin cuerpo) antes de borrarlas
+EMAIL_OUTBOX_RETENTION_HOURS = float(os.getenv("EMAIL_OUTBOX_RETENTION_HOURS", "72"))
+EMAIL_OUTBOX_PURGE_INTERVAL_SECONDS = float(os.getenv("EMAIL_OUTBOX_PURGE_INTERVAL_SECONDS", "3600"))
+EMAIL_OUTBOX_PURGE_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_PURGE_BATCH_SIZE", "1000"))
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+
+# =============================================================================
+#  Plantillas
+# =============================================================================
+def render_password_recovery(nombre_usuario: str, token: str) -> Tuple[str, str]:
+    """Devuelve (asunto, html) del correo de recuperación de contraseña."""
+    enlace = f"{FRONTEND_URL}/reset-password?token={token}"
+    subject = "Recuperación de contraseña - Sistema UMICH"
+    html_content = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <style>
+            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+            .header {{ background-color: #2c5aa0; color: white; padding: 20px; text-align: center; }}
+            .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 5px; }}
+            .token {{ background-color: #eee; padding: 15px; border-radius: 5px; font-family: monospace; font-size: 16px; }}
+            .button {{ background-color: #2c5aa0; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>Recuperación de Contraseña</h1>
+            </div>
+            <div class="content">
+                <h2>Hola {nombre_usuario},</h2>
+                <p>Has solicitado restablecer tu contraseña en el Sistema de la Universidad Michoacana.</p>
+
+                <p><strong>Token de recuperación:</strong></p>
+                <div class="token">{token}</div>
+
+                <p>O haz clic en el siguiente enlace:</p>
+                <a href="{enlace}" class="button">
+                    Restablecer Contraseña
+                </a>
+
+                <p style="margin-top: 30px; color: #666; font-size: 14px;">
+                    ⚠️ Este token expirará en 15 minutos. Si no solicitaste este cambio, ignora este mensaje.
+                </p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    return subject, html_content
+
+
+# =============================================================================
+#  Encolado (lo usan los endpoints)
+# =============================================================================
+def enqueue_email(db: Session, recipient: str, subject: str, html_body: str, kind: str,
+                  expires_at: Optional[datetime] = None) -> EmailOutbox:
+    """Agrega el correo al outbox. No hace commit: se confirma junto con la transacción de quien llama.
+
+    Con `expires_at` el correo se descarta si no se logra enviar antes de esa hora.
+    """
+    message = EmailOutbox(
+        kind=kind,
+        recipient=recipient,
+        subject=subject,
+        html_body=html_body,
+        status=STATUS_PENDING,
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+        expires_at=expires_at,
+    )
+    db.add(message)
+    return message
+
+
+def enqueue_password_recovery(db: Session, destinatario: str, nombre_usuario: str, token: str,
+                              expires_at: Optional[datetime] = None) -> EmailOutbox:
+    """`expires_at` es la expiración del token: después ya no tiene caso reintentar."""
+    subject, html_body = render_password_recovery(nombre_usuario, token)
+    return enqueue_email(db, destinatario, subject, html_body, kind="password_recovery", expires_at=expires_at)
+
+
+# =============================================================================
+#  Senders: un cliente/conexión por lote, no uno por correo
+# =============================================================================
+class ConsoleSender:
+    """Modo simulado (desarrollo sin SendGrid): solo registra el correo en el log."""
+
+    def open(self):
+        pass
+
+    def send(self, message: EmailOutbox) -> None:
+        logger.info(f"📧 [Simulado] Correo '{message.subject}' para {message.recipient}")
+
+    def close(self):
+        pass
+
+
+class SendGridSender:
+    def __init__(self, api_key: str, from_email: str = EMAIL_FROM):
+        from sendgrid import SendGridAPIClient
+
+        # un solo cliente (y su sesión HTTP) para todo el proceso
+        self._client = SendGridAPIClient(api_key)
+        self.from_email = from_email
+
+    def open(self):
+        pass
+
+    def send(self, message: EmailOutbox) -> None:
+        from sendgrid.helpers.mail import Content, Email, Mail, To
+
+        mail = Mail(Email(self.from_email), To(message.recipient), message.subject,
+                    Content("text/html", message.html_body))
+        response = self._client.send(mail)
+        if response.status_code >= 300:
+            raise RuntimeError(f"SendGrid respondió {response.status_code}")
+
+    def close(self):
+        pass
+
+
+def build_mime(message: EmailOutbox, from_email: str = EMAIL_FROM) -> EmailMessage:
+    mime = EmailMessage()
+    mime["From"] = from_email
+    mime["To"] = message.recipient
+    mime["Subject"] = message.subject
+    mime["X-Outbox-Id"] = str(message.id)
+    mime.set_content("Este correo requiere un cliente con soporte HTML.")
+    mime.add_alternative(message.html_body, subtype="html")
+    return mime
+
+
+class SMTPSender:
+    """SMTP (p. ej. MailHog/Mailpit en local); una conexión por lote."""
+
+    def __init__(self, host: str = EMAIL_SMTP_HOST, port: int = EMAIL_SMTP_PORT,
+                 user: str = EMAIL_SMTP_USER, password: str = EMAIL_SMTP_PASSWORD,
+                 starttls: bool = EMAIL_SMTP_STARTTLS, from_email: str = EMAIL_FROM):
+        self.host, self.port = host, port
+        self.user, self.password = user, password
+        self.starttls = starttls
+        self.from_email = from_email
+        self._conn: Optional[smtplib.SMTP] = None
+
+    def open(self):
+        self._conn = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            self._conn.starttls()
+        if self.user:
+            self._conn.login(self.user, self.password)
+
+    def send(self, message: EmailOutbox) -> None:
+        if self._conn is None:
+            self.open()
+        self._conn.send_message(build_mime(message, self.from_email))
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except smtplib.SMTPException:
+                pass
+            self._conn = None
+
+
+class FileSender:
+    """Escribe cada correo como .eml en un directorio: sirve para pruebas sin red."""
+
+    def __init__(self, directory: str = EMAIL_FILE_SINK_DIR, from_email: str = EMAIL_FROM):
+        self.directory = Path(directory)
+        self.from_email = from_email
+
+    def open(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def send(self, message: EmailOutbox) -> None:
+        path = self.directory / f"{message.id}.eml"
+        path.write_bytes(bytes(build_mime(message, self.from_email)))
+
+    def close(self):
+        pass
+
+
+def build_sender(backend: str = EMAIL_BACKEND):
+    if backend == "sendgrid":
+        return SendGridSender(settings.SENDGRID_API_KEY or os.getenv("SENDGRID_API_KEY", ""))
+    if backend == "smtp":
+        return SMTPSender()
+    if backend == "file":
+        return FileSender()
+    return ConsoleSender()
+
+
+# =============================================================================
+#  Worker
+# =============================================================================
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff exponencial: base, 2*base, 4*base... con tope."""
+    seconds = min(EMAIL_RETRY_MAX_SECONDS, EMAIL_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+    return timedelta(seconds=seconds)
+
+
+def deliver(sender, messages: List[EmailOutbox], now: Optional[datetime] = None,
+            record: Optional[Callable[[EmailOutbox], object]] = None) -> Tuple[int, int]:
+    """Envía mensajes ya reclamados (`attempts` ya cuenta este intento) y anota su resultado.
+
+    `record` se llama con cada mensaje en cuanto se conoce su resultado, para
+    guardarlo sin esperar al resto del lote. Devuelve (enviados, fallidos).
+    """
+    now = now or datetime.utcnow()
+    sent = failed = 0
+    sender.open()
+    try:
+        for message in messages:
+            try:
+                sender.send(message)
+            except Exception as e:
+                failed += 1
+                message.last_error = str(e)[:2000]
+                next_attempt = now + retry_delay(message.attempts)
+                if message.attempts >= EMAIL_MAX_ATTEMPTS:
+                    message.status = STATUS_FAILED
+                    message.html_body = ""
+                    logger.error(f"Correo {message.id} descartado tras {message.attempts} intentos: {e}")
+                elif message.expires_at is not None and next_attempt >= message.expires_at:
+                    # el siguiente intento llegaría con el token ya vencido
+                    message.status = STATUS_FAILED
+                    message.html_body = ""
+                    logger.error(f"Correo {message.id} descartado: su contenido expira antes del reintento ({e})")
+                else:
+                    message.next_attempt_at = next_attempt
+                    logger.warning(f"Correo {message.id} falló (intento {message.attempts}): {e}")
+            else:
+                sent += 1
+                message.status = STATUS_SENT
+                message.sent_at = now
+                message.last_error = None
+                # el cuerpo lleva el token de recuperación: no se guarda una vez enviado
+                message.html_body = ""
+            if record is not None:
+                record(message)
+    finally:
+        sender.close()
+    return sent, failed
+
+
+def purge_email_outbox(session_factory: Callable[[], Session] = SessionLocal,
+                       retention_hours: float = EMAIL_OUTBOX_RETENTION_HOURS,
+                       batch_size: int = EMAIL_OUTBOX_PURGE_BATCH_SIZE) -> int:
+    """Vacía el cuerpo de las filas ya cerradas (sent/failed) y borra las que pasaron la retención.
+
+    El vaciado cubre filas cerradas antes de que `deliver()` limpiara el cuerpo.
+    Borra en lotes (transacciones cortas) y devuelve cuántas filas borró.
+    """
+    closed = EmailOutbox.status.in_((STATUS_SENT, STATUS_FAILED))
+    db = session_factory()
+    try:
+        db.query(EmailOutbox).filter(closed, EmailOutbox.html_body != "").update(
+            {EmailOutbox.html_body: ""}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    expired = and_(closed, func.coalesce(EmailOutbox.sent_at, EmailOutbox.created_at) < cutoff)
+    total = 0
+    while True:
+        db = session_factory()
+        try:
+            ids = select(EmailOutbox.id).where(expired).limit(batch_size).scalar_subquery()
+            deleted = db.query(EmailOutbox).filter(EmailOutbox.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        total += deleted
+        if deleted < batch_size:
+            break
+    if total:
+        logger.info(f"{total} correos enviados/descartados eliminados del outbox")
+    return total
+
+
+def claim_batch(db: Session, batch_size: int = EMAIL_BATCH_SIZE, now: Optional[datetime] = None) -> List[EmailOutbox]:
+    """Reclama un lote de pendientes vencidos en una transacción corta y la confirma.
+
+    SKIP LOCKED deja a otros workers tomar los demás. Cada fila queda con
+    `claimed_at`, el intento contado y `next_attempt_at` al final del plazo del
+    reclamo, así que nadie más la toma mientras se envía. Antes se descartan los
+    pendientes cuyo contenido ya expiró. Devuelve las filas fuera de la sesión.
+    """
+    now = now or datetime.utcnow()
+    db.query(EmailOutbox).filter(
+        EmailOutbox.status == STATUS_PENDING, EmailOutbox.expires_at <= now
+    ).update({
+        EmailOutbox.status: STATUS_FAILED,
+        EmailOutbox.html_body: "",
+        EmailOutbox.last_error: "Expiró antes de poder enviarse",
+    }, synchronize_session=False)
+    messages = (
+        db.query(EmailOutbox)
+        .filter(EmailOutbox.status == STATUS_PENDING, EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for message in messages:
+        message.attempts = (message.attempts or 0) + 1
+        message.claimed_at = now
+        message.next_attempt_at = now + timedelta(seconds=EMAIL_CLAIM_TIMEOUT_SECONDS)
+    db.flush()
+    # fuera de la sesión antes del commit: conservan sus atributos para el envío
+    for message in messages:
+        db.expunge(message)
+    db.commit()
+    return messages
+
+
+def record_result(session_factory: Callable[[], Session], message: EmailOutbox) -> bool:
+    """Guarda el resultado de un envío en su propia transacción.
+
+    Solo si la fila sigue reclamada por este worker (mismo `claimed_at`): si el
+    plazo venció y otro la volvió a tomar, el resultado de ese otro manda.
+    """
+    values = {
+        EmailOutbox.status: message.status,
+        EmailOutbox.next_attempt_at: message.next_attempt_at,
+        EmailOutbox.last_error: message.last_error,
+        EmailOutbox.sent_at: message.sent_at,
+    }
+    if message.status != STATUS_PENDING:
+        values[EmailOutbox.html_body] = ""
+    db = session_factory()
+    try:
+        updated = db.query(EmailOutbox).filter(
+            EmailOutbox.id == message.id,
+            EmailOutbox.status == STATUS_PENDING,
+            EmailOutbox.claimed_at == message.claimed_at,
+        ).update(values, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    return bool(updated)
+
+
+def process_batch(session_factory: Callable[[], Session], sender, batch_size: int = EMAIL_BATCH_SIZE) -> int:
+    """Reclama un lote, lo envía sin transacción abierta y guarda cada resultado aparte.
+
+    Una llamada lenta a SendGrid/SMTP no retiene bloqueos ni una conexión
+    "idle in transaction". Si el worker muere a la mitad, las filas sin
+    resultado vuelven a estar disponibles al vencer el plazo del reclamo
+    (entrega al menos una vez).
+    """
+    db = session_factory()
+    try:
+        messages = claim_batch(db, batch_size)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if not messages:
+        return 0
+    sent, failed = deliver(sender, messages, record=lambda message: record_result(session_factory, message))
+    logger.info(f"Outbox: {sent} enviados, {failed} fallidos")
+    return len(messages)
+
+
+def run_worker(session_factory: Callable[[], Session], sender, poll_interval: float = 2.0,
+               batch_size: int = EMAIL_BATCH_SIZE, once: bool = False) -> None:
+    while True:
+        try:
+            processed = process_batch(session_factory, sender, batch_size)
+        except Exception:
+            logger.exception("Error procesando el outbox de correos")
+            processed = 0
+        if once and processed < batch_size:
+            return
+        # si el lote vino lleno probablemente hay más: no esperar
+        if processed < batch_size:
+            time.sleep(poll_interval)
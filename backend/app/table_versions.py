@@ -0,0 +1,101 @@
+import hashlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .models import TableVersion
+
+# Tablas con contador de cambios. Para cada una, las columnas cuyo cambio
+# cuenta (None = cualquiera): en users solo lo que se muestra en los listados,
+# para que un login (updated_at, password) no invalide los ETags
+VERSIONED_TABLES: Dict[str, Optional[Tuple[str, ...]]] = {
+    "unidades_responsables": None,
+    "cargos": None,
+    "users": ("username", "email", "role", "is_deleted"),
+}
+
+
+# =============================================================================
+#  Incremento: en la misma transacción que el cambio
+# =============================================================================
+def _changed_tables(session: Session) -> set:
+    tables = set()
+    for obj in list(session.new) + list(session.deleted):
+        name = getattr(obj, "__tablename__", None)
+        if name in VERSIONED_TABLES:
+            tables.add(name)
+    for obj in session.dirty:
+        name = getattr(obj, "__tablename__", None)
+        if name not in VERSIONED_TABLES or name in tables:
+            continue
+        attrs = VERSIONED_TABLES[name]
+        state = inspect(obj)
+        if attrs is None:
+            if session.is_modified(obj, include_collections=False):
+                tables.add(name)
+        elif any(state.attrs[attr].history.has_changes() for attr in attrs):
+            tables.add(name)
+    return tables
+
+
+def bump_versions(conn, tables: Iterable[str]) -> None:
+    """Suma 1 al contador de cada tabla (lo crea si no existe)."""
+    tables = sorted(set(tables))  # mismo orden de bloqueo en todas las transacciones
+    if not tables:
+        return
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(TableVersion).values([{"table_name": t, "version": 1} for t in tables])
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=["table_name"],
+        set_={"version": TableVersion.version + 1},
+    ))
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_flushed_tables(session: Session, flush_context) -> None:
+    # después del flush session.new/dirty/deleted aún describen lo que se escribió
+    tables = _changed_tables(session)
+    if tables:
+        bump_versions(session.connection(), tables)
+
+
+# =============================================================================
+#  Lectura y ETags
+# =============================================================================
+def versions_query(tables: Iterable[str]):
+    """SELECT de los contadores de `tables` (una búsqueda por PK, sin ORM)."""
+    return select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(sorted(tables)))
+
+
+def versions_from_rows(tables: Iterable[str], rows) -> Tuple[int, ...]:
+    found = {name: version for name, version in rows}
+    return tuple(int(found.get(t, 0)) for t in sorted(tables))
+
+
+def current_versions(db: Session, tables: Iterable[str]) -> Tuple[int, ...]:
+    """Versiones de `tables` en orden alfabético (0 si la tabla nunca cambió)."""
+    tables = sorted(tables)
+    return versions_from_rows(tables, db.execute(versions_query(tables)).all())
+
+
+def make_etag(resource: str, versions: Tuple[int, ...], *parts) -> str:
+    """ETag fuerte del recurso: cambia si cambia cualquiera de las versiones o `parts`."""
+    key = "|".join([resource, *map(str, versions), *map(str, parts)])
+    return '"%s"' % hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """¿El If-None-Match del cliente incluye `etag`? (comparación débil, RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
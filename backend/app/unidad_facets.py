@@ -0,0 +1,82 @@
+import os
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, func, select
+
+from .cache import TTLCache
+from .models import UnidadResponsable
+
+# El resultado se guarda con la versión de unidades_responsables en la llave
+# (table_versions): cualquier alta, cambio o baja lo deja fuera sin invalidar
+# a mano, también en los demás workers. El TTL solo limpia filtros viejos
+UNIDADES_FACETS_CACHE_TTL_SECONDS = float(os.getenv("UNIDADES_FACETS_CACHE_TTL_SECONDS", "3600"))
+UNIDADES_FACETS_CACHE_MAX_ENTRIES = int(os.getenv("UNIDADES_FACETS_CACHE_MAX_ENTRIES", "256"))
+
+# Columnas con conteo por valor para la barra de filtros del catálogo
+UNIDAD_FACETS = ("municipio", "localidad", "tipo_unidad")
+
+facets_cache = TTLCache(maxsize=UNIDADES_FACETS_CACHE_MAX_ENTRIES, ttl=UNIDADES_FACETS_CACHE_TTL_SECONDS)
+
+
+def escape_like(value: str) -> str:
+    # "!" como escape: la barra invertida depende de standard_conforming_strings
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def unidad_filters(tipo_unidad: Optional[str] = None, municipio: Optional[str] = None,
+                   localidad: Optional[str] = None, unidad_padre_id: Optional[int] = None,
+                   nombre: Optional[str] = None) -> Dict[str, object]:
+    """Condiciones del catálogo por nombre de filtro (solo las que vienen)."""
+    conds = {}
+    if tipo_unidad is not None:
+        conds["tipo_unidad"] = UnidadResponsable.tipo_unidad == tipo_unidad
+    if municipio is not None:
+        conds["municipio"] = UnidadResponsable.municipio == municipio
+    if localidad is not None:
+        conds["localidad"] = UnidadResponsable.localidad == localidad
+    if unidad_padre_id is not None:
+        conds["unidad_padre_id"] = UnidadResponsable.unidad_padre_id == unidad_padre_id
+    if nombre is not None:
+        # ILIKE '%...%' lo resuelve el índice trigram (pg_trgm)
+        conds["nombre"] = UnidadResponsable.nombre.ilike(f"%{escape_like(nombre)}%", escape="!")
+    return conds
+
+
+def facets_query(conds: Dict[str, object]):
+    """Conteos de todas las facetas en una sola consulta (GROUPING SETS).
+
+    Cada faceta se cuenta con todos los filtros activos menos el suyo, para
+    que al elegir un municipio sigan saliendo los demás con su conteo. Los
+    filtros que no son faceta van en el WHERE; los de faceta, en un
+    `count(*) FILTER (WHERE ...)` por faceta.
+    """
+    columns = [getattr(UnidadResponsable, facet) for facet in UNIDAD_FACETS]
+    counts = []
+    for facet in UNIDAD_FACETS:
+        others = [cond for key, cond in conds.items() if key in UNIDAD_FACETS and key != facet]
+        count = func.count()
+        counts.append((count.filter(and_(*others)) if others else count).label(f"n_{facet}"))
+    return (
+        select(*columns, *[func.grouping(c).label(f"g_{c.key}") for c in columns], *counts)
+        .where(*[cond for key, cond in conds.items() if key not in UNIDAD_FACETS])
+        .group_by(func.grouping_sets(*columns))
+    )
+
+
+def fold_facet_rows(rows: Iterable) -> Dict[str, List[dict]]:
+    """Filas de facets_query -> {faceta: [{"valor", "total"}, ...]}, de mayor a menor total.
+
+    GROUPING(col) = 0 indica de qué faceta es cada fila; `valor` None son las
+    unidades sin ese dato. Los valores que los otros filtros dejan en cero no salen.
+    """
+    facets: Dict[str, List[dict]] = {facet: [] for facet in UNIDAD_FACETS}
+    for row in rows:
+        for facet in UNIDAD_FACETS:
+            if getattr(row, f"g_{facet}") == 0:
+                total = getattr(row, f"n_{facet}")
+                if total:
+                    facets[facet].append({"valor": getattr(row, facet), "total": int(total)})
+                break
+    for values in facets.values():
+        values.sort(key=lambda v: (-v["total"], v["valor"] is None, v["valor"] or ""))
+    return facets
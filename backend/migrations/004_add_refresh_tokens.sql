@@ -0,0 +1,27 @@
+-- ============================================================================
+-- Migración: Agregar tabla de refresh tokens
+-- Fecha: 2026-10-18
+-- Descripción: Crea la tabla refresh_tokens para renovar access tokens sin
+--              volver a verificar la contraseña (rotación + detección de reuso)
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token_hash VARCHAR(64) NOT NULL,
+    family_id VARCHAR(36) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP,
+    replaced_by_id INTEGER REFERENCES refresh_tokens(id)
+);
+
+-- La renovación es una sola búsqueda por el hash del token
+CREATE UNIQUE INDEX IF NOT EXISTS ix_refresh_tokens_token_hash ON refresh_tokens(token_hash);
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_family_id ON refresh_tokens(family_id);
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON refresh_tokens(user_id);
+
+COMMENT ON TABLE refresh_tokens IS 'Refresh tokens (solo SHA-256) con rotación; un token reutilizado revoca su familia';
+
+-- Rollback (usar manualmente en caso de ser necesario)
+-- DROP TABLE IF EXISTS refresh_tokens CASCADE;
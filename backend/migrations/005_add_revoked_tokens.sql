@@ -0,0 +1,24 @@
+-- ============================================================================
+-- Migración: Agregar lista de revocación de tokens
+-- Fecha: 2026-10-18
+-- Descripción: Crea la tabla revoked_tokens (llave jti). Cada proceso la
+--              replica en un filtro de Bloom que se refresca incrementalmente
+--              por revoked_at; la fila "user:<id>" revoca todo lo emitido a un
+--              usuario antes de revoked_at (p. ej. al darlo de baja).
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti VARCHAR(64) PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    revoked_at TIMESTAMP NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Lectura incremental del filtro y purga de expirados
+CREATE INDEX IF NOT EXISTS ix_revoked_tokens_revoked_at ON revoked_tokens(revoked_at);
+CREATE INDEX IF NOT EXISTS ix_revoked_tokens_expires_at ON revoked_tokens(expires_at);
+
+COMMENT ON TABLE revoked_tokens IS 'JWT revocados por jti (o user:<id> para revocación por usuario)';
+
+-- Rollback (usar manualmente en caso de ser necesario)
+-- DROP TABLE IF EXISTS revoked_tokens CASCADE;
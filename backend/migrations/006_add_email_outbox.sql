@@ -0,0 +1,31 @@
+-- ============================================================================
+-- Migración: Agregar outbox de correos
+-- Fecha: 2026-10-18
+-- Descripción: Crea la tabla email_outbox. Los endpoints encolan el correo en
+--              su misma transacción y scripts/email_worker.py lo envía,
+--              reclamando lotes con FOR UPDATE SKIP LOCKED y reintentando con
+--              backoff exponencial.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    html_body TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_email_outbox_id ON email_outbox(id);
+-- Índice parcial: el worker solo recorre pendientes vencidos
+CREATE INDEX IF NOT EXISTS ix_email_outbox_pending ON email_outbox(next_attempt_at) WHERE status = 'pending';
+
+COMMENT ON TABLE email_outbox IS 'Correos pendientes de envío (patrón outbox)';
+
+-- Rollback (usar manualmente en caso de ser necesario)
+-- DROP TABLE IF EXISTS email_outbox CASCADE;
@@ -0,0 +1,32 @@
+-- ============================================================================
+-- Migración: Agregar tokens de recuperación de contraseña
+-- Fecha: 2026-10-18
+-- Descripción: Crea la tabla password_reset_tokens. Solo se guarda el SHA-256
+--              del token (índice único), así que verificar un reset es una
+--              búsqueda por índice. Un barrido periódico borra en lotes los
+--              tokens expirados o ya usados. Las columnas users.reset_token y
+--              users.reset_token_expiration dejan de usarse.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS password_reset_tokens (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token_hash VARCHAR(64) NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    expires_at TIMESTAMP NOT NULL,
+    used_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_password_reset_tokens_id ON password_reset_tokens(id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_password_reset_tokens_token_hash ON password_reset_tokens(token_hash);
+CREATE INDEX IF NOT EXISTS ix_password_reset_tokens_user_id ON password_reset_tokens(user_id);
+-- Barrido de expirados
+CREATE INDEX IF NOT EXISTS ix_password_reset_tokens_expires_at ON password_reset_tokens(expires_at);
+
+COMMENT ON TABLE password_reset_tokens IS 'Tokens de recuperación de contraseña (hash SHA-256, un solo uso)';
+
+-- Tokens en claro que quedaron del esquema anterior
+UPDATE users SET reset_token = NULL, reset_token_expiration = NULL WHERE reset_token IS NOT NULL;
+
+-- Rollback (usar manualmente en caso de ser necesario)
+-- DROP TABLE IF EXISTS password_reset_tokens CASCADE;
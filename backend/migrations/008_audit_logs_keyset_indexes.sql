@@ -0,0 +1,35 @@
+-- ============================================================================
+-- Migración: Índices de paginación por cursor en audit_logs
+-- Fecha: 2026-10-18
+-- Descripción: GET /admin/audit_logs pagina por (timestamp, id) descendente.
+--              Los índices compuestos en ese orden hacen que cualquier página
+--              (y con los filtros más comunes) sea un recorrido de índice de
+--              `limit` filas. timestamp pasa a NOT NULL por ser parte de la llave.
+--              Ejecutar fuera de una transacción (CREATE INDEX CONCURRENTLY).
+-- ============================================================================
+
+UPDATE audit_logs SET timestamp = NOW() WHERE timestamp IS NULL;
+ALTER TABLE audit_logs ALTER COLUMN timestamp SET NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_timestamp_id
+    ON audit_logs (timestamp DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_actor_timestamp_id
+    ON audit_logs (actor_id, timestamp DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_object_type_timestamp_id
+    ON audit_logs (object_type, timestamp DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_action_timestamp_id
+    ON audit_logs (action, timestamp DESC, id DESC);
+
+-- El índice simple por timestamp queda cubierto por idx_audit_timestamp_id
+DROP INDEX CONCURRENTLY IF EXISTS idx_audit_timestamp;
+
+-- Estadísticas al día para que la estimación de totales sea razonable
+ANALYZE audit_logs;
+
+-- Rollback (usar manualmente en caso de ser necesario)
+-- CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON audit_logs(timestamp);
+-- DROP INDEX IF EXISTS idx_audit_timestamp_id;
+-- DROP INDEX IF EXISTS idx_audit_actor_timestamp_id;
+-- DROP INDEX IF EXISTS idx_audit_object_type_timestamp_id;
+-- DROP INDEX IF EXISTS idx_audit_action_timestamp_id;
+-- ALTER TABLE audit_logs ALTER COLUMN timestamp DROP NOT NULL;
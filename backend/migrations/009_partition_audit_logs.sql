@@ -0,0 +1,118 @@
+-- ============================================================================
+-- Migración: Particionado mensual de audit_logs y manifiesto de archivos
+-- Fecha: 2026-10-18
+-- Descripción: audit_logs pasa a ser una tabla particionada por rango de
+--              timestamp, con una partición por mes (audit_logs_yYYYYmMM) y
+--              una partición DEFAULT para lo que caiga fuera de rango.
+--              - Las consultas acotadas por fecha solo leen las particiones
+--                del rango (partition pruning).
+--              - La app crea las particiones futuras y archiva las viejas
+--                (DETACH + COPY a CSV gzip) con app/audit_partitions.py; cada
+--                archivo queda registrado en audit_log_archives.
+--              La PK pasa a (id, timestamp): Postgres exige que incluya la
+--              llave de partición. Los ids se siguen tomando de la misma
+--              secuencia. Bloquea audit_logs mientras copia los datos.
+-- ============================================================================
+
+BEGIN;
+
+ALTER TABLE audit_logs RENAME TO audit_logs_legacy;
+ALTER INDEX audit_logs_pkey RENAME TO audit_logs_legacy_pkey;
+ALTER SEQUENCE audit_logs_id_seq OWNED BY NONE;
+
+CREATE TABLE audit_logs (
+    id INTEGER NOT NULL DEFAULT nextval('audit_logs_id_seq'),
+    actor_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    action VARCHAR(100) NOT NULL,
+    object_type VARCHAR(50),
+    object_id INTEGER,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    success BOOLEAN DEFAULT TRUE,
+    ip_address VARCHAR(50),
+    metadata JSON,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT;
+
+-- Una partición por mes desde el evento más antiguo hasta 3 meses adelante
+DO $$
+DECLARE
+    month_start DATE := date_trunc('month', COALESCE((SELECT min(timestamp) FROM audit_logs_legacy), now()));
+    last_month DATE := date_trunc('month', now()) + INTERVAL '3 months';
+BEGIN
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF audit_logs FOR VALUES FROM (%L) TO (%L)',
+            'audit_logs_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+            month_start,
+            month_start + INTERVAL '1 month'
+        );
+        month_start := month_start + INTERVAL '1 month';
+    END LOOP;
+END $$;
+
+INSERT INTO audit_logs (id, actor_id, action, object_type, object_id, timestamp, success, ip_address, metadata)
+SELECT id, actor_id, action, object_type, object_id, COALESCE(timestamp, now()), success, ip_address, metadata
+FROM audit_logs_legacy;
+
+DROP TABLE audit_logs_legacy;
+ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id;
+
+-- Índices en el padre: se crean en cada partición, actual y futura
+CREATE INDEX idx_audit_timestamp_id ON audit_logs (timestamp DESC, id DESC);
+CREATE INDEX idx_audit_actor_timestamp_id ON audit_logs (actor_id, timestamp DESC, id DESC);
+CREATE INDEX idx_audit_object_type_timestamp_id ON audit_logs (object_type, timestamp DESC, id DESC);
+CREATE INDEX idx_audit_action_timestamp_id ON audit_logs (action, timestamp DESC, id DESC);
+CREATE INDEX idx_audit_object ON audit_logs (object_type, object_id);
+
+CREATE TABLE IF NOT EXISTS audit_log_archives (
+    id SERIAL PRIMARY KEY,
+    partition_name VARCHAR(63) NOT NULL UNIQUE,
+    range_start TIMESTAMP NOT NULL,
+    range_end TIMESTAMP NOT NULL,
+    file_path VARCHAR(500) NOT NULL,
+    row_count INTEGER NOT NULL,
+    checksum_sha256 VARCHAR(64) NOT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_audit_log_archives_range_start ON audit_log_archives (range_start);
+
+COMMENT ON TABLE audit_log_archives IS 'Particiones mensuales de audit_logs separadas y exportadas a CSV gzip';
+
+COMMIT;
+
+ANALYZE audit_logs;
+
+-- Restaurar un archivo (psql, como superusuario o con pg_read_server_files):
+-- CREATE TABLE audit_logs_y2025m01 PARTITION OF audit_logs FOR VALUES FROM ('2025-01-01') TO ('2025-02-01');
+-- COPY audit_logs (id, actor_id, action, object_type, object_id, timestamp, success, ip_address, metadata)
+--     FROM PROGRAM 'zcat /ruta/audit_logs_y2025m01.csv.gz' WITH (FORMAT csv, HEADER true, NULL '\N');
+-- DELETE FROM audit_log_archives WHERE partition_name = 'audit_logs_y2025m01';
+
+-- Rollback (usar manualmente en caso de ser necesario; no recupera lo ya archivado)
+-- BEGIN;
+-- ALTER TABLE audit_logs RENAME TO audit_logs_partitioned;
+-- ALTER SEQUENCE audit_logs_id_seq OWNED BY NONE;
+-- CREATE TABLE audit_logs (
+--     id INTEGER PRIMARY KEY DEFAULT nextval('audit_logs_id_seq'),
+--     actor_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+--     action VARCHAR(100) NOT NULL,
+--     object_type VARCHAR(50),
+--     object_id INTEGER,
+--     timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+--     success BOOLEAN DEFAULT TRUE,
+--     ip_address VARCHAR(50),
+--     metadata JSON
+-- );
+-- INSERT INTO audit_logs SELECT * FROM audit_logs_partitioned;
+-- DROP TABLE audit_logs_partitioned;
+-- ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id;
+-- CREATE INDEX idx_audit_timestamp_id ON audit_logs (timestamp DESC, id DESC);
+-- CREATE INDEX idx_audit_actor_timestamp_id ON audit_logs (actor_id, timestamp DESC, id DESC);
+-- CREATE INDEX idx_audit_object_type_timestamp_id ON audit_logs (object_type, timestamp DESC, id DESC);
+-- CREATE INDEX idx_audit_action_timestamp_id ON audit_logs (action, timestamp DESC, id DESC);
+-- CREATE INDEX idx_audit_object ON audit_logs (object_type, object_id);
+-- DROP TABLE IF EXISTS audit_log_archives;
+-- COMMIT;
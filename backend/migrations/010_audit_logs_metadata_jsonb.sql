@@ -0,0 +1,21 @@
+-- ============================================================================
+-- Migración: metadata de audit_logs como JSONB con índice GIN
+-- Fecha: 2026-10-18
+-- Descripción: la columna metadata pasa de JSON a JSONB (se reescriben todas
+--              las particiones; bloquea audit_logs mientras dura) y se indexa
+--              con GIN (jsonb_ops) para que los filtros de /admin/audit_logs
+--              por contención (metadata @> '{"folio": "X"}') y por llave
+--              (metadata ? 'admin_override') sean recorridos de índice.
+--              El índice se crea en el padre y Postgres lo propaga a cada
+--              partición, actual y futura.
+-- ============================================================================
+
+ALTER TABLE audit_logs ALTER COLUMN metadata TYPE JSONB USING metadata::jsonb;
+
+CREATE INDEX IF NOT EXISTS idx_audit_metadata_gin ON audit_logs USING GIN (metadata);
+
+ANALYZE audit_logs;
+
+-- Rollback (usar manualmente en caso de ser necesario)
+-- DROP INDEX IF EXISTS idx_audit_metadata_gin;
+-- ALTER TABLE audit_logs ALTER COLUMN metadata TYPE JSON USING metadata::json;
@@ -0,0 +1,46 @@
+-- ============================================================================
+-- Migración: Tablas de resumen de auditoría para el dashboard de actividad
+-- Fecha: 2026-10-18
+-- Descripción: audit_daily_rollup cuenta eventos por (día, acción,
+--              object_type, éxito) y audit_actor_daily_rollup por
+--              (día, actor, éxito). La app las mantiene al escribir cada
+--              evento (misma transacción), y GET /admin/audit_stats responde
+--              desde ellas sin recorrer audit_logs. Se llenan aquí con lo que
+--              ya hay; para recalcular un rango: scripts/rebuild_audit_rollups.py
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS audit_daily_rollup (
+    day DATE NOT NULL,
+    action VARCHAR(100) NOT NULL,
+    object_type VARCHAR(50) NOT NULL DEFAULT '',
+    success BOOLEAN NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, action, object_type, success)
+);
+
+CREATE TABLE IF NOT EXISTS audit_actor_daily_rollup (
+    day DATE NOT NULL,
+    actor_id INTEGER NOT NULL,
+    success BOOLEAN NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, actor_id, success)
+);
+
+INSERT INTO audit_daily_rollup (day, action, object_type, success, count)
+SELECT timestamp::date, action, COALESCE(object_type, ''), COALESCE(success, TRUE), count(*)
+FROM audit_logs
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (day, action, object_type, success) DO UPDATE SET count = EXCLUDED.count;
+
+INSERT INTO audit_actor_daily_rollup (day, actor_id, success, count)
+SELECT timestamp::date, COALESCE(actor_id, 0), COALESCE(success, TRUE), count(*)
+FROM audit_logs
+GROUP BY 1, 2, 3
+ON CONFLICT (day, actor_id, success) DO UPDATE SET count = EXCLUDED.count;
+
+COMMENT ON TABLE audit_daily_rollup IS 'Eventos de auditoría por día, acción, tipo de objeto y resultado';
+COMMENT ON TABLE audit_actor_daily_rollup IS 'Eventos de auditoría por día, actor (0 = sin actor) y resultado';
+
+-- Rollback (usar manualmente en caso de ser necesario)
+-- DROP TABLE IF EXISTS audit_actor_daily_rollup;
+-- DROP TABLE IF EXISTS audit_daily_rollup;
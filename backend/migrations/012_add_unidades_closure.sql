@@ -0,0 +1,59 @@
+-- ============================================================================
+-- Migración: Tabla de cierre de la jerarquía de unidades responsables
+-- Fecha: 2026-10-18
+-- Descripción: unidades_closure guarda un renglón por cada par
+--              (ancestro, descendiente, profundidad), incluido el de cada
+--              unidad consigo misma. La app la mantiene en la misma transacción
+--              que el alta o el cambio de padre (app/hierarchy.py), de modo que
+--              "todas las actas bajo esta facultad" es un join por índice:
+--                  JOIN unidades_closure c ON c.descendant_id = a.unidad_responsable
+--                  WHERE c.ancestor_id = :facultad
+--              Se llena desde unidad_padre_id; si la app ya creó la tabla vacía
+--              (create_all) se vuelve a llenar completa.
+-- ============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS unidades_closure (
+    ancestor_id INTEGER NOT NULL REFERENCES unidades_responsables(id_unidad) ON DELETE CASCADE,
+    descendant_id INTEGER NOT NULL REFERENCES unidades_responsables(id_unidad) ON DELETE CASCADE,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+
+-- Ancestros de una unidad (la PK ya cubre subárbol: ancestor_id -> descendant_id)
+CREATE INDEX IF NOT EXISTS ix_unidades_closure_descendant_depth ON unidades_closure (descendant_id, depth);
+
+-- Índices de las columnas de unidad en actas y anexos para los joins por subárbol
+CREATE INDEX IF NOT EXISTS ix_acta_entrega_recepcion_unidad_responsable ON acta_entrega_recepcion (unidad_responsable);
+CREATE INDEX IF NOT EXISTS ix_anexos_unidad_responsable_id ON anexos (unidad_responsable_id);
+
+LOCK TABLE unidades_responsables IN SHARE MODE;
+DELETE FROM unidades_closure;
+
+WITH RECURSIVE tree AS (
+    SELECT id_unidad, ARRAY[id_unidad] AS path
+    FROM unidades_responsables WHERE unidad_padre_id IS NULL
+    UNION ALL
+    SELECT u.id_unidad, t.path || u.id_unidad
+    FROM unidades_responsables u JOIN tree t ON u.unidad_padre_id = t.id_unidad
+)
+INSERT INTO unidades_closure (ancestor_id, descendant_id, depth)
+SELECT p.ancestor_id, t.id_unidad, array_length(t.path, 1) - p.pos
+FROM tree t, unnest(t.path) WITH ORDINALITY AS p(ancestor_id, pos);
+
+-- Unidades que no cuelgan de ninguna raíz (ciclos o padre inexistente): solo el par consigo mismas
+INSERT INTO unidades_closure (ancestor_id, descendant_id, depth)
+SELECT u.id_unidad, u.id_unidad, 0 FROM unidades_responsables u
+WHERE NOT EXISTS (
+    SELECT 1 FROM unidades_closure c WHERE c.ancestor_id = u.id_unidad AND c.descendant_id = u.id_unidad
+);
+
+COMMIT;
+
+ANALYZE unidades_closure;
+
+-- Rollback (usar manualmente en caso de ser necesario)
+-- DROP TABLE IF EXISTS unidades_closure;
+-- DROP INDEX IF EXISTS ix_acta_entrega_recepcion_unidad_responsable;
+-- DROP INDEX IF EXISTS ix_anexos_unidad_responsable_id;
@@ -0,0 +1,29 @@
+-- ============================================================================
+-- Migración: Contadores de cambios por tabla (table_versions)
+-- Fecha: 2026-10-18
+-- Descripción: un renglón por tabla con un contador que la app incrementa en
+--              la misma transacción que cada alta, cambio o baja
+--              (app/table_versions.py). De él salen los ETags de
+--              GET /unidades_responsables, /cargos y /unidades_jerarquicas:
+--              con If-None-Match la revalidación es una búsqueda por PK y un
+--              304, sin cargar ni serializar nada. También lo usa el índice
+--              jerárquico en memoria para detectar cambios de otros workers.
+--              Los UPDATE/DELETE masivos por SQL no lo incrementan: si se hace
+--              uno, sumar 1 a mano a la tabla afectada.
+-- ============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO table_versions (table_name, version)
+VALUES ('unidades_responsables', 1), ('cargos', 1), ('users', 1)
+ON CONFLICT (table_name) DO NOTHING;
+
+COMMIT;
+
+-- Rollback (usar manualmente en caso de ser necesario)
+-- DROP TABLE IF EXISTS table_versions;
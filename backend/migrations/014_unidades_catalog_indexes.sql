@@ -0,0 +1,33 @@
+-- ============================================================================
+-- Migración: Índices del catálogo de unidades responsables
+-- Fecha: 2026-10-18
+-- Descripción: GET /unidades_responsables pagina por cursor en orden
+--              (nombre, id_unidad) y filtra por tipo_unidad, municipio,
+--              unidad_padre_id y nombre (subcadena, sin importar mayúsculas).
+--              El índice compuesto resuelve el orden y el cursor; el índice
+--              GIN trigram (pg_trgm) resuelve nombre ILIKE '%texto%'.
+--              CREATE INDEX CONCURRENTLY no puede ir en una transacción:
+--              ejecutar con psql sin -1, o con scripts/migrate_unidades_catalog_indexes.py
+-- ============================================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_unidades_responsables_nombre_id
+    ON unidades_responsables (nombre, id_unidad);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_unidades_responsables_nombre_trgm
+    ON unidades_responsables USING gin (nombre gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_unidades_responsables_tipo_unidad
+    ON unidades_responsables (tipo_unidad);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_unidades_responsables_municipio
+    ON unidades_responsables (municipio);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_unidades_responsables_unidad_padre_id
+    ON unidades_responsables (unidad_padre_id);
+
+ANALYZE unidades_responsables;
+
+-- Rollback (usar manualmente en caso de ser necesario)
+-- DROP INDEX CONCURRENTLY IF EXISTS ix_unidades_responsables_nombre_id;
+-- DROP INDEX CONCURRENTLY IF EXISTS ix_unidades_responsables_nombre_trgm;
+-- DROP INDEX CONCURRENTLY IF EXISTS ix_unidades_responsables_tipo_unidad;
+-- DROP INDEX CONCURRENTLY IF EXISTS ix_unidades_responsables_municipio;
+-- DROP INDEX CONCURRENTLY IF EXISTS ix_unidades_responsables_unidad_padre_id;
@@ -0,0 +1,18 @@
+-- ============================================================================
+-- Migración: Reclamo y vigencia en email_outbox
+-- Fecha: 2026-10-18
+-- Descripción: El worker ya no mantiene abierta la transacción del lote
+--              mientras envía: marca cada fila con claimed_at, confirma, envía
+--              y guarda cada resultado en su propia transacción. expires_at
+--              evita reintentar correos cuyo token ya no sirve.
+-- ============================================================================
+
+ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP;
+
+COMMENT ON COLUMN email_outbox.claimed_at IS 'Último reclamo de un worker; el resultado solo se guarda si sigue siendo el suyo';
+COMMENT ON COLUMN email_outbox.expires_at IS 'Después de esta hora el correo ya no se envía ni se reintenta';
+
+-- Rollback (usar manualmente en caso de ser necesario)
+-- ALTER TABLE email_outbox DROP COLUMN IF EXISTS expires_at;
+-- ALTER TABLE email_outbox DROP COLUMN IF EXISTS claimed_at;
@@ -0,0 +1,52 @@
+"""
+Mantenimiento de particiones de audit_logs
+
+La app ya lo corre en segundo plano (cada AUDIT_PARTITION_MAINTENANCE_INTERVAL_SECONDS);
+este script sirve para correrlo a mano o desde cron.
+
+Ejecutar con:
+    python scripts/audit_partitions.py ensure              # crea particiones futuras
+    python scripts/audit_partitions.py archive             # archiva lo que exceda la retención
+    python scripts/audit_partitions.py archive --retention-months 6
+"""
+import sys
+import os
+import logging
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import SessionLocal
+    from backend.app.audit_partitions import (
+        AUDIT_ARCHIVE_DIR, AUDIT_PARTITION_MONTHS_AHEAD, AUDIT_RETENTION_MONTHS,
+        archive_expired_partitions, ensure_future_partitions,
+    )
+except ModuleNotFoundError:
+    from app.database import SessionLocal
+    from app.audit_partitions import (
+        AUDIT_ARCHIVE_DIR, AUDIT_PARTITION_MONTHS_AHEAD, AUDIT_RETENTION_MONTHS,
+        archive_expired_partitions, ensure_future_partitions,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Mantenimiento de particiones de audit_logs')
+    parser.add_argument('action', choices=['ensure', 'archive'])
+    parser.add_argument('--months-ahead', type=int, default=AUDIT_PARTITION_MONTHS_AHEAD)
+    parser.add_argument('--retention-months', type=int, default=AUDIT_RETENTION_MONTHS)
+    parser.add_argument('--archive-dir', default=AUDIT_ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    db = SessionLocal()
+    try:
+        if args.action == 'ensure':
+            created = ensure_future_partitions(db, months_ahead=args.months_ahead)
+            print(f"✅ Particiones creadas: {', '.join(created) or 'ninguna'}")
+        else:
+            archived = archive_expired_partitions(db, retention_months=args.retention_months,
+                                                  archive_dir=args.archive_dir)
+            print(f"✅ Particiones archivadas: {', '.join(archived) or 'ninguna'}")
+    finally:
+        db.close()
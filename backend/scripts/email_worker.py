@@ -0,0 +1,38 @@
+"""
+Worker del outbox de correos (tabla email_outbox)
+
+Ejecutar con:
+    python scripts/email_worker.py            # en bucle
+    python scripts/email_worker.py --once     # vacía los pendientes y termina
+
+El backend de envío se elige con EMAIL_BACKEND (sendgrid | smtp | file | console).
+Se pueden levantar varios workers: cada uno reclama lotes con FOR UPDATE SKIP LOCKED.
+"""
+import sys
+import os
+import logging
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import SessionLocal
+    from backend.app.services.email_outbox import EMAIL_BATCH_SIZE, build_sender, run_worker
+except ModuleNotFoundError:
+    from app.database import SessionLocal
+    from app.services.email_outbox import EMAIL_BATCH_SIZE, build_sender, run_worker
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Worker del outbox de correos')
+    parser.add_argument('--once', action='store_true', help='Procesar lo pendiente y salir')
+    parser.add_argument('--backend', default=None, help='sendgrid | smtp | file | console')
+    parser.add_argument('--batch-size', type=int, default=EMAIL_BATCH_SIZE)
+    parser.add_argument('--poll-interval', type=float, default=2.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    sender = build_sender(args.backend) if args.backend else build_sender()
+    print(f"📬 Worker de correos iniciado ({type(sender).__name__})")
+    run_worker(SessionLocal, sender, poll_interval=args.poll_interval,
+               batch_size=args.batch_size, once=args.once)
@@ -0,0 +1,75 @@
+"""
+Script de migración para los índices de paginación por cursor de audit_logs
+
+Ejecutar con:
+    python scripts/migrate_audit_keyset_indexes.py migrate
+    python scripts/migrate_audit_keyset_indexes.py rollback
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import engine
+except ModuleNotFoundError:
+    from app.database import engine
+
+from sqlalchemy import text
+
+# CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción: una sentencia por ejecución
+SQL_MIGRATE = [
+    "UPDATE audit_logs SET timestamp = NOW() WHERE timestamp IS NULL",
+    "ALTER TABLE audit_logs ALTER COLUMN timestamp SET NOT NULL",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_timestamp_id ON audit_logs (timestamp DESC, id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_actor_timestamp_id ON audit_logs (actor_id, timestamp DESC, id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_object_type_timestamp_id ON audit_logs (object_type, timestamp DESC, id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_action_timestamp_id ON audit_logs (action, timestamp DESC, id DESC)",
+    "DROP INDEX CONCURRENTLY IF EXISTS idx_audit_timestamp",
+    "ANALYZE audit_logs",
+]
+
+SQL_ROLLBACK = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_timestamp ON audit_logs (timestamp)",
+    "DROP INDEX CONCURRENTLY IF EXISTS idx_audit_timestamp_id",
+    "DROP INDEX CONCURRENTLY IF EXISTS idx_audit_actor_timestamp_id",
+    "DROP INDEX CONCURRENTLY IF EXISTS idx_audit_object_type_timestamp_id",
+    "DROP INDEX CONCURRENTLY IF EXISTS idx_audit_action_timestamp_id",
+    "ALTER TABLE audit_logs ALTER COLUMN timestamp DROP NOT NULL",
+]
+
+
+def _run(statements):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for sql in statements:
+            conn.execute(text(sql))
+
+
+def migrate():
+    try:
+        _run(SQL_MIGRATE)
+        print("✅ Migración índices keyset de audit_logs completada")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+def rollback():
+    try:
+        _run(SQL_ROLLBACK)
+        print("✅ Rollback índices keyset de audit_logs completado")
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Migración de índices keyset de audit_logs')
+    parser.add_argument('action', choices=['migrate', 'rollback'])
+    args = parser.parse_args()
+
+    if args.action == 'migrate':
+        migrate()
+    else:
+        rollback()
@@ -0,0 +1,65 @@
+"""
+Script de migración para pasar audit_logs.metadata a JSONB con índice GIN
+
+Ejecutar con:
+    python scripts/migrate_audit_metadata_jsonb.py migrate
+    python scripts/migrate_audit_metadata_jsonb.py rollback
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import engine
+except ModuleNotFoundError:
+    from app.database import engine
+
+from sqlalchemy import text
+
+SQL_MIGRATE = [
+    "ALTER TABLE audit_logs ALTER COLUMN metadata TYPE JSONB USING metadata::jsonb",
+    "CREATE INDEX IF NOT EXISTS idx_audit_metadata_gin ON audit_logs USING GIN (metadata)",
+    "ANALYZE audit_logs",
+]
+
+SQL_ROLLBACK = [
+    "DROP INDEX IF EXISTS idx_audit_metadata_gin",
+    "ALTER TABLE audit_logs ALTER COLUMN metadata TYPE JSON USING metadata::json",
+]
+
+
+def _run(statements):
+    with engine.begin() as conn:
+        for sql in statements:
+            conn.execute(text(sql))
+
+
+def migrate():
+    try:
+        _run(SQL_MIGRATE)
+        print("✅ Migración metadata JSONB de audit_logs completada")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+def rollback():
+    try:
+        _run(SQL_ROLLBACK)
+        print("✅ Rollback metadata JSONB de audit_logs completado")
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Migración de metadata JSONB de audit_logs')
+    parser.add_argument('action', choices=['migrate', 'rollback'])
+    args = parser.parse_args()
+
+    if args.action == 'migrate':
+        migrate()
+    else:
+        rollback()
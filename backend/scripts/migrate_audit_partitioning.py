@@ -0,0 +1,47 @@
+"""
+Script de migración para particionar audit_logs por mes
+
+Ejecuta migrations/009_partition_audit_logs.sql (transacción única; bloquea
+audit_logs mientras copia los datos).
+
+Ejecutar con:
+    python scripts/migrate_audit_partitioning.py migrate
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import engine
+except ModuleNotFoundError:
+    from app.database import engine
+
+SQL_FILE = os.path.join(os.path.dirname(__file__), '..', 'migrations', '009_partition_audit_logs.sql')
+
+
+def migrate():
+    with open(SQL_FILE, encoding='utf-8') as f:
+        sql = f.read()
+    # el archivo maneja su propia transacción (BEGIN/COMMIT) y termina con ANALYZE
+    raw = engine.raw_connection()
+    try:
+        raw.autocommit = True
+        cursor = raw.cursor()
+        cursor.execute(sql)
+        cursor.close()
+        print("✅ Migración particionado de audit_logs completada")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+    finally:
+        raw.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Migración de particionado de audit_logs')
+    parser.add_argument('action', choices=['migrate'])
+    args = parser.parse_args()
+
+    migrate()
@@ -0,0 +1,75 @@
+"""
+Script de migración para agregar tabla email_outbox
+
+Ejecutar con:
+    python scripts/migrate_email_outbox.py migrate
+    python scripts/migrate_email_outbox.py rollback
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import engine
+except ModuleNotFoundError:
+    from app.database import engine
+
+from sqlalchemy import text
+
+SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    html_body TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_email_outbox_id ON email_outbox(id);
+CREATE INDEX IF NOT EXISTS ix_email_outbox_pending ON email_outbox(next_attempt_at) WHERE status = 'pending';
+"""
+
+SQL_ROLLBACK = """
+DROP TABLE IF EXISTS email_outbox CASCADE;
+"""
+
+
+def migrate():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(SQL_CREATE_TABLE))
+            conn.commit()
+            print("✅ Migración email_outbox completada")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+def rollback():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(SQL_ROLLBACK))
+            conn.commit()
+            print("✅ Rollback email_outbox completado")
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Migración de email_outbox')
+    parser.add_argument('action', choices=['migrate', 'rollback'])
+    args = parser.parse_args()
+
+    if args.action == 'migrate':
+        migrate()
+    else:
+        rollback()
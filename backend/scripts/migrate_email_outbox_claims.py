@@ -0,0 +1,62 @@
+"""
+Script de migración para agregar claimed_at y expires_at a email_outbox
+
+Ejecutar con:
+    python scripts/migrate_email_outbox_claims.py migrate
+    python scripts/migrate_email_outbox_claims.py rollback
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import engine
+except ModuleNotFoundError:
+    from app.database import engine
+
+from sqlalchemy import text
+
+SQL_MIGRATE = """
+ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP;
+"""
+
+SQL_ROLLBACK = """
+ALTER TABLE email_outbox DROP COLUMN IF EXISTS expires_at;
+ALTER TABLE email_outbox DROP COLUMN IF EXISTS claimed_at;
+"""
+
+
+def migrate():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(SQL_MIGRATE))
+            conn.commit()
+            print("✅ Migración email_outbox (claimed_at, expires_at) completada")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+def rollback():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(SQL_ROLLBACK))
+            conn.commit()
+            print("✅ Rollback email_outbox (claimed_at, expires_at) completado")
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Migración de reclamo y vigencia en email_outbox')
+    parser.add_argument('action', choices=['migrate', 'rollback'])
+    args = parser.parse_args()
+
+    if args.action == 'migrate':
+        migrate()
+    else:
+        rollback()
@@ -0,0 +1,74 @@
+"""
+Script de migración para agregar tabla password_reset_tokens
+
+Ejecutar con:
+    python scripts/migrate_password_reset_tokens.py migrate
+    python scripts/migrate_password_reset_tokens.py rollback
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import engine
+except ModuleNotFoundError:
+    from app.database import engine
+
+from sqlalchemy import text
+
+SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS password_reset_tokens (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token_hash VARCHAR(64) NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    expires_at TIMESTAMP NOT NULL,
+    used_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_password_reset_tokens_id ON password_reset_tokens(id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_password_reset_tokens_token_hash ON password_reset_tokens(token_hash);
+CREATE INDEX IF NOT EXISTS ix_password_reset_tokens_user_id ON password_reset_tokens(user_id);
+CREATE INDEX IF NOT EXISTS ix_password_reset_tokens_expires_at ON password_reset_tokens(expires_at);
+
+UPDATE users SET reset_token = NULL, reset_token_expiration = NULL WHERE reset_token IS NOT NULL;
+"""
+
+SQL_ROLLBACK = """
+DROP TABLE IF EXISTS password_reset_tokens CASCADE;
+"""
+
+
+def migrate():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(SQL_CREATE_TABLE))
+            conn.commit()
+            print("✅ Migración password_reset_tokens completada")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+def rollback():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(SQL_ROLLBACK))
+            conn.commit()
+            print("✅ Rollback password_reset_tokens completado")
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Migración de password_reset_tokens')
+    parser.add_argument('action', choices=['migrate', 'rollback'])
+    args = parser.parse_args()
+
+    if args.action == 'migrate':
+        migrate()
+    else:
+        rollback()
@@ -0,0 +1,73 @@
+"""
+Script de migración para agregar tabla refresh_tokens
+
+Ejecutar con:
+    python scripts/migrate_refresh_tokens.py migrate
+    python scripts/migrate_refresh_tokens.py rollback
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import engine
+except ModuleNotFoundError:
+    from app.database import engine
+
+from sqlalchemy import text
+
+SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token_hash VARCHAR(64) NOT NULL,
+    family_id VARCHAR(36) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP,
+    replaced_by_id INTEGER REFERENCES refresh_tokens(id)
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_refresh_tokens_token_hash ON refresh_tokens(token_hash);
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_family_id ON refresh_tokens(family_id);
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON refresh_tokens(user_id);
+"""
+
+SQL_ROLLBACK = """
+DROP TABLE IF EXISTS refresh_tokens CASCADE;
+"""
+
+
+def migrate():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(SQL_CREATE_TABLE))
+            conn.commit()
+            print("✅ Migración refresh_tokens completada")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+def rollback():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(SQL_ROLLBACK))
+            conn.commit()
+            print("✅ Rollback refresh_tokens completado")
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Migración de refresh_tokens')
+    parser.add_argument('action', choices=['migrate', 'rollback'])
+    args = parser.parse_args()
+
+    if args.action == 'migrate':
+        migrate()
+    else:
+        rollback()
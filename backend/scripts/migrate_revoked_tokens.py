@@ -0,0 +1,68 @@
+"""
+Script de migración para agregar tabla revoked_tokens
+
+Ejecutar con:
+    python scripts/migrate_revoked_tokens.py migrate
+    python scripts/migrate_revoked_tokens.py rollback
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import engine
+except ModuleNotFoundError:
+    from app.database import engine
+
+from sqlalchemy import text
+
+SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti VARCHAR(64) PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    revoked_at TIMESTAMP NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_revoked_tokens_revoked_at ON revoked_tokens(revoked_at);
+CREATE INDEX IF NOT EXISTS ix_revoked_tokens_expires_at ON revoked_tokens(expires_at);
+"""
+
+SQL_ROLLBACK = """
+DROP TABLE IF EXISTS revoked_tokens CASCADE;
+"""
+
+
+def migrate():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(SQL_CREATE_TABLE))
+            conn.commit()
+            print("✅ Migración revoked_tokens completada")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+def rollback():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(SQL_ROLLBACK))
+            conn.commit()
+            print("✅ Rollback revoked_tokens completado")
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Migración de revoked_tokens')
+    parser.add_argument('action', choices=['migrate', 'rollback'])
+    args = parser.parse_args()
+
+    if args.action == 'migrate':
+        migrate()
+    else:
+        rollback()
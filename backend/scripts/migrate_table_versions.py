@@ -0,0 +1,79 @@
+"""
+Script de migración para los contadores de cambios por tabla (ETags)
+
+Ejecutar con:
+    python scripts/migrate_table_versions.py migrate
+    python scripts/migrate_table_versions.py bump users   # tras un UPDATE masivo por SQL
+    python scripts/migrate_table_versions.py rollback
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import engine
+    from backend.app.table_versions import VERSIONED_TABLES, bump_versions
+except ModuleNotFoundError:
+    from app.database import engine
+    from app.table_versions import VERSIONED_TABLES, bump_versions
+
+from sqlalchemy import text
+
+SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+"""
+
+SQL_ROLLBACK = """
+DROP TABLE IF EXISTS table_versions;
+"""
+
+
+def migrate():
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(SQL_CREATE_TABLE))
+            bump_versions(conn, VERSIONED_TABLES)
+        print("✅ Migración table_versions completada")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+def bump(tables):
+    try:
+        with engine.begin() as conn:
+            bump_versions(conn, tables)
+        print(f"✅ Versiones incrementadas: {', '.join(tables)}")
+    except Exception as e:
+        print(f"❌ Error al incrementar versiones: {e}")
+        raise
+
+
+def rollback():
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(SQL_ROLLBACK))
+        print("✅ Rollback table_versions completado")
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Migración de los contadores de cambios por tabla')
+    parser.add_argument('action', choices=['migrate', 'bump', 'rollback'])
+    parser.add_argument('tables', nargs='*', help=f"tablas para bump ({', '.join(sorted(VERSIONED_TABLES))})")
+    args = parser.parse_args()
+    unknown = set(args.tables) - set(VERSIONED_TABLES)
+    if unknown:
+        parser.error(f"tablas sin contador: {', '.join(sorted(unknown))}")
+
+    if args.action == 'bump':
+        bump(args.tables or sorted(VERSIONED_TABLES))
+    else:
+        {'migrate': migrate, 'rollback': rollback}[args.action]()
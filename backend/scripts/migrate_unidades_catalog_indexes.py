@@ -0,0 +1,73 @@
+"""
+Script de migración para los índices del catálogo de unidades responsables
+
+Ejecutar con:
+    python scripts/migrate_unidades_catalog_indexes.py migrate
+    python scripts/migrate_unidades_catalog_indexes.py rollback
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import engine
+except ModuleNotFoundError:
+    from app.database import engine
+
+from sqlalchemy import text
+
+# CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción: una sentencia por ejecución
+SQL_MIGRATE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_unidades_responsables_nombre_id ON unidades_responsables (nombre, id_unidad)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_unidades_responsables_nombre_trgm ON unidades_responsables USING gin (nombre gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_unidades_responsables_tipo_unidad ON unidades_responsables (tipo_unidad)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_unidades_responsables_municipio ON unidades_responsables (municipio)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_unidades_responsables_unidad_padre_id ON unidades_responsables (unidad_padre_id)",
+    "ANALYZE unidades_responsables",
+]
+
+SQL_ROLLBACK = [
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_unidades_responsables_nombre_id",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_unidades_responsables_nombre_trgm",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_unidades_responsables_tipo_unidad",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_unidades_responsables_municipio",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_unidades_responsables_unidad_padre_id",
+]
+
+
+def _run(statements):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for sql in statements:
+            conn.execute(text(sql))
+
+
+def migrate():
+    try:
+        _run(SQL_MIGRATE)
+        print("✅ Migración índices del catálogo de unidades completada")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+def rollback():
+    try:
+        _run(SQL_ROLLBACK)
+        print("✅ Rollback índices del catálogo de unidades completado")
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Migración de índices del catálogo de unidades responsables')
+    parser.add_argument('action', choices=['migrate', 'rollback'])
+    args = parser.parse_args()
+
+    if args.action == 'migrate':
+        migrate()
+    else:
+        rollback()
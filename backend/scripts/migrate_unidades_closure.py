@@ -0,0 +1,80 @@
+"""
+Script de migración para la tabla de cierre de unidades responsables
+
+Ejecutar con:
+    python scripts/migrate_unidades_closure.py migrate    # crea la tabla y la llena
+    python scripts/migrate_unidades_closure.py rebuild    # vuelve a llenarla desde unidad_padre_id
+    python scripts/migrate_unidades_closure.py rollback
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import engine
+    from backend.app.hierarchy import rebuild_closure
+except ModuleNotFoundError:
+    from app.database import engine
+    from app.hierarchy import rebuild_closure
+
+from sqlalchemy import text
+
+SQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS unidades_closure (
+    ancestor_id INTEGER NOT NULL REFERENCES unidades_responsables(id_unidad) ON DELETE CASCADE,
+    descendant_id INTEGER NOT NULL REFERENCES unidades_responsables(id_unidad) ON DELETE CASCADE,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_unidades_closure_descendant_depth ON unidades_closure (descendant_id, depth);
+CREATE INDEX IF NOT EXISTS ix_acta_entrega_recepcion_unidad_responsable ON acta_entrega_recepcion (unidad_responsable);
+CREATE INDEX IF NOT EXISTS ix_anexos_unidad_responsable_id ON anexos (unidad_responsable_id);
+"""
+
+SQL_ROLLBACK = """
+DROP TABLE IF EXISTS unidades_closure;
+DROP INDEX IF EXISTS ix_acta_entrega_recepcion_unidad_responsable;
+DROP INDEX IF EXISTS ix_anexos_unidad_responsable_id;
+"""
+
+
+def migrate():
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(SQL_CREATE_TABLE))
+            rebuild_closure(conn)
+        print("✅ Migración unidades_closure completada")
+    except Exception as e:
+        print(f"❌ Error durante la migración: {e}")
+        raise
+
+
+def rebuild():
+    try:
+        with engine.begin() as conn:
+            rebuild_closure(conn)
+        print("✅ unidades_closure reconstruida")
+    except Exception as e:
+        print(f"❌ Error durante la reconstrucción: {e}")
+        raise
+
+
+def rollback():
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(SQL_ROLLBACK))
+        print("✅ Rollback unidades_closure completado")
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Migración de la tabla de cierre de unidades')
+    parser.add_argument('action', choices=['migrate', 'rebuild', 'rollback'])
+    args = parser.parse_args()
+
+    {'migrate': migrate, 'rebuild': rebuild, 'rollback': rollback}[args.action]()
@@ -0,0 +1,45 @@
+"""
+Reconstruye las tablas de resumen de auditoría desde audit_logs
+
+Ejecutar con:
+    python scripts/rebuild_audit_rollups.py                                  # todo lo que hay en audit_logs
+    python scripts/rebuild_audit_rollups.py --start 2026-01-01 --end 2026-01-31
+
+Los meses ya archivados en disco no están en audit_logs: dejarlos fuera del
+rango para conservar sus conteos.
+
+Se puede correr con la app en marcha: las tablas de resumen se bloquean en modo
+EXCLUSIVE durante la reconstrucción, así que las escrituras de auditoría esperan
+(las lecturas del dashboard no) y se suman al terminar.
+"""
+import sys
+import os
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from backend.app.database import SessionLocal
+    from backend.app.audit_rollup import rebuild_rollups
+except ModuleNotFoundError:
+    from app.database import SessionLocal
+    from app.audit_rollup import rebuild_rollups
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Reconstrucción de resúmenes de auditoría')
+    parser.add_argument('--start', type=date.fromisoformat, default=None, help='Primer día (YYYY-MM-DD)')
+    parser.add_argument('--end', type=date.fromisoformat, default=None, help='Último día (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        written = rebuild_rollups(db, args.start, args.end)
+        print(f"✅ Resúmenes reconstruidos: {written} filas diarias")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error durante la reconstrucción: {e}")
+        raise
+    finally:
+        db.close()
@@ -1,11 +1,18 @@
 import pytest
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
 
 try:
     # when running inside container symlinked layout
     from app.database import engine, SessionLocal
+    from app.models import Cargo, TableVersion, UnidadResponsable, User, UserCargoHistorial
 except Exception:
     from backend.app.database import engine, SessionLocal
+    from backend.app.models import Cargo, TableVersion, UnidadResponsable, User, UserCargoHistorial
+
+# User carga sus relaciones (unidad, historial de cargos) y sus escrituras suben
+# la versión en table_versions: toda BD de prueba con usuarios necesita estas tablas
+USER_TABLES = (User, Cargo, UnidadResponsable, UserCargoHistorial, TableVersion)
 
 @pytest.fixture
 def db() -> Session:
@@ -37,3 +44,21 @@ def db() -> Session:
         session.close()
         trans.rollback()
         connection.close()
+
+
+@pytest.fixture
+def sqlite_engine(monkeypatch):
+    """Fábrica de BDs SQLite en memoria para pruebas sin PostgreSQL.
+
+    `sqlite_engine(Model, ..., patch=(modulo,))` crea las tablas de usuarios
+    más las indicadas y apunta `SessionLocal` de cada módulo en `patch` a esa BD.
+    Con `url` se usa un archivo (p. ej. para abrirlo también con aiosqlite).
+    """
+    def make(*models, patch=(), url="sqlite://"):
+        test_engine = create_engine(url)
+        for model in dict.fromkeys(USER_TABLES + models):
+            model.__table__.create(test_engine)
+        for module in patch:
+            monkeypatch.setattr(module, "SessionLocal", sessionmaker(bind=test_engine))
+        return test_engine
+    return make
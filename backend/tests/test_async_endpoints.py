@@ -0,0 +1,148 @@
+"""
+Tests para los endpoints de lectura que usan AsyncSession (get_async_db)
+(SQLite en archivo: la app lo abre con aiosqlite y las referencias con la sesión síncrona)
+"""
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+try:
+    from app import main
+    from app.database import get_async_db, get_db
+    from app.models import ActaEntregaRecepcion, Anexos, Resumen, UnidadClosure, UnidadResponsable, User, UserRoles
+    from app.unidad_facets import facets_cache
+except Exception:
+    from backend.app import main
+    from backend.app.database import get_async_db, get_db
+    from backend.app.models import (
+        ActaEntregaRecepcion, Anexos, Resumen, UnidadClosure, UnidadResponsable, User, UserRoles,
+    )
+    from backend.app.unidad_facets import facets_cache
+
+
+@pytest.fixture
+def env(sqlite_engine, tmp_path):
+    path = tmp_path / "app.db"
+    engine = sqlite_engine(UnidadClosure, ActaEntregaRecepcion, Anexos, Resumen, url=f"sqlite:///{path}")
+    # NullPool: TestClient corre cada request en su propio event loop
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    async_session = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    sync_session = sessionmaker(bind=engine)
+
+    async def override_async_db():
+        async with async_session() as db:
+            yield db
+
+    def override_db():
+        db = sync_session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    with Session(engine) as db:
+        ana = User(username="ana", email="ana@example.com", role=UserRoles.USER, password="x", is_deleted=False)
+        luis = User(username="luis", email="luis@example.com", role=UserRoles.ADMIN, password="x", is_deleted=False)
+        baja = User(username="baja", email="baja@example.com", role=UserRoles.USER, password="x", is_deleted=True)
+        db.add_all([ana, luis, baja])
+        db.flush()
+        rectoria = UnidadResponsable(nombre="Rectoría", tipo_unidad="Rectoría", municipio="Morelia", responsable=luis.id)
+        db.add(rectoria)
+        db.flush()
+        facultad = UnidadResponsable(nombre="Facultad de Derecho", tipo_unidad="Facultad", municipio="Morelia",
+                                     responsable=ana.id, unidad_padre_id=rectoria.id_unidad)
+        db.add(facultad)
+        db.flush()
+        acta = ActaEntregaRecepcion(unidad_responsable=facultad.id_unidad, folio="F-1", fecha="2026-10-01",
+                                    hora="10:00", comisionado="Luis", entrante="Ana", estado="Abierta")
+        db.add(acta)
+        db.flush()
+        db.add_all([
+            Anexos(clave="A1", creador_id=ana.id, datos=[{"campo": "valor"}], estado="Borrador",
+                   unidad_responsable_id=facultad.id_unidad, acta_id=acta.id, is_deleted=False),
+            Anexos(clave="A2", creador_id=ana.id, datos=[], estado="Borrador",
+                   unidad_responsable_id=facultad.id_unidad, is_deleted=True),
+        ])
+        db.commit()
+        ids = {"rectoria": rectoria.id_unidad, "facultad": facultad.id_unidad, "acta": acta.id,
+               "ana": ana.id, "luis": luis.id}
+
+    facets_cache.clear()
+    main.app.dependency_overrides.update({get_async_db: override_async_db, get_db: override_db})
+    yield TestClient(main.app), engine, ids
+    main.app.dependency_overrides.clear()
+    facets_cache.clear()
+
+
+def test_users_list_matches_sync_detail(env):
+    client, _, ids = env
+    response = client.get("/users")
+    assert response.status_code == 200
+    users = response.json()
+    # los dados de baja no aparecen
+    assert sorted(u["username"] for u in users) == ["ana", "luis"]
+    for user in users:
+        assert user == client.get(f"/users/{user['id']}").json()
+
+
+def test_actas_list_matches_sync_detail(env):
+    client, _, ids = env
+    actas = client.get("/actas").json()
+    assert [a["id"] for a in actas] == [ids["acta"]]
+    assert [a["clave"] for a in actas[0]["anexos"]] == ["A1"]
+    assert actas[0] == client.get(f"/actas/{ids['acta']}").json()
+    # filtro por subárbol desde la raíz
+    assert client.get("/actas", params={"unidad_subtree": ids["rectoria"]}).json() == actas
+
+
+def test_anexos_list_matches_sync_detail(env):
+    client, _, _ = env
+    anexos = client.get("/anexos").json()
+    assert [a["clave"] for a in anexos] == ["A1"]
+    assert anexos[0] == client.get(f"/anexos/{anexos[0]['id']}").json()
+
+
+def test_unidades_list_pages_and_matches_rows(env):
+    client, engine, ids = env
+    response = client.get("/unidades_responsables", params={"limit": 1})
+    assert response.status_code == 200
+    (facultad,) = response.json()
+    assert facultad["id_unidad"] == ids["facultad"]
+    assert facultad["responsable"]["username"] == "ana"
+    assert facultad["dependientes"] == []
+
+    (rectoria,) = client.get("/unidades_responsables",
+                             params={"limit": 1, "cursor": response.headers["X-Next-Cursor"]}).json()
+    with Session(engine) as db:
+        row = db.get(UnidadResponsable, ids["rectoria"])
+        assert (rectoria["nombre"], rectoria["municipio"], rectoria["tipo_unidad"]) == \
+            (row.nombre, row.municipio, row.tipo_unidad)
+    assert rectoria["responsable"]["username"] == "luis"
+    assert [d["id_unidad"] for d in rectoria["dependientes"]] == [ids["facultad"]]
+
+
+def test_upload_resumen_writes_through_async_session(env, monkeypatch):
+    client, engine, ids = env
+    uploads = []
+
+    def fake_upload(contents, acta_id):
+        uploads.append((contents, acta_id))
+        return {"file_id": "drive-1", "url": "https://drive/1", "nombre_archivo": f"resumen_{acta_id}.pdf"}
+
+    monkeypatch.setattr(main, "upload_pdf_to_drive", fake_upload)
+    pdf = {"file": ("resumen.pdf", b"%PDF-1.4", "application/pdf")}
+
+    response = client.post(f"/{ids['acta']}", files=pdf)
+    assert response.status_code == 200
+    assert response.json()["file_id"] == "drive-1"
+    assert uploads == [(b"%PDF-1.4", ids["acta"])]
+    with Session(engine) as db:
+        assert [r.url for r in db.query(Resumen).filter(Resumen.acta_id == ids["acta"])] == ["https://drive/1"]
+
+    assert client.post(f"/{ids['acta']}", files=pdf).status_code == 400
+    assert client.post("/9999", files=pdf).status_code == 404
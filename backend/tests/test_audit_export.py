@@ -0,0 +1,46 @@
+"""
+Tests para la codificación en streaming de la exportación de auditoría
+"""
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+try:
+    from app.audit_export import stream_export
+except Exception:
+    from backend.app.audit_export import stream_export
+
+
+def make_rows(n):
+    for i in range(n):
+        yield {
+            'id': i, 'actor_id': 1, 'action': 'update_anexo', 'object_type': 'anexo', 'object_id': i,
+            'timestamp': datetime(2026, 1, 1, 0, 0, i % 60), 'success': True, 'ip_address': None,
+            'metadata': {'clave': f'A{i}'} if i % 2 else None,
+        }
+
+
+def test_ndjson_has_one_object_per_line():
+    body = b''.join(stream_export(make_rows(3), 'ndjson'))
+    lines = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+    assert [line['id'] for line in lines] == [0, 1, 2]
+    assert lines[1]['metadata'] == {'clave': 'A1'}
+    assert lines[0]['timestamp'] == '2026-01-01T00:00:00'
+
+
+def test_csv_has_header_and_json_metadata():
+    body = b''.join(stream_export(make_rows(2), 'csv')).decode('utf-8')
+    rows = list(csv.DictReader(io.StringIO(body)))
+    assert rows[0]['metadata'] == ''
+    assert json.loads(rows[1]['metadata']) == {'clave': 'A1'}
+
+
+def test_gzip_output_matches_plain_and_chunks_stay_bounded():
+    plain = b''.join(stream_export(make_rows(500), 'ndjson'))
+    chunks = list(stream_export(make_rows(500), 'ndjson', compress=True, chunk_bytes=1024))
+    assert len(chunks) > 1
+    assert gzip.decompress(b''.join(chunks)) == plain
+    uncompressed = list(stream_export(make_rows(500), 'ndjson', chunk_bytes=1024))
+    assert max(len(c) for c in uncompressed) < 1024 + 300
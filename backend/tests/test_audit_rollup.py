@@ -0,0 +1,44 @@
+"""
+Tests para los conteos incrementales de auditoría (sin BD: sentencias capturadas)
+"""
+from datetime import date, datetime
+
+from sqlalchemy.dialects import postgresql
+
+try:
+    from app.audit_rollup import apply_rollups, rollup_counts
+except Exception:
+    from backend.app.audit_rollup import apply_rollups, rollup_counts
+
+
+ROWS = [
+    {'timestamp': datetime(2026, 10, 1, 8), 'action': 'update_anexo', 'object_type': 'anexo', 'success': True, 'actor_id': 4},
+    {'timestamp': datetime(2026, 10, 1, 9), 'action': 'update_anexo', 'object_type': 'anexo', 'success': True, 'actor_id': 4},
+    {'timestamp': datetime(2026, 10, 2, 9), 'action': 'login', 'object_type': None, 'success': False, 'actor_id': None},
+]
+
+
+def test_rollup_counts_group_by_day_and_keys():
+    daily, by_actor = rollup_counts(ROWS)
+    assert daily[(date(2026, 10, 1), 'update_anexo', 'anexo', True)] == 2
+    assert daily[(date(2026, 10, 2), 'login', '', False)] == 1
+    assert by_actor[(date(2026, 10, 2), 0, False)] == 1
+
+
+class CapturingConnection:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, stmt):
+        self.statements.append(str(stmt.compile(dialect=postgresql.dialect())))
+
+
+def test_apply_rollups_is_one_upsert_per_table():
+    conn = CapturingConnection()
+    apply_rollups(conn, ROWS)
+    assert len(conn.statements) == 2
+    assert all('ON CONFLICT' in s and 'count + excluded.count' in s for s in conn.statements)
+
+    empty = CapturingConnection()
+    apply_rollups(empty, [])
+    assert empty.statements == []
@@ -0,0 +1,109 @@
+"""
+Tests para el escritor de auditoría por lotes y la auditoría transaccional
+(sin BD: lote y sesión capturados en memoria)
+"""
+import threading
+
+try:
+    from app.audit import AuditWriter, create_audit_log, record_audit
+    from app import audit
+except Exception:
+    from backend.app.audit import AuditWriter, create_audit_log, record_audit
+    from backend.app import audit
+
+
+class Recorder:
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.fail_times = fail_times
+        self.written = threading.Event()
+
+    def __call__(self, rows):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError('BD caída')
+        self.batches.append(list(rows))
+        self.written.set()
+
+
+def test_batch_is_written_when_size_threshold_is_reached():
+    recorder = Recorder()
+    writer = AuditWriter(batch_size=3, flush_interval=60, write_batch=recorder)
+    for i in range(3):
+        writer.enqueue({'action': f'a{i}'})
+    assert recorder.written.wait(2)
+    writer.stop()
+    assert [r['action'] for r in recorder.batches[0]] == ['a0', 'a1', 'a2']
+
+
+def test_time_threshold_and_stop_flush_pending_events():
+    recorder = Recorder()
+    writer = AuditWriter(batch_size=100, flush_interval=0.05, write_batch=recorder)
+    writer.enqueue({'action': 'x'})
+    assert recorder.written.wait(2)
+
+    # lo que quede en cola al detenerse también se escribe
+    slow = AuditWriter(batch_size=100, flush_interval=60, write_batch=Recorder())
+    slow.enqueue({'action': 'y'})
+    slow.stop()
+    assert slow.stats()['written'] == 1
+    assert slow.pending() == 0
+    writer.stop()
+
+
+def test_failed_batch_is_retried_on_next_flush():
+    recorder = Recorder(fail_times=1)
+    writer = AuditWriter(batch_size=10, flush_interval=60, write_batch=recorder)
+    writer._queue.put({'action': 'z'})
+    writer.flush()
+    assert writer.stats()['errors'] == 1
+    assert writer.pending() == 1
+    writer.flush()
+    assert recorder.batches == [[{'action': 'z'}]]
+    assert writer.pending() == 0
+
+
+def test_create_audit_log_enqueues_sanitized_event(monkeypatch):
+    recorder = Recorder()
+    writer = AuditWriter(batch_size=10, flush_interval=60, write_batch=recorder)
+    monkeypatch.setattr(audit, 'audit_writer', writer)
+
+    log = create_audit_log(db=None, actor_id=1, action='change_password', object_type='user',
+                           object_id=1, metadata={'new_password': 'secreta123'})
+    assert log is not None
+    writer.stop()
+    row = recorder.batches[0][0]
+    assert row['metadata_json'] == {'new_password': '[REDACTED]'}
+    assert row['timestamp'] is not None
+
+
+class FakeSession:
+    def __init__(self):
+        self.added = []
+        self.commits = 0
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_record_audit_joins_callers_unit_of_work_without_committing():
+    db = FakeSession()
+    log = record_audit(db, actor_id=1, action='update_anexo', object_type='anexo', object_id=7,
+                       metadata={'current_password': 'x', 'clave': 'A1'})
+    assert db.added == [log]
+    assert db.commits == 0
+    assert log.metadata_json == {'current_password': '[REDACTED]', 'clave': 'A1'}
+
+
+def test_record_audit_metadata_with_datetimes_is_json_serializable():
+    import json
+    from datetime import date, datetime
+    db = FakeSession()
+    changes = {'fecha_fin': datetime(2026, 10, 18, 9, 30), 'creado_en': date(2026, 1, 2), 'motivo': 'baja'}
+    log = record_audit(db, actor_id=1, action='update_user_cargo_historial', object_type='user_cargo_historial',
+                       object_id=3, metadata={'changes': changes})
+    assert log.metadata_json == {'changes': {'fecha_fin': '2026-10-18T09:30:00', 'creado_en': '2026-01-02', 'motivo': 'baja'}}
+    json.dumps(log.metadata_json)
@@ -0,0 +1,49 @@
+"""
+Tests para la caché TTL/LRU usada por la caché de principals
+"""
+try:
+    from app.cache import TTLCache
+except Exception:
+    from backend.app.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set(('user', 1), 'valor')
+    assert cache.get(('user', 1)) == 'valor'
+
+    clock.now = 5.1
+    assert cache.get(('user', 1)) is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    # usar 'a' para que 'b' sea el menos reciente
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_discard_where_invalidates_all_tokens_of_subject():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set(('leo', 100), 'u1')
+    cache.set(('leo', 200), 'u1')
+    cache.set(('dani', 100), 'u2')
+    removed = cache.discard_where(lambda key: key[0] == 'leo')
+    assert removed == 2
+    assert cache.get(('leo', 100)) is None
+    assert cache.get(('dani', 100)) == 'u2'
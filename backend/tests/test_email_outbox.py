@@ -0,0 +1,196 @@
+"""
+Tests para el envío del outbox de correos (sin red: sender de archivos o falso;
+SQLite en memoria para el reclamo y el registro de resultados)
+"""
+from datetime import datetime, timedelta
+from email import message_from_bytes
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from app.models import EmailOutbox
+    from app.services import email_outbox
+except Exception:
+    from backend.app.models import EmailOutbox
+    from backend.app.services import email_outbox
+
+
+def _message(id_, recipient='leo@example.com', attempts=0, **kwargs):
+    subject, html = email_outbox.render_password_recovery('Leo Alonso', 'tok123')
+    return EmailOutbox(id=id_, kind='password_recovery', recipient=recipient, subject=subject,
+                       html_body=html, status='pending', attempts=attempts, **kwargs)
+
+
+class FlakySender:
+    def __init__(self, fail_for):
+        self.fail_for = fail_for
+        self.opened = self.closed = 0
+
+    def open(self):
+        self.opened += 1
+
+    def send(self, message):
+        if message.recipient in self.fail_for:
+            raise RuntimeError('SMTP caído')
+
+    def close(self):
+        self.closed += 1
+
+
+def test_file_sender_writes_eml(tmp_path):
+    sender = email_outbox.FileSender(directory=str(tmp_path))
+    sent, failed = email_outbox.deliver(sender, [_message(1)])
+    assert (sent, failed) == (1, 0)
+
+    mime = message_from_bytes((tmp_path / '1.eml').read_bytes())
+    assert mime['To'] == 'leo@example.com'
+    assert 'tok123' in mime.get_payload()[1].get_payload(decode=True).decode()
+
+
+def test_failures_are_retried_with_backoff_until_max_attempts():
+    now = datetime(2026, 1, 1)
+    ok = _message(1)
+    # attempts ya cuenta el intento en curso (se incrementa al reclamar)
+    retry = _message(2, recipient='caido@example.com', attempts=1)
+    exhausted = _message(3, recipient='caido@example.com', attempts=email_outbox.EMAIL_MAX_ATTEMPTS)
+    sender = FlakySender(fail_for={'caido@example.com'})
+
+    sent, failed = email_outbox.deliver(sender, [ok, retry, exhausted], now=now)
+
+    assert (sent, failed) == (1, 2)
+    # una sola conexión para todo el lote
+    assert sender.opened == sender.closed == 1
+    assert ok.status == 'sent' and ok.sent_at == now
+    assert retry.status == 'pending'
+    assert retry.next_attempt_at == now + email_outbox.retry_delay(1)
+    assert retry.last_error == 'SMTP caído'
+    assert exhausted.status == 'failed'
+    # el token de recuperación no queda guardado en filas cerradas
+    assert ok.html_body == '' and exhausted.html_body == ''
+    assert 'tok123' in retry.html_body
+
+
+def test_failure_is_not_retried_past_expiration():
+    now = datetime(2026, 1, 1)
+    message = _message(1, recipient='caido@example.com', attempts=1,
+                       expires_at=now + email_outbox.retry_delay(1) - timedelta(seconds=1))
+
+    email_outbox.deliver(FlakySender(fail_for={'caido@example.com'}), [message], now=now)
+
+    # el reintento llegaría con el token vencido
+    assert message.status == 'failed' and message.html_body == ''
+
+
+def test_retry_delay_is_exponential_and_capped():
+    assert email_outbox.retry_delay(2) == 2 * email_outbox.retry_delay(1)
+    assert email_outbox.retry_delay(50).total_seconds() == email_outbox.EMAIL_RETRY_MAX_SECONDS
+
+
+def test_purge_clears_closed_bodies_and_deletes_rows_past_retention():
+    engine = create_engine('sqlite://')
+    EmailOutbox.__table__.create(engine)
+    Session = sessionmaker(engine)
+    now = datetime.utcnow()
+    db = Session()
+    db.add_all([
+        EmailOutbox(id=1, kind='k', recipient='a@x.mx', subject='s', html_body='tok-viejo', status='sent',
+                    next_attempt_at=now, created_at=now - timedelta(days=10), sent_at=now - timedelta(days=10)),
+        EmailOutbox(id=2, kind='k', recipient='b@x.mx', subject='s', html_body='tok-reciente', status='sent',
+                    next_attempt_at=now, created_at=now, sent_at=now),
+        EmailOutbox(id=3, kind='k', recipient='c@x.mx', subject='s', html_body='tok-pendiente', status='pending',
+                    next_attempt_at=now, created_at=now - timedelta(days=10)),
+        EmailOutbox(id=4, kind='k', recipient='d@x.mx', subject='s', html_body='tok-fallido', status='failed',
+                    next_attempt_at=now, created_at=now - timedelta(days=10)),
+    ])
+    db.commit()
+    db.close()
+
+    deleted = email_outbox.purge_email_outbox(Session, retention_hours=72, batch_size=1)
+
+    assert deleted == 2
+    db = Session()
+    rows = {m.id: m.html_body for m in db.query(EmailOutbox)}
+    db.close()
+    # la reciente se conserva sin cuerpo; la pendiente aún no se envía
+    assert rows == {2: '', 3: 'tok-pendiente'}
+
+
+def _outbox_db(sqlite_engine):
+    engine = sqlite_engine(EmailOutbox)
+    return sessionmaker(engine)
+
+
+def test_process_batch_commits_claim_before_sending(sqlite_engine):
+    Session = _outbox_db(sqlite_engine)
+    now = datetime.utcnow()
+    db = Session()
+    db.add_all([
+        _message(1, next_attempt_at=now - timedelta(seconds=1), expires_at=now + timedelta(minutes=15)),
+        _message(2, recipient='caido@example.com', next_attempt_at=now - timedelta(seconds=1)),
+    ])
+    db.commit()
+    db.close()
+    seen = []
+
+    class CheckingSender(FlakySender):
+        def send(self, message):
+            # otra conexión ya ve el reclamo confirmado: no hay transacción abierta durante el envío
+            check = Session()
+            row = check.get(EmailOutbox, message.id)
+            seen.append((row.attempts, row.claimed_at is not None, row.next_attempt_at > now))
+            check.close()
+            super().send(message)
+
+    assert email_outbox.process_batch(Session, CheckingSender(fail_for={'caido@example.com'})) == 2
+
+    assert seen == [(1, True, True), (1, True, True)]
+    db = Session()
+    rows = {m.id: m for m in db.query(EmailOutbox)}
+    assert (rows[1].status, rows[1].html_body, rows[1].sent_at is not None) == ('sent', '', True)
+    assert rows[2].status == 'pending' and rows[2].last_error == 'SMTP caído'
+    assert rows[2].next_attempt_at > now and 'tok123' in rows[2].html_body
+    db.close()
+    # ni el enviado ni el que espera su reintento se vuelven a tomar
+    assert email_outbox.process_batch(Session, FlakySender(fail_for=set())) == 0
+
+
+def test_expired_messages_are_dropped_without_sending(sqlite_engine):
+    Session = _outbox_db(sqlite_engine)
+    now = datetime.utcnow()
+    db = Session()
+    db.add(_message(1, next_attempt_at=now - timedelta(minutes=20), expires_at=now - timedelta(minutes=5)))
+    db.commit()
+    db.close()
+    sender = FlakySender(fail_for=set())
+
+    assert email_outbox.process_batch(Session, sender) == 0
+
+    assert sender.opened == 0
+    db = Session()
+    row = db.get(EmailOutbox, 1)
+    assert (row.status, row.html_body, row.attempts) == ('failed', '', 0)
+    db.close()
+
+
+def test_result_is_ignored_once_the_row_was_reclaimed(sqlite_engine):
+    Session = _outbox_db(sqlite_engine)
+    now = datetime.utcnow()
+    db = Session()
+    db.add(_message(1, next_attempt_at=now))
+    db.commit()
+    db.close()
+    db = Session()
+    (first,) = email_outbox.claim_batch(db, now=now)
+    db.close()
+    # el plazo del reclamo venció y otro worker la tomó
+    later = now + timedelta(seconds=email_outbox.EMAIL_CLAIM_TIMEOUT_SECONDS + 1)
+    db = Session()
+    (second,) = email_outbox.claim_batch(db, now=later)
+    db.close()
+    assert second.attempts == 2
+
+    first.status = 'sent'
+    assert not email_outbox.record_result(Session, first)
+    second.status = 'sent'
+    assert email_outbox.record_result(Session, second)
@@ -0,0 +1,75 @@
+"""
+Tests para el índice jerárquico de unidades en memoria (sin BD: nodos en memoria)
+"""
+try:
+    from app.hierarchy import HierarchyCache, HierarchyIndex, UnitNode
+except Exception:
+    from backend.app.hierarchy import HierarchyCache, HierarchyIndex, UnitNode
+
+
+def node(uid, parent, nombre=None):
+    return UnitNode(id_unidad=uid, nombre=nombre or f'U{uid}', tipo_unidad='Dirección',
+                    unidad_padre_id=parent, responsable=None)
+
+
+#        1
+#      /   \
+#     2     3
+#    / \     \
+#   4   5     6        7 <-> 8 (ciclo, inalcanzable)
+NODES = [node(1, None), node(2, 1), node(3, 1), node(4, 2), node(5, 2), node(6, 3), node(7, 8), node(8, 7)]
+
+
+def test_euler_intervals_answer_descendant_and_subtree_queries():
+    index = HierarchyIndex(NODES)
+    assert index.subtree(2) == [2, 4, 5]
+    assert index.subtree(1) == [1, 2, 4, 5, 3, 6]
+    assert index.is_descendant(5, 1) and index.is_descendant(2, 2)
+    assert not index.is_descendant(6, 2) and not index.is_descendant(1, 4)
+    assert index.ancestors(5) == [1, 2]
+    assert index.ancestors(1) == []
+
+
+def test_unreachable_units_are_left_out_like_the_recursive_cte():
+    index = HierarchyIndex(NODES)
+    assert index.unreachable == [7, 8]
+    assert 7 not in index
+    assert [r['id_unidad'] for r in index.by_level()] == [1, 2, 3, 4, 5, 6]
+    assert [r['nivel'] for r in index.by_level()] == [0, 1, 1, 2, 2, 2]
+
+
+def test_deep_chain_does_not_hit_recursion_limit():
+    chain = [node(1, None)] + [node(i, i - 1) for i in range(2, 5001)]
+    index = HierarchyIndex(chain)
+    assert index.depth[5000] == 4999
+    assert index.is_descendant(5000, 1)
+
+
+def test_cache_rebuilds_only_after_invalidation():
+    loads = []
+
+    def loader(db):
+        loads.append(1)
+        return NODES
+
+    cache = HierarchyCache(loader=loader, ttl=60)
+    first = cache.get(None)
+    assert cache.get(None) is first
+    cache.invalidate()
+    second = cache.get(None)
+    assert second is not first
+    assert second.version == 1
+    assert len(loads) == 2
+
+
+def test_tree_json_is_nested_and_respects_root_and_depth():
+    import json
+    index = HierarchyIndex(NODES)
+    tree = json.loads(b''.join(index.iter_tree_json(chunk_chars=16)))
+    assert [n['id_unidad'] for n in tree] == [1]
+    assert [n['id_unidad'] for n in tree[0]['hijos']] == [2, 3]
+    assert [n['id_unidad'] for n in tree[0]['hijos'][0]['hijos']] == [4, 5]
+
+    sub = json.loads(b''.join(index.iter_tree_json(root_id=2, max_depth=0)))
+    assert sub == [{**index.row(2), 'hijos': []}]
+    assert [r['id_unidad'] for r in index.by_level(root_id=1, max_depth=1)] == [1, 2, 3]
@@ -0,0 +1,45 @@
+"""
+Tests para los cursores de paginación keyset
+"""
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from sqlalchemy import column, create_engine, select, table, text
+
+try:
+    from app.pagination import apply_keyset, decode_cursor, encode_cursor, split_page
+except Exception:
+    from backend.app.pagination import apply_keyset, decode_cursor, encode_cursor, split_page
+
+
+def test_cursor_round_trip_keeps_types_and_microseconds():
+    values = [datetime(2026, 3, 1, 12, 30, 5, 123456), 42]
+    token = encode_cursor(values)
+    assert '=' not in token
+    assert decode_cursor(token, 2) == values
+
+
+@pytest.mark.parametrize('token', ['no-es-base64!', encode_cursor([1, 2, 3]), encode_cursor({'a': 1})])
+def test_invalid_cursor_is_rejected_with_400(token):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(token, 2)
+    assert exc.value.status_code == 400
+
+
+def test_keyset_on_select_walks_every_row_once_with_ties():
+    engine = create_engine("sqlite://")
+    unidades = table("unidades", column("nombre"), column("id"))
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE unidades (nombre TEXT, id INTEGER)"))
+        conn.execute(text("INSERT INTO unidades VALUES ('B', 1), ('A', 2), ('B', 3), ('C', 4), ('A', 5)"))
+        keyset = (unidades.c.nombre, unidades.c.id)
+        seen, cursor = [], None
+        while True:
+            stmt = apply_keyset(select(unidades), keyset, cursor, 2, descending=False)
+            rows, cursor = split_page(conn.execute(stmt).all(), keyset, 2)
+            seen += [(r.nombre, r.id) for r in rows]
+            if cursor is None:
+                break
+    assert seen == [('A', 2), ('A', 5), ('B', 1), ('B', 3), ('C', 4)]
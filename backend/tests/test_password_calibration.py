@@ -0,0 +1,150 @@
+"""
+Tests para la calibración de bcrypt y el rehash de contraseñas al iniciar sesión
+(tiempos simulados; SQLite en memoria para el compare-and-set)
+"""
+import pytest
+from passlib.context import CryptContext
+from sqlalchemy.orm import Session
+
+try:
+    from app import auth
+    from app.models import User, UserRoles
+except Exception:
+    from backend.app import auth
+    from backend.app.models import User, UserRoles
+
+
+class FakeClock:
+    """perf_counter que avanza `step_ms` en cada llamada: cada sonda mide exactamente eso."""
+
+    def __init__(self, step_ms):
+        self.now = 0.0
+        self.step = step_ms / 1000
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+class InlineHasher:
+    """Ejecuta en el mismo hilo y registra lo que se manda a segundo plano."""
+
+    def __init__(self):
+        self.background = []
+
+    def run(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    def submit_background(self, fn, *args, **kwargs):
+        self.background.append((fn, args))
+        return True
+
+
+@pytest.fixture
+def context(monkeypatch):
+    ctx = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=5, bcrypt__min_rounds=5)
+    monkeypatch.setattr(auth, "pwd_context", ctx)
+    monkeypatch.setattr(auth, "BCRYPT_MIN_ROUNDS", 10)
+    monkeypatch.setattr(auth, "BCRYPT_MAX_ROUNDS", 15)
+    return ctx
+
+
+def calibrate(monkeypatch, probe_ms, target_ms=150):
+    probes = []
+    monkeypatch.setattr(auth.bcrypt, "hashpw", lambda *args: probes.append(args))
+    monkeypatch.setattr(auth.time, "perf_counter", FakeClock(probe_ms))
+    return auth.calibrate_password_hashing(target_ms), probes
+
+
+@pytest.mark.parametrize("probe_ms, expected", [
+    (4, 13),        # 4 ms * 2**5 = 128 ms <= 150 < 256 ms
+    (1000, 10),     # hardware lento: nunca por debajo del mínimo
+    (0.0001, 15),   # hardware rápido: nunca por encima del máximo
+])
+def test_calibration_extrapolates_and_clamps_rounds(monkeypatch, context, probe_ms, expected):
+    rounds, probes = calibrate(monkeypatch, probe_ms)
+    assert rounds == expected
+    assert len(probes) == 3
+    # los hashes con menos rounds que el calibrado quedan marcados para rehash
+    policy = context.to_dict()
+    assert policy["bcrypt__default_rounds"] == policy["bcrypt__min_rounds"] == expected
+
+
+def test_calibration_disabled_with_non_positive_target(monkeypatch, context):
+    for target_ms in (0, -5):
+        rounds, probes = calibrate(monkeypatch, 4, target_ms=target_ms)
+        assert rounds is None
+        assert probes == []
+    assert context.to_dict()["bcrypt__default_rounds"] == 5
+
+
+class FakeQuery:
+    def __init__(self, user):
+        self.user = user
+
+    def filter(self, *args):
+        return self
+
+    def first(self):
+        return self.user
+
+
+class FakeDB:
+    def __init__(self, user):
+        self.user = user
+
+    def query(self, model):
+        return FakeQuery(self.user)
+
+
+def test_authenticate_user_rehashes_only_outdated_hashes(monkeypatch, context):
+    hasher = InlineHasher()
+    monkeypatch.setattr(auth, "password_hasher", hasher)
+    outdated = User(id=1, username="ana", password=context.hash("secreta-123", rounds=4))
+    current = User(id=2, username="luis", password=context.hash("secreta-123"))
+
+    assert auth.authenticate_user(FakeDB(current), "luis", "secreta-123") is current
+    assert hasher.background == []
+
+    assert auth.authenticate_user(FakeDB(outdated), "ana", "incorrecta") is False
+    assert hasher.background == []
+
+    assert auth.authenticate_user(FakeDB(outdated), "ana", "secreta-123") is outdated
+    assert hasher.background == [(auth._rehash_password, (1, outdated.password, "secreta-123"))]
+
+
+@pytest.fixture
+def users_db(sqlite_engine, context):
+    engine = sqlite_engine(patch=(auth,))
+    db = Session(engine)
+    user = User(username="ana", email="ana@example.com", role=UserRoles.USER,
+                password=context.hash("secreta-123", rounds=4), is_deleted=False)
+    db.add(user)
+    db.commit()
+    return engine, user.id, user.password
+
+
+def stored_password(engine, user_id):
+    with Session(engine) as db:
+        return db.get(User, user_id).password
+
+
+def test_rehash_replaces_hash_with_current_cost(users_db, context):
+    engine, user_id, old_hash = users_db
+    auth._rehash_password(user_id, old_hash, "secreta-123")
+    new_hash = stored_password(engine, user_id)
+    assert new_hash != old_hash
+    assert context.verify("secreta-123", new_hash)
+    assert not context.needs_update(new_hash)
+
+
+def test_rehash_does_not_overwrite_password_changed_meanwhile(users_db, context):
+    engine, user_id, old_hash = users_db
+    # el usuario cambió su contraseña entre el login y el rehash en segundo plano
+    with Session(engine) as db:
+        db.get(User, user_id).password = context.hash("otra-clave-456")
+        db.commit()
+    changed = stored_password(engine, user_id)
+
+    auth._rehash_password(user_id, old_hash, "secreta-123")
+    assert stored_password(engine, user_id) == changed
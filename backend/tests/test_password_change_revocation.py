@@ -0,0 +1,67 @@
+"""
+Tests: cambiar o resetear la contraseña revoca las sesiones abiertas
+(SQLite en memoria: usuarios y refresh tokens)
+"""
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+try:
+    from app import auth, main
+    from app.auth import Principal, issue_refresh_token, pwd_context, rotate_refresh_token
+    from app.models import PasswordAuditLog, RefreshToken, User, UserRoles
+    from app.schemas import ChangePasswordRequest, ResetPasswordRequest
+except Exception:
+    from backend.app import auth, main
+    from backend.app.auth import Principal, issue_refresh_token, pwd_context, rotate_refresh_token
+    from backend.app.models import PasswordAuditLog, RefreshToken, User, UserRoles
+    from backend.app.schemas import ChangePasswordRequest, ResetPasswordRequest
+
+
+# la fila user:<id> solo tiene que sobrevivir a los access tokens
+ACCESS_LIFETIME = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+
+
+@pytest.fixture
+def env(monkeypatch, sqlite_engine):
+    engine = sqlite_engine(RefreshToken, PasswordAuditLog, patch=(main,))
+    # audit_logs (JSONB) y revoked_tokens (upsert de Postgres) no existen en SQLite
+    monkeypatch.setattr(main, "record_audit", lambda *args, **kwargs: None)
+    revoked_users = []
+    monkeypatch.setattr(auth.revocation_list, "revoke_user",
+                        lambda db, user_id, max_token_lifetime: revoked_users.append((user_id, max_token_lifetime)))
+
+    db = Session(engine)
+    user = User(username="ana", email="ana@example.com", role=UserRoles.USER,
+                password=pwd_context.hash("vieja-12345", rounds=4), is_deleted=False)
+    db.add(user)
+    db.flush()
+    raw_refresh, _ = issue_refresh_token(db, user.id)
+    db.commit()
+    return engine, user.id, raw_refresh, revoked_users
+
+
+def assert_refresh_rejected(engine, raw_refresh):
+    with Session(engine) as db:
+        with pytest.raises(HTTPException) as exc:
+            rotate_refresh_token(db, raw_refresh)
+        assert exc.value.status_code == 401
+
+
+def test_change_password_revokes_refresh_tokens_issued_before(env):
+    engine, user_id, raw_refresh, revoked_users = env
+    current = Principal(id=user_id, username="ana", role=UserRoles.USER)
+    main.change_password(user_id, ChangePasswordRequest(current_password="vieja-12345", new_password="nueva-12345"),
+                         current_user=current, request=None)
+    assert revoked_users == [(user_id, ACCESS_LIFETIME)]
+    assert_refresh_rejected(engine, raw_refresh)
+
+
+def test_admin_reset_password_revokes_refresh_tokens_issued_before(env):
+    engine, user_id, raw_refresh, revoked_users = env
+    admin = Principal(id=999, username="admin", role=UserRoles.ADMIN)
+    main.reset_password(user_id, ResetPasswordRequest(new_password="nueva-12345"), current_user=admin, request=None)
+    assert revoked_users == [(user_id, ACCESS_LIFETIME)]
+    assert_refresh_rejected(engine, raw_refresh)
@@ -0,0 +1,47 @@
+"""
+Tests para el executor acotado de bcrypt (PasswordHasher)
+"""
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+try:
+    from app.auth import PasswordHasher
+except Exception:
+    from backend.app.auth import PasswordHasher
+
+
+def test_run_returns_result_and_records_metrics():
+    hasher = PasswordHasher(workers=1, max_queue=0)
+    assert hasher.run(lambda a, b: a + b, 2, 3) == 5
+    stats = hasher.stats()
+    assert stats['completed'] == 1
+    assert stats['rejected'] == 0
+    assert stats['in_flight'] == 0
+
+
+def test_full_queue_is_rejected_with_503():
+    hasher = PasswordHasher(workers=1, max_queue=0)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'ok'
+
+    worker = threading.Thread(target=hasher.run, args=(slow,))
+    worker.start()
+    assert started.wait(5)
+
+    with pytest.raises(HTTPException) as exc:
+        hasher.run(lambda: 'no debería ejecutarse')
+    assert exc.value.status_code == 503
+    assert exc.value.headers['Retry-After'] == '1'
+
+    release.set()
+    worker.join(5)
+    assert hasher.stats()['rejected'] == 1
+    # al liberarse el slot se vuelve a aceptar trabajo
+    assert hasher.run(lambda: 'ok') == 'ok'
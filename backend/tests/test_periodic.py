@@ -0,0 +1,47 @@
+"""
+Tests para las tareas periódicas del proceso (barrido de tokens, etc.)
+"""
+import threading
+
+try:
+    from app.periodic import PeriodicScheduler, PeriodicTask
+except Exception:
+    from backend.app.periodic import PeriodicScheduler, PeriodicTask
+
+
+def test_task_runs_repeatedly_and_stops():
+    calls = []
+    done = threading.Event()
+
+    def tick():
+        calls.append(1)
+        if len(calls) >= 3:
+            done.set()
+
+    task = PeriodicTask('tick', 0.01, tick)
+    task.start()
+    assert done.wait(2)
+    task.stop()
+    count = len(calls)
+    assert count >= 3
+    # detenida no vuelve a ejecutarse
+    threading.Event().wait(0.05)
+    assert len(calls) == count
+
+
+def test_errors_do_not_kill_the_loop():
+    calls = []
+    done = threading.Event()
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('BD caída')
+        done.set()
+
+    scheduler = PeriodicScheduler()
+    scheduler.add('flaky', 0.01, flaky, run_on_start=True)
+    scheduler.start()
+    assert done.wait(2)
+    scheduler.stop()
+    assert len(calls) >= 2
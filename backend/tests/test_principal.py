@@ -0,0 +1,125 @@
+"""
+Tests para la autorización por claims (Principal) y sus variantes fresh/admin
+(SQLite en memoria: usuarios y revoked_tokens)
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import Session, sessionmaker
+
+try:
+    from app import auth
+    from app.auth import (
+        Principal, build_access_token_claims, create_access_token, get_admin_principal, get_current_principal,
+        get_fresh_principal,
+    )
+    from app.models import RevokedToken, User, UserRoles
+    from app.revocation import RevocationList
+except Exception:
+    from backend.app import auth
+    from backend.app.auth import (
+        Principal, build_access_token_claims, create_access_token, get_admin_principal, get_current_principal,
+        get_fresh_principal,
+    )
+    from backend.app.models import RevokedToken, User, UserRoles
+    from backend.app.revocation import RevocationList
+
+
+@pytest.fixture
+def env(monkeypatch, sqlite_engine):
+    engine = sqlite_engine(RevokedToken)
+    revocations = RevocationList(session_factory=sessionmaker(bind=engine))
+    revocations.rebuild()
+    monkeypatch.setattr(auth, "revocation_list", revocations)
+    auth._principal_cache.clear()
+    db = Session(engine)
+    user = User(username="ana", email="ana@example.com", role=UserRoles.USER, password="x", is_deleted=False)
+    db.add(user)
+    db.commit()
+    yield db, user, revocations
+    db.close()
+    auth._principal_cache.clear()
+
+
+def token_for(user, **claims):
+    return create_access_token(data={**build_access_token_claims(user), **claims})
+
+
+def assert_unauthorized(dependency, token, db):
+    with pytest.raises(HTTPException) as exc:
+        dependency(token=token, db=db)
+    assert exc.value.status_code == 401
+
+
+def test_principal_is_built_from_claims(env):
+    db, user, _ = env
+    principal = get_current_principal(token=token_for(user), db=db)
+    assert (principal.id, principal.username, principal.role) == (user.id, "ana", UserRoles.USER)
+    assert not principal.is_admin
+
+
+@pytest.mark.parametrize("missing", ["role", "user_id"])
+def test_token_without_role_or_user_id_is_rejected(env, missing):
+    db, user, _ = env
+    claims = build_access_token_claims(user)
+    del claims[missing]
+    token = create_access_token(data=claims)
+    assert_unauthorized(get_current_principal, token, db)
+    assert_unauthorized(get_fresh_principal, token, db)
+
+
+def test_revoked_jti_is_rejected(env):
+    db, user, revocations = env
+    token = token_for(user, jti="jti-revocado")
+    now = datetime.utcnow()
+    db.add(RevokedToken(jti="jti-revocado", user_id=user.id, revoked_at=now, expires_at=now + timedelta(minutes=30)))
+    db.commit()
+    revocations.refresh()
+    assert_unauthorized(get_current_principal, token, db)
+    assert get_current_principal(token=token_for(user, jti="otro"), db=db).id == user.id
+
+
+def test_fresh_principal_rejects_role_change(env):
+    db, user, _ = env
+    token = token_for(user)
+    assert get_fresh_principal(token=token, db=db).role == UserRoles.USER
+    db.get(User, user.id).role = UserRoles.ADMIN
+    db.commit()
+    # el token sigue diciendo USER: ya no coincide con la BD
+    assert_unauthorized(get_fresh_principal, token, db)
+
+
+def test_fresh_principal_rejects_soft_deleted_user(env):
+    db, user, _ = env
+    token = token_for(user)
+    db.get(User, user.id).is_deleted = True
+    db.commit()
+    assert_unauthorized(get_fresh_principal, token, db)
+
+
+def test_admin_principal_requires_admin_role():
+    user = Principal(id=1, username="ana", role=UserRoles.USER)
+    with pytest.raises(HTTPException) as exc:
+        get_admin_principal(principal=user)
+    assert exc.value.status_code == 403
+    admin = Principal(id=2, username="root", role=UserRoles.ADMIN)
+    assert get_admin_principal(principal=admin) is admin
+
+
+def test_principal_cache_is_invalidated_on_commit_not_on_flush(env):
+    db, user, _ = env
+    token = token_for(user)
+    get_fresh_principal(token=token, db=db)
+    assert len(auth._principal_cache) == 1
+
+    db.get(User, user.id).role = UserRoles.ADMIN
+    db.flush()
+    # antes del commit otro request todavía debe ver (y cachear) la fila confirmada
+    assert len(auth._principal_cache) == 1
+    db.rollback()
+    assert len(auth._principal_cache) == 1 and "stale_principals" not in db.info
+
+    db.get(User, user.id).is_deleted = True
+    db.commit()
+    assert len(auth._principal_cache) == 0
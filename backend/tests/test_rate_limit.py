@@ -0,0 +1,57 @@
+"""
+Tests para los token buckets de rate limiting (/token y /forgot-password)
+"""
+import pytest
+from fastapi import HTTPException
+
+try:
+    from app.rate_limit import InMemoryTokenBucketBackend, RateLimit, RateLimiter
+except Exception:
+    from backend.app.rate_limit import InMemoryTokenBucketBackend, RateLimit, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    backend = InMemoryTokenBucketBackend(clock=clock)
+    limit = RateLimit(name='login_ip', capacity=3, period=30)
+
+    assert [backend.consume('ip', limit)[0] for _ in range(3)] == [True, True, True]
+    allowed, retry_after = backend.consume('ip', limit)
+    assert not allowed
+    assert retry_after == pytest.approx(10)
+
+    # 3 tokens cada 30s -> uno cada 10s
+    clock.now = 10
+    assert backend.consume('ip', limit)[0]
+    assert not backend.consume('ip', limit)[0]
+
+
+def test_limiter_rejects_with_429_and_keys_are_independent():
+    limiter = RateLimiter(InMemoryTokenBucketBackend(clock=FakeClock()))
+    limit = RateLimit(name='login_account', capacity=1, period=60)
+
+    limiter.hit(limit, 'leo alonso')
+    with pytest.raises(HTTPException) as exc:
+        limiter.hit(limit, 'leo alonso')
+    assert exc.value.status_code == 429
+    assert exc.value.headers['Retry-After'] == '60'
+
+    # otra cuenta no se ve afectada y sin identificador no se limita
+    limiter.hit(limit, 'dani alonso')
+    limiter.hit(limit, None)
+
+
+def test_lru_bound_on_tracked_keys():
+    backend = InMemoryTokenBucketBackend(max_keys=2, clock=FakeClock())
+    limit = RateLimit(name='forgot_ip', capacity=1, period=60)
+    for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        backend.consume(ip, limit)
+    assert len(backend._buckets) == 2
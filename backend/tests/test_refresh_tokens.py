@@ -0,0 +1,51 @@
+"""
+Tests para el flujo de refresh tokens (/token/refresh)
+"""
+import httpx
+
+BASE_URL = 'http://localhost:8000'
+
+
+def login(username, password):
+    resp = httpx.post(f"{BASE_URL}/token", data={'username': username, 'password': password})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_login_returns_refresh_token_and_refresh_rotates_it():
+    data = login('Leo Alonso', 'user12345')
+    assert data.get('refresh_token')
+
+    resp = httpx.post(f"{BASE_URL}/token/refresh", json={'refresh_token': data['refresh_token']})
+    assert resp.status_code == 200
+    renewed = resp.json()
+    assert renewed['access_token']
+    assert renewed['refresh_token'] != data['refresh_token']
+    assert renewed['user_id'] == data['user_id']
+
+    # el nuevo access token es válido para endpoints protegidos
+    headers = {'Authorization': f"Bearer {renewed['access_token']}"}
+    r = httpx.get(f"{BASE_URL}/user_cargo_historial", params={'user_id': renewed['user_id']}, headers=headers)
+    assert r.status_code == 200
+
+
+def test_reused_refresh_token_revokes_family():
+    data = login('Leo Alonso', 'user12345')
+    first = data['refresh_token']
+
+    resp = httpx.post(f"{BASE_URL}/token/refresh", json={'refresh_token': first})
+    assert resp.status_code == 200
+    second = resp.json()['refresh_token']
+
+    # reutilizar el token ya rotado se rechaza...
+    reuse = httpx.post(f"{BASE_URL}/token/refresh", json={'refresh_token': first})
+    assert reuse.status_code == 401
+
+    # ...y revoca también el token vigente de la misma familia
+    resp2 = httpx.post(f"{BASE_URL}/token/refresh", json={'refresh_token': second})
+    assert resp2.status_code == 401
+
+
+def test_invalid_refresh_token_is_rejected():
+    resp = httpx.post(f"{BASE_URL}/token/refresh", json={'refresh_token': 'no-existe'})
+    assert resp.status_code == 401
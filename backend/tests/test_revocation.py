@@ -0,0 +1,103 @@
+"""
+Tests para el filtro de Bloom y la lista de revocación de tokens
+(SQLite en memoria para revoked_tokens)
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session, sessionmaker
+
+try:
+    from app.models import RevokedToken
+    from app.revocation import BloomFilter, RevocationList, user_revocation_key
+except Exception:
+    from backend.app.models import RevokedToken
+    from backend.app.revocation import BloomFilter, RevocationList, user_revocation_key
+
+
+def test_added_keys_are_always_found():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [uuid.uuid4().hex for _ in range(1000)]
+    for k in keys:
+        bloom.add(k)
+    assert all(k in bloom for k in keys)
+
+
+def test_false_positive_rate_is_bounded():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for _ in range(1000):
+        bloom.add(uuid.uuid4().hex)
+    probes = 10000
+    false_positives = sum(1 for _ in range(probes) if uuid.uuid4().hex in bloom)
+    # margen amplio sobre el 1% configurado para evitar tests intermitentes
+    assert false_positives / probes < 0.03
+
+
+def test_user_key_is_distinct_from_jti():
+    bloom = BloomFilter(capacity=10)
+    bloom.add(user_revocation_key(7))
+    assert user_revocation_key(7) in bloom
+    assert user_revocation_key(8) not in bloom
+
+
+@pytest.fixture
+def make_list(sqlite_engine):
+    """Lista de revocación sobre SQLite con las filas (jti, revoked_at, expires_at) dadas."""
+    def make(*revoked):
+        engine = sqlite_engine(RevokedToken)
+        factory = sessionmaker(bind=engine)
+        with factory() as db:
+            for jti, revoked_at, expires_at in revoked:
+                db.add(RevokedToken(jti=jti, revoked_at=revoked_at, expires_at=expires_at))
+            db.commit()
+        revocations = RevocationList(session_factory=factory)
+        revocations.rebuild()
+        return revocations, Session(engine)
+    return make
+
+
+def epoch(dt):
+    return (dt - datetime(1970, 1, 1)).total_seconds()
+
+
+def test_revoked_jti_is_rejected_and_others_pass_without_db(make_list):
+    now = datetime.utcnow()
+    revocations, db = make_list(("jti-1", now, now + timedelta(hours=1)))
+    assert revocations.is_revoked(db, {"jti": "jti-1"})
+    # fallo del filtro: ni siquiera se consulta la BD
+    assert not revocations.is_revoked(None, {"jti": "jti-2"})
+
+
+def test_user_revocation_applies_only_to_tokens_issued_before(make_list):
+    revoked_at = datetime.utcnow().replace(microsecond=0)
+    revocations, db = make_list((user_revocation_key(7), revoked_at, revoked_at + timedelta(days=7)))
+    assert revocations.is_revoked(db, {"jti": "a", "user_id": 7, "iat": epoch(revoked_at) - 10})
+    assert not revocations.is_revoked(db, {"jti": "b", "user_id": 7, "iat": epoch(revoked_at) + 10})
+    assert not revocations.is_revoked(None, {"jti": "c", "user_id": 8, "iat": epoch(revoked_at) - 10})
+
+
+def test_token_issued_in_the_same_second_after_user_revocation_is_accepted(make_list):
+    revoked_at = datetime.utcnow().replace(microsecond=250000)
+    revocations, db = make_list((user_revocation_key(7), revoked_at, revoked_at + timedelta(minutes=30)))
+    # iat del JWT va truncado a segundos: el login justo después de revocar cae en el mismo segundo
+    same_second = int(epoch(revoked_at))
+    assert not revocations.is_revoked(db, {"jti": "nuevo", "user_id": 7, "iat": same_second})
+    assert revocations.is_revoked(db, {"jti": "viejo", "user_id": 7, "iat": same_second - 1})
+
+
+def test_bloom_false_positive_is_resolved_by_the_db_probe(make_list):
+    revocations, db = make_list()
+    revocations._filter.add("jti-fantasma")  # simula un falso positivo del filtro
+    assert not revocations.is_revoked(db, {"jti": "jti-fantasma"})
+
+
+def test_refresh_picks_up_new_revocations_and_rebuild_purges_expired(make_list):
+    now = datetime.utcnow()
+    revocations, db = make_list(("viejo", now - timedelta(days=2), now - timedelta(days=1)))
+    db.add(RevokedToken(jti="nuevo", revoked_at=now, expires_at=now + timedelta(hours=1)))
+    db.commit()
+    assert not revocations.is_revoked(db, {"jti": "nuevo"})
+    revocations.refresh()
+    assert revocations.is_revoked(db, {"jti": "nuevo"})
+    assert db.query(RevokedToken).filter_by(jti="viejo").count() == 0
@@ -0,0 +1,60 @@
+"""
+Tests para los contadores de table_versions y los ETags de listados
+(SQLite en memoria: solo usuarios, cargos, unidades y contadores)
+"""
+import pytest
+from sqlalchemy.orm import Session
+
+try:
+    from app.models import Cargo, User
+    from app.table_versions import current_versions, etag_matches, make_etag
+except Exception:
+    from backend.app.models import Cargo, User
+    from backend.app.table_versions import current_versions, etag_matches, make_etag
+
+
+@pytest.fixture
+def make_session(sqlite_engine):
+    return lambda: Session(sqlite_engine())
+
+
+def test_writes_bump_only_the_tables_they_touch(make_session):
+    db = make_session()
+    assert current_versions(db, ("cargos", "users")) == (0, 0)
+
+    db.add(Cargo(nombre="Director"))
+    db.commit()
+    assert current_versions(db, ("cargos", "users")) == (1, 0)
+
+    user = User(username="ana", email="ana@example.com", password="x")
+    db.add(user)
+    db.commit()
+    assert current_versions(db, ("cargos", "users")) == (1, 1)
+
+    # la contraseña no sale en los listados: no invalida
+    user.password = "y"
+    db.commit()
+    assert current_versions(db, ("users",)) == (1,)
+    user.email = "ana@uni.mx"
+    db.commit()
+    assert current_versions(db, ("users",)) == (2,)
+
+
+def test_rolled_back_writes_do_not_bump(make_session):
+    db = make_session()
+    db.add(Cargo(nombre="Director"))
+    db.flush()
+    db.rollback()
+    assert current_versions(db, ("cargos",)) == (0,)
+
+
+def test_etag_changes_with_versions_and_matches_if_none_match():
+    etag = make_etag("cargos", (3,))
+    assert etag.startswith('"') and etag.endswith('"')
+    assert make_etag("cargos", (4,)) != etag
+    assert make_etag("unidades", (3,)) != etag
+    assert etag_matches(etag, etag)
+    assert etag_matches('"otro", W/' + etag, etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"otro"', etag)
@@ -0,0 +1,60 @@
+"""
+Tests para los conteos por faceta del catálogo de unidades responsables
+"""
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+try:
+    from app.unidad_facets import facets_query, fold_facet_rows, unidad_filters
+except Exception:
+    from backend.app.unidad_facets import facets_query, fold_facet_rows, unidad_filters
+
+
+def compiled(conds):
+    return str(facets_query(conds).compile(dialect=postgresql.dialect())).lower()
+
+
+def test_each_facet_excludes_only_its_own_filter():
+    sql = compiled(unidad_filters(municipio="Morelia", tipo_unidad="Facultad", nombre="ing"))
+    assert "grouping sets(" in sql.replace(" (", "(")
+    # nombre no es faceta: va en el WHERE para todas
+    assert "where unidades_responsables.nombre ilike" in sql
+    # municipio se cuenta con tipo_unidad, tipo_unidad con municipio, localidad con ambos
+    assert "filter (where unidades_responsables.tipo_unidad = %(tipo_unidad_1)s) as n_municipio" in sql
+    assert "filter (where unidades_responsables.municipio = %(municipio_1)s) as n_tipo_unidad" in sql
+    assert "as n_localidad" in sql and sql.count("filter (where") == 3
+
+
+def test_without_filters_counts_are_plain():
+    sql = compiled({})
+    assert "filter" not in sql and "where" not in sql
+
+
+def row(facet, valor, total):
+    """Fila de facets_query del grupo `facet` (GROUPING 0 solo en esa columna)."""
+    data = {}
+    for name in ("municipio", "localidad", "tipo_unidad"):
+        data[name] = valor if name == facet else None
+        data[f"g_{name}"] = 0 if name == facet else 1
+        data[f"n_{name}"] = total if name == facet else 99
+    return SimpleNamespace(**data)
+
+
+def test_fold_rows_groups_by_facet_sorts_and_drops_zero_counts():
+    facets = fold_facet_rows([
+        row("municipio", "Uruapan", 3),
+        row("municipio", None, 5),
+        row("municipio", "Morelia", 5),
+        row("municipio", "Zamora", 0),
+        row("tipo_unidad", "Facultad", 2),
+    ])
+    assert facets == {
+        "municipio": [
+            {"valor": "Morelia", "total": 5},
+            {"valor": None, "total": 5},
+            {"valor": "Uruapan", "total": 3},
+        ],
+        "localidad": [],
+        "tipo_unidad": [{"valor": "Facultad", "total": 2}],
+    }
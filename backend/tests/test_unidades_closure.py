@@ -0,0 +1,92 @@
+"""
+Tests para el mantenimiento de unidades_closure al crear y re-colgar unidades
+(SQLite en memoria: solo las tablas de usuarios, unidades y cierre)
+"""
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+try:
+    from app.models import UnidadClosure, UnidadResponsable
+    from app import hierarchy  # noqa: F401  (registra los listeners)
+except Exception:
+    from backend.app.models import UnidadClosure, UnidadResponsable
+    from backend.app import hierarchy  # noqa: F401
+
+
+@pytest.fixture
+def make_session(sqlite_engine):
+    return lambda: Session(sqlite_engine(UnidadClosure))
+
+
+def closure(db):
+    return sorted(tuple(r) for r in db.execute(text("SELECT ancestor_id, descendant_id, depth FROM unidades_closure")))
+
+
+def add(db, nombre, parent=None):
+    unidad = UnidadResponsable(nombre=nombre, unidad_padre_id=parent)
+    db.add(unidad)
+    db.flush()
+    return unidad.id_unidad
+
+
+def test_insert_adds_paths_to_every_ancestor(make_session):
+    db = make_session()
+    a = add(db, "A")
+    b = add(db, "B", a)
+    c = add(db, "C", b)
+    db.commit()
+    assert closure(db) == [(a, a, 0), (a, b, 1), (a, c, 2), (b, b, 0), (b, c, 1), (c, c, 0)]
+
+
+def test_reparent_moves_whole_subtree(make_session):
+    db = make_session()
+    a = add(db, "A")
+    b = add(db, "B", a)
+    c = add(db, "C", b)
+    d = add(db, "D", a)
+    db.commit()
+
+    db.get(UnidadResponsable, b).unidad_padre_id = d
+    db.commit()
+    assert (d, c, 2) in closure(db) and (a, c, 3) in closure(db)
+
+    db.get(UnidadResponsable, b).unidad_padre_id = None
+    db.commit()
+    assert [row for row in closure(db) if row[1] == c] == [(b, c, 1), (c, c, 0)]
+
+
+def test_subtree_filter_selects_rows_of_descendant_units(make_session):
+    db = make_session()
+    a = add(db, "A")
+    b = add(db, "B", a)
+    c = add(db, "C", b)
+    other = add(db, "D")
+    db.commit()
+    stmt = select(UnidadResponsable.id_unidad).where(UnidadResponsable.id_unidad.in_(hierarchy.subtree_unit_ids(b)))
+    assert sorted(db.scalars(stmt)) == [b, c]
+    assert other not in db.scalars(select(UnidadResponsable.id_unidad).where(
+        UnidadResponsable.id_unidad.in_(hierarchy.subtree_unit_ids(a))))
+
+
+def test_move_units_rejects_cycles_and_applies_batches_in_order(make_session):
+    db = make_session()
+    a = add(db, "A")
+    b = add(db, "B", a)
+    c = add(db, "C", b)
+    d = add(db, "D")
+    db.commit()
+
+    assert hierarchy.would_create_cycle(db, a, c)
+    assert hierarchy.would_create_cycle(db, b, b)
+    assert not hierarchy.would_create_cycle(db, c, a)
+    with pytest.raises(HTTPException) as exc:
+        hierarchy.move_units(db, [(a, c)])
+    assert exc.value.status_code == 400
+    db.rollback()
+
+    # C sale de B y luego B puede colgar de C: cada paso ve el árbol del anterior
+    hierarchy.move_units(db, [(c, d), (b, c)])
+    db.commit()
+    assert (d, b, 2) in closure(db) and (a, b, 1) not in closure(db)